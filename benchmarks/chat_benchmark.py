@@ -0,0 +1,192 @@
+"""Replays recorded conversations through the chat endpoints against stub Supabase and OpenAI backends.
+
+    python -m benchmarks.chat_benchmark --db-latency 30 --llm-latency 400 --repeat 5
+
+Reports per turn the wall time, the time per stage (LLM call sites from the Server-Timing header, DB round-trips
+and the rest), the DB round-trips made in the request and deferred to the write-behind queue, and the LLM calls.
+Nothing leaves the process, so runs are repeatable and comparable between branches.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# The stubs replace every client, these only have to get config.config through its setup
+os.environ.setdefault("SUPABASE_URL", "http://stub.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "eyJhbGciOiJIUzI1NiJ9.e30.stub")
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from benchmarks.stubs import StubOpenAI, StubPostgrest, install_stubs
+
+CONVERSATIONS_FILE = os.path.join(os.path.dirname(__file__), "conversations.json")
+
+
+class ScriptedResponder:
+    """Function arguments for the stub LLM: the current turn's recorded reply, else the smallest valid one"""
+
+    def __init__(self):
+        self.script: Dict[str, Dict] = {}
+
+    def __call__(self, function_name: str, body: Dict) -> Dict:
+        from core.llm_router_core import fake_arguments
+
+        if function_name in self.script:
+            return self.script[function_name]
+        return fake_arguments(body["functions"][0]["parameters"])
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Server-Timing header as {name: milliseconds}"""
+    timings: Dict[str, float] = defaultdict(float)
+    for entry in (header or "").split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if name and duration:
+            timings[name] += float(duration)
+    return timings
+
+
+def run(conversations: List[Dict], db: StubPostgrest, llm: StubOpenAI, responder: ScriptedResponder,
+        repeat: int) -> List[Dict]:
+    from fastapi.testclient import TestClient
+
+    import main
+    from config.config import get_gpt_model
+    from core.llm_router_core import llm_router
+    from core.write_queue_core import write_queue
+
+    llm_router.set_routes({"default": [f"openai:{get_gpt_model()}"]})
+    results = []
+
+    with TestClient(main.app) as client:
+        # Startup warms the real clients when none are registered yet; put the stubs back in any case
+        install_stubs(db, llm)
+
+        for iteration in range(repeat):
+            for conversation in conversations:
+                for index, turn in enumerate(conversation["turns"]):
+                    responder.script = {**conversation.get("llm", {}), **turn.get("llm", {})}
+                    db_before, llm_before = len(db.calls), len(llm.calls)
+
+                    started = time.perf_counter()
+                    if conversation.get("method", "POST") == "GET":
+                        response = client.get(conversation["path"])
+                    else:
+                        response = client.post(conversation["path"], json={
+                            "prompt": turn["prompt"],
+                            "user_id": conversation["user_id"],
+                            "intent_id": turn.get("intent_id"),
+                        })
+                    finished = time.perf_counter()
+
+                    # Writes the request queued for later still belong to this turn
+                    client.portal.call(write_queue.flush)
+
+                    db_calls = db.calls[db_before:]
+                    in_request = [call for call in db_calls if call.started <= finished]
+                    stages = parse_server_timing(response.headers.get("Server-Timing"))
+                    wall_ms = (finished - started) * 1000
+                    llm_ms = sum(value for name, value in stages.items() if name.startswith("llm_"))
+                    db_ms = sum(call.seconds for call in in_request) * 1000
+
+                    results.append({
+                        "iteration": iteration,
+                        "conversation": conversation["name"],
+                        "turn": index + 1,
+                        "path": conversation["path"],
+                        "status": response.status_code,
+                        "wall_ms": wall_ms,
+                        "stages_ms": {
+                            **{name: value for name, value in stages.items() if name.startswith("llm_")},
+                            "db": db_ms,
+                            # Overlapping stages make this a lower bound of the time spent in the app itself
+                            "app": max(0.0, wall_ms - llm_ms - db_ms),
+                        },
+                        "db_round_trips": len(in_request),
+                        "db_deferred_writes": len(db_calls) - len(in_request),
+                        "db_tables": sorted({call.target for call in in_request}),
+                        "llm_calls": [call.target for call in llm.calls[llm_before:]],
+                    })
+
+    return results
+
+
+def summarize(results: List[Dict]) -> str:
+    lines = []
+    turns = defaultdict(list)
+    for result in results:
+        turns[(result["conversation"], result["turn"])].append(result)
+
+    lines.append(f"{'turn':<28}{'p50 ms':>9}{'max ms':>9}{'db rt':>7}{'defer':>7}{'llm':>5}  stages (p50 ms)")
+    for (conversation, turn), runs in turns.items():
+        wall = [run["wall_ms"] for run in runs]
+        stages = defaultdict(list)
+        for run in runs:
+            for name, value in run["stages_ms"].items():
+                stages[name].append(value)
+        stage_text = " ".join(f"{name}={statistics.median(values):.0f}" for name, values in stages.items())
+        lines.append(
+            f"{conversation + ' #' + str(turn):<28}{statistics.median(wall):>9.1f}{max(wall):>9.1f}"
+            f"{statistics.mean(run['db_round_trips'] for run in runs):>7.1f}"
+            f"{statistics.mean(run['db_deferred_writes'] for run in runs):>7.1f}"
+            f"{statistics.mean(len(run['llm_calls']) for run in runs):>5.1f}  {stage_text}"
+        )
+
+    lines.append("")
+    lines.append(f"{'path':<36}{'turns':>6}{'p50 ms':>9}{'p95 ms':>9}{'db rt/turn':>12}{'llm/turn':>10}")
+    paths = defaultdict(list)
+    for result in results:
+        paths[result["path"]].append(result)
+    for path, runs in paths.items():
+        wall = sorted(run["wall_ms"] for run in runs)
+        p95 = wall[max(0, int(round(len(wall) * 0.95)) - 1)]
+        lines.append(
+            f"{path:<36}{len(runs):>6}{statistics.median(wall):>9.1f}{p95:>9.1f}"
+            f"{statistics.mean(run['db_round_trips'] for run in runs):>12.1f}"
+            f"{statistics.mean(len(run['llm_calls']) for run in runs):>10.1f}"
+        )
+
+    failed = [result for result in results if result["status"] >= 400]
+    if failed:
+        lines.append("")
+        lines.append(f"{len(failed)} turns failed: " + ", ".join(
+            f"{result['conversation']} #{result['turn']} ({result['status']})" for result in failed))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", default=CONVERSATIONS_FILE, help="recorded conversations and seed tables")
+    parser.add_argument("--only", action="append", help="replay only these conversations (by name)")
+    parser.add_argument("--db-latency", type=float, default=20, help="injected latency per DB round-trip, ms")
+    parser.add_argument("--llm-latency", type=float, default=300, help="injected latency per LLM call, ms")
+    parser.add_argument("--repeat", type=int, default=3, help="times to replay every conversation")
+    parser.add_argument("--no-rpc", action="store_true", help="database without the RPC functions (table query fallbacks)")
+    parser.add_argument("--json", help="also write the raw per-turn results here")
+    args = parser.parse_args(argv)
+
+    with open(args.conversations, encoding="utf-8") as f:
+        recorded = json.load(f)
+    conversations = [conversation for conversation in recorded["conversations"]
+                     if not args.only or conversation["name"] in args.only]
+
+    responder = ScriptedResponder()
+    db = StubPostgrest(recorded.get("tables"), latency=args.db_latency / 1000)
+    if args.no_rpc:
+        db.rpc_functions.clear()
+    llm = StubOpenAI(responder, latency=args.llm_latency / 1000)
+    install_stubs(db, llm)
+
+    results = run(conversations, db, llm, responder, args.repeat)
+    print(summarize(results))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
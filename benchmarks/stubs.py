@@ -0,0 +1,304 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+
+
+class Call(NamedTuple):
+    method: str
+    target: str  # table name, or rpc/<function>
+    started: float
+    seconds: float
+
+
+class StubPostgrest:
+    """In-memory stand-in for the PostgREST API behind supabase-py, with injected latency per round-trip.
+
+    Understands the subset of PostgREST the app uses: select with column lists, eq/neq/gt/gte/lt/lte/in/is
+    filters (and not.), order, limit/offset, single/maybe_single, insert, update and delete.
+    RPC functions are Python callables registered in rpc_functions.
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[Dict]]] = None, latency: float = 0.0):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.latency = latency
+        self.calls: List[Call] = []
+        self.rpc_functions: Dict[str, Callable[[Dict], object]] = {
+            "farmer_dashboard_rows": self.farmer_dashboard_rows,
+        }
+        self._ids = itertools.count(100000)
+        self._lock = threading.Lock()
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def async_transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle_async)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        return self.__respond(request, started)
+
+    async def handle_async(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.__respond(request, started)
+
+    def __respond(self, request: httpx.Request, started: float) -> httpx.Response:
+        url = urlsplit(str(request.url))
+        target = url.path.split("/rest/v1/", 1)[-1]
+        params = parse_qsl(url.query, keep_blank_values=True)
+
+        with self._lock:
+            if target.startswith("rpc/"):
+                response = self.__rpc(request, target[len("rpc/"):])
+            else:
+                response = self.__table(request, target, params)
+            self.calls.append(Call(request.method, target, started, time.perf_counter() - started))
+        return response
+
+    def __rpc(self, request: httpx.Request, name: str) -> httpx.Response:
+        function = self.rpc_functions.get(name)
+        if function is None:
+            return httpx.Response(404, json={
+                "code": "PGRST202", "details": None, "hint": None,
+                "message": f"Could not find the function public.{name} in the schema cache",
+            })
+        arguments = json.loads(request.content or b"{}")
+        return httpx.Response(200, json=function(arguments))
+
+    def __table(self, request: httpx.Request, table: str, params) -> httpx.Response:
+        rows = self.tables.setdefault(table, [])
+        select, order, limit, offset, filters = None, [], None, 0, []
+        for name, value in params:
+            if name == "select":
+                select = value
+            elif name == "order":
+                order = value.split(",")
+            elif name == "limit":
+                limit = int(value)
+            elif name == "offset":
+                offset = int(value)
+            else:
+                filters.append((name, value))
+
+        matches = lambda row: all(_matches(row, column, expression) for column, expression in filters)
+
+        if request.method == "GET":
+            found = [row for row in rows if matches(row)]
+            for entry in reversed(order):
+                column, *modifiers = entry.split(".")
+                found.sort(key=lambda row: (row.get(column) is None, str(row.get(column))), reverse="desc" in modifiers)
+            total = len(found)
+            found = found[offset:offset + limit] if limit is not None else found[offset:]
+            return _response(request, [_project(row, select) for row in found], total)
+
+        body = json.loads(request.content or b"{}")
+        if request.method == "POST":
+            created = []
+            for values in body if isinstance(body, list) else [body]:
+                row = {"id": next(self._ids), "created_at": datetime.now(timezone.utc).isoformat(), **values}
+                rows.append(row)
+                created.append(row)
+            return _response(request, created, len(created), 201)
+
+        if request.method == "PATCH":
+            updated = [row for row in rows if matches(row)]
+            for row in updated:
+                row.update(body)
+            return _response(request, updated, len(updated))
+
+        if request.method == "DELETE":
+            deleted = [row for row in rows if matches(row)]
+            self.tables[table] = [row for row in rows if not matches(row)]
+            return _response(request, deleted, len(deleted))
+
+        return httpx.Response(405)
+
+    def farmer_dashboard_rows(self, arguments: Dict) -> Dict:
+        """In-memory version of sql/farmer_dashboard_rows.sql"""
+        user_profile_id = arguments["p_user_profile_id"]
+        rows = lambda table, **match: [row for row in self.tables.get(table, [])
+                                       if all(row.get(column) == value for column, value in match.items())]
+        latest = lambda found, column: max(found, key=lambda row: str(row.get(column)), default=None)
+
+        feed_usage = latest(rows("feed_usage_logs", farmer_user_profile_id=user_profile_id), "created_at")
+        feed_product_id = feed_usage["feed_product_id"] if feed_usage else None
+
+        logs = []
+        if feed_usage and feed_usage.get("start_date"):
+            logs = [row for row in rows("farm_performance_logs", user_profile_id=user_profile_id)
+                    if str(row["created_at"]) >= str(feed_usage["start_date"])
+                    and (not feed_usage.get("end_date") or str(row["created_at"]) <= str(feed_usage["end_date"]))]
+            logs.sort(key=lambda row: str(row["created_at"]), reverse=True)
+
+        farmer = next(iter(rows("farmers", user_profile_id=user_profile_id)), None)
+        livestock = next(iter(rows("farmer_livestock", farmer_id=farmer["id"])), None) if farmer else None
+        target = next(iter(rows("feed_growth_targets", feed_product_id=feed_product_id)), None) if feed_product_id else None
+        incidents = sorted(rows("health_incidents", farmer_user_profile_id=user_profile_id),
+                           key=lambda row: str(row.get("incident_date")), reverse=True)
+
+        return {
+            "user_exists": bool(rows("user_profiles", id=user_profile_id)),
+            "feed_usage": feed_usage,
+            "feed_product": next(iter(rows("feed_products", id=feed_product_id)), None) if feed_product_id else None,
+            "logs": logs,
+            "flock_size": livestock.get("quantity") if livestock else None,
+            "target_weight_kg": target.get("target_weight_kg") if target else None,
+            "feed_calculation_log": latest(rows("feed_calculation_logs", user_profile_id=user_profile_id), "created_at"),
+            "incidents": incidents,
+        }
+
+
+class StubOpenAI:
+    """Deterministic stand-in for the chat completions API, forced function calls only (stream or not).
+
+    responder(function_name, request_body) returns the function arguments; the pipeline never sees a real model.
+    """
+
+    def __init__(self, responder: Callable[[str, Dict], Dict], latency: float = 0.0, chunk_size: int = 8):
+        self.responder = responder
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls: List[Call] = []
+
+    def async_transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle_async)
+
+    async def handle_async(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        body = json.loads(request.content)
+        function_name = body["function_call"]["name"]
+        arguments = json.dumps(self.responder(function_name, body))
+        usage = {
+            "prompt_tokens": sum(len(str(message.get("content") or "")) for message in body["messages"]) // 4,
+            "completion_tokens": len(arguments) // 4,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self.calls.append(Call("POST", function_name, started, time.perf_counter() - started))
+
+        if not body.get("stream"):
+            return httpx.Response(200, json={
+                "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"], "usage": usage,
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                    "role": "assistant", "content": None,
+                    "function_call": {"name": function_name, "arguments": arguments},
+                }}],
+            })
+
+        events = []
+        for start in range(0, len(arguments), self.chunk_size):
+            events.append({"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                           "choices": [{"index": 0, "finish_reason": None, "delta": {
+                               "function_call": {"arguments": arguments[start:start + self.chunk_size]}}}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append({"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                           "choices": [], "usage": usage})
+        content = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        return httpx.Response(200, content=content.encode(), headers={"content-type": "text/event-stream"})
+
+
+def install_stubs(db: StubPostgrest, llm: StubOpenAI):
+    """Registers Supabase and OpenAI clients backed by the stubs in config.config's client registry"""
+    from openai import AsyncOpenAI
+    from supabase import AsyncClientOptions, ClientOptions, create_client
+    from supabase._async.client import AsyncClient
+
+    import config.config as config
+    from core.identity_map_core import AsyncIdentityMapTransport, IdentityMapTransport
+    from core.metrics_core import count_llm_attempt
+
+    # Wrapped like the real clients, so the benchmark sees the round-trips the identity map saves
+    http_client = httpx.Client(transport=IdentityMapTransport(db.transport()))
+    async_http_client = httpx.AsyncClient(transport=AsyncIdentityMapTransport(db.async_transport()))
+    config._clients.update({
+        "supabase_http": http_client,
+        "supabase": create_client(config.SUPABASE_URL, config.SUPABASE_KEY, options=ClientOptions(httpx_client=http_client)),
+        "async_supabase_http": async_http_client,
+        "async_supabase": AsyncClient(config.SUPABASE_URL, config.SUPABASE_KEY,
+                                      options=AsyncClientOptions(httpx_client=async_http_client)),
+        "async_gpt": AsyncOpenAI(api_key="stub", max_retries=0, http_client=httpx.AsyncClient(
+            transport=llm.async_transport(), event_hooks={"request": [count_llm_attempt]})),
+    })
+
+
+def _matches(row: Dict, column: str, expression: str) -> bool:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[len("not."):]
+    operator, _, value = expression.partition(".")
+
+    if "->>" in column:
+        column, key = column.split("->>", 1)
+        actual = (row.get(column) or {}).get(key)
+    else:
+        actual = row.get(column)
+
+    if operator == "eq":
+        result = _text(actual) == value
+    elif operator == "neq":
+        result = _text(actual) != value
+    elif operator in ("gt", "gte", "lt", "lte"):
+        result = actual is not None and _compare(actual, value, operator)
+    elif operator == "in":
+        result = _text(actual) in [item.strip('"') for item in value.strip("()").split(",")]
+    elif operator == "is":
+        result = actual is None if value == "null" else _text(actual) == value
+    else:
+        result = True
+    return result != negate
+
+
+def _text(value) -> str:
+    if isinstance(value, bool):
+        return str(value).lower()
+    return "" if value is None else str(value)
+
+
+def _compare(actual, value: str, operator: str) -> bool:
+    try:
+        left, right = float(actual), float(value)
+    except (TypeError, ValueError):
+        left, right = str(actual), value
+    return {"gt": left > right, "gte": left >= right, "lt": left < right, "lte": left <= right}[operator]
+
+
+def _project(row: Dict, select: Optional[str]) -> Dict:
+    if not select or select.strip() == "*":
+        return dict(row)
+    projected = {}
+    for column in (part.strip() for part in select.split(",")):
+        if "(" in column:
+            # Embedded resources are not joined
+            continue
+        if "->>" in column:
+            name, key = column.split("->>", 1)
+            projected[key] = (row.get(name) or {}).get(key)
+        else:
+            projected[column] = row.get(column)
+    return projected
+
+
+def _response(request: httpx.Request, rows: List[Dict], total: int, status: int = 200) -> httpx.Response:
+    headers = {"Content-Range": f"0-{max(len(rows) - 1, 0)}/{total}"}
+    if "vnd.pgrst.object" in request.headers.get("accept", ""):
+        if len(rows) != 1:
+            return httpx.Response(406, json={
+                "code": "PGRST116", "details": f"The result contains {len(rows)} rows", "hint": None,
+                "message": "JSON object requested, multiple (or no) rows returned",
+            })
+        return httpx.Response(status, json=rows[0], headers=headers)
+    return httpx.Response(status, json=rows, headers=headers)
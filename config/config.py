@@ -1,7 +1,13 @@
-from supabase import create_client, Client
+from supabase import acreate_client, create_client, AsyncClient, AsyncClientOptions, Client, ClientOptions
 from google import genai
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
+from core.identity_map_core import AsyncIdentityMapTransport, IdentityMapTransport
+from core.metrics_core import count_llm_attempt
+import asyncio
+import httpx
+import inspect
 import os
+import threading
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -11,20 +17,143 @@ GEMINI_KEY = os.getenv("GEMINI_API_KEY")
 model = "gemini-2.0-flash"
 gpt_model = "gpt-4.1-mini"
 
+# Connection pool settings shared by every core object in the process
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+SUPABASE_POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "60"))
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "10"))
+
+# Process-wide client registry (name -> client), filled lazily or on startup.
+# Reentrant because a factory may pull in another registered client (e.g. its httpx pool)
+_clients = {}
+_clients_lock = threading.RLock()
+_async_clients_lock = None
+
+
+def _get_or_create(name: str, factory):
+  client = _clients.get(name)
+  if client is None:
+    with _clients_lock:
+      client = _clients.get(name)
+      if client is None:
+        client = factory()
+        _clients[name] = client
+  return client
+
+
+def _supabase_pool_limits() -> httpx.Limits:
+  return httpx.Limits(
+    max_connections=SUPABASE_POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=SUPABASE_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=SUPABASE_POOL_KEEPALIVE_EXPIRY,
+  )
+
+
+# Both wrap the pooled transport so repeated reads within a request are answered from its identity map
+def _create_supabase_http_client() -> httpx.Client:
+  return httpx.Client(
+    transport=IdentityMapTransport(httpx.HTTPTransport(http2=True, limits=_supabase_pool_limits())),
+    timeout=SUPABASE_HTTP_TIMEOUT,
+    follow_redirects=True,
+  )
+
+
+def _create_supabase_async_http_client() -> httpx.AsyncClient:
+  return httpx.AsyncClient(
+    transport=AsyncIdentityMapTransport(httpx.AsyncHTTPTransport(http2=True, limits=_supabase_pool_limits())),
+    timeout=SUPABASE_HTTP_TIMEOUT,
+    follow_redirects=True,
+  )
+
+
+def _create_supabase_client() -> Client:
+  http_client = _get_or_create("supabase_http", _create_supabase_http_client)
+  options = ClientOptions(
+    postgrest_client_timeout=SUPABASE_HTTP_TIMEOUT,
+    httpx_client=http_client,
+  )
+  return create_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+
+
+def _create_gpt_client() -> OpenAI:
+  return OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    organization=os.getenv("OPENAI_ORG_ID")
+  )
+
+
+def _create_async_gpt_client() -> AsyncOpenAI:
+  return AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    organization=os.getenv("OPENAI_ORG_ID"),
+    # Retries, deadlines and hedging are handled by core.resilience_core
+    max_retries=0,
+    # Counts every HTTP attempt so retries and hedges show up in the metrics
+    http_client=DefaultAsyncHttpxClient(event_hooks={"request": [count_llm_attempt]})
+  )
+
+
 def get_supabase_client() -> Client:
-  return create_client(SUPABASE_URL, SUPABASE_KEY)
+  return _get_or_create("supabase", _create_supabase_client)
+
+async def get_async_supabase_client() -> AsyncClient:
+  # The async client has to be created inside the running event loop
+  global _async_clients_lock
+  client = _clients.get("async_supabase")
+  if client is not None:
+    return client
+
+  if _async_clients_lock is None:
+    _async_clients_lock = asyncio.Lock()
+
+  async with _async_clients_lock:
+    client = _clients.get("async_supabase")
+    if client is None:
+      http_client = _get_or_create("async_supabase_http", _create_supabase_async_http_client)
+      options = AsyncClientOptions(
+        postgrest_client_timeout=SUPABASE_HTTP_TIMEOUT,
+        httpx_client=http_client,
+      )
+      client = await acreate_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+      _clients["async_supabase"] = client
+  return client
 
 def get_gemini_client():
-  return genai.Client(api_key=GEMINI_KEY)
+  return _get_or_create("gemini", lambda: genai.Client(api_key=GEMINI_KEY))
 
 def get_llm_model():
   return model
 
 def get_gpt_client():
-  return OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    organization=os.getenv("OPENAI_ORG_ID")
-  )
+  return _get_or_create("gpt", _create_gpt_client)
+
+def get_async_gpt_client():
+  return _get_or_create("async_gpt", _create_async_gpt_client)
 
 def get_gpt_model():
-  return gpt_model
\ No newline at end of file
+  return gpt_model
+
+
+async def init_clients():
+  # Warm up the shared clients so the first request does not pay for it
+  get_supabase_client()
+  get_gpt_client()
+  get_async_gpt_client()
+  await get_async_supabase_client()
+
+
+async def close_clients():
+  with _clients_lock:
+    clients = list(_clients.items())
+    _clients.clear()
+
+  for name, client in clients:
+    close = getattr(client, "aclose", None) or getattr(client, "close", None)
+    if not callable(close):
+      continue
+    try:
+      result = close()
+      if inspect.isawaitable(result):
+        await result
+    except Exception as e:
+      print(f"Error closing {name} client: {e}")
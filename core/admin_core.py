@@ -5,6 +5,9 @@ from collections import defaultdict
 import json
 import random
 
+from core.company_core import user_company_cache
+from core.faq_index_core import faq_index
+from core.reference_data_core import island_group, reference_data
 from exceptions.global_exception import GlobalException
 
 
@@ -27,32 +30,6 @@ class Admin:
         if not users:
             return []
 
-        # Map Philippine regions → island groups
-        region_to_island_group = {
-            # Luzon
-            "Ilocos Region": "Luzon",
-            "Cagayan Valley": "Luzon",
-            "Central Luzon": "Luzon",
-            "CALABARZON": "Luzon",
-            "MIMAROPA": "Luzon",
-            "Bicol Region": "Luzon",
-            "NCR": "Luzon",
-            "CAR": "Luzon",
-
-            # Visayas
-            "Western Visayas": "Visayas",
-            "Central Visayas": "Visayas",
-            "Eastern Visayas": "Visayas",
-
-            # Mindanao
-            "Zamboanga Peninsula": "Mindanao",
-            "Northern Mindanao": "Mindanao",
-            "Davao Region": "Mindanao",
-            "SOCCSKSARGEN": "Mindanao",
-            "Caraga": "Mindanao",
-            "BARMM": "Mindanao",
-        }
-
         # Collect user_ids
         user_ids = [u["id"] for u in users]
 
@@ -87,7 +64,7 @@ class Admin:
 
             region = sales_rep.get("territory", "") if sales_rep else ""
             quota = sales_rep.get("quota_monthly", 0.0) if sales_rep else 0.0
-            continent = region_to_island_group.get(region, "Unknown")
+            continent = island_group(region)
 
             closed_sales = sales_by_user.get(user_id, 0.0)
             growth_rate = (closed_sales / quota * 100) if quota else 0.0
@@ -414,6 +391,22 @@ class Admin:
 
         return faqs
 
+    def search_faqs(self, company_id: int, query: str, limit: int = 10, category: Optional[str] = None) -> List[Dict[str, object]]:
+        return faq_index.search(company_id, query, limit, category)
+
+    def rebuild_faq_index(self) -> Dict[str, object]:
+        faq_index.rebuild(self.client)
+        faq_index.save_snapshot()
+        return faq_index.stats()
+
+    def invalidate_user_company(self, user_profile_id: Optional[int] = None) -> Dict[str, int]:
+        invalidated = user_company_cache.invalidate(user_profile_id)
+        return {"invalidated": invalidated, **user_company_cache.stats()}
+
+    def refresh_reference_data(self) -> Dict[str, int]:
+        reference_data.invalidate()
+        return reference_data.warm(self.client)
+
     def create_faq(self, question: str, answer: str, category: str, is_featured: bool = False) -> Dict:
         payload = {
             "question": question,
@@ -429,6 +422,7 @@ class Admin:
             .execute()
         )
 
+        faq_index.add(response.data[0] if response.data else None)
         return response.data[0] if response.data else {}
 
     def update_faq(self, faq_id: int, updates: Dict[str, object]) -> Dict:
@@ -440,6 +434,7 @@ class Admin:
             .execute()
         )
 
+        faq_index.add(response.data[0] if response.data else None)
         return response.data[0] if response.data else {}
 
     def delete_faq(self, faq_id: int) -> bool:
@@ -451,6 +446,7 @@ class Admin:
             .execute()
         )
 
+        faq_index.remove(faq_id)
         return response.status_code == 200
 
     # SALES GOAL RELATED METHODS
@@ -0,0 +1,126 @@
+import copy
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from core.prompt_core import prompt_registry
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(6 * 60 * 60)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+
+WORD_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+
+# Politeness particles and fillers that do not change what is being asked
+FILLER_WORDS = frozenset({
+    "po", "ho", "opo", "oo", "nga", "naman", "ba", "lang", "sana", "pls", "please", "plz", "hi", "hello",
+    "sir", "maam", "ma'am", "doc", "bai", "uy", "eh", "ah",
+})
+
+Scope = Tuple
+
+
+@dataclass
+class CachedAnswer:
+    scope: Scope
+    question: str
+    answer: Dict
+    expires_at: float
+
+
+def normalize_question(text: str) -> str:
+    words = [word for word in WORD_PATTERN.findall((text or "").lower()) if word not in FILLER_WORDS]
+    return " ".join(words)
+
+
+class AnswerCache:
+    """LRU + TTL cache of LLM answers to general questions asked without earlier turns, by exact question within a scope.
+
+    Questions only match when they are the same words once case, punctuation and politeness fillers are dropped:
+    questions that differ in a single word (a product, a stage, a "not") can need opposite answers. A scope is
+    (company id, language, feed name, feed stage, prompt hash), so an answer is only reused for the same company
+    and setting, and editing the prompt files starts a fresh cache. Callers skip the cache when the turn has
+    history, since the answer to a follow-up depends on it.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl: float = ANSWER_CACHE_TTL,
+                 enabled: bool = ANSWER_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple[Scope, str], CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def scope(self, company_id, language: Optional[str], feed_product: Optional[Dict], *prompt_files: str) -> Scope:
+        feed_product = feed_product or {}
+        return (
+            company_id,
+            (language or "").lower(),
+            (feed_product.get("feed_name") or "").lower(),
+            (feed_product.get("feed_stage") or "").lower(),
+            prompt_registry.get_hash(*prompt_files) if prompt_files else "",
+        )
+
+    def get(self, scope: Scope, question: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+
+        key = (scope, normalized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry.answer)
+
+    def put(self, scope: Scope, question: str, answer: Dict):
+        if not self.enabled or not answer or not answer.get("response"):
+            return
+
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+
+        entry = CachedAnswer(
+            scope=scope,
+            question=normalized,
+            answer=copy.deepcopy(answer),
+            expires_at=time.monotonic() + self.ttl,
+        )
+
+        with self._lock:
+            self._entries[(scope, normalized)] = entry
+            self._entries.move_to_end((scope, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, company_id=None) -> int:
+        """Drop every cached answer, or only those of one company"""
+        with self._lock:
+            keys = [key for key in self._entries if company_id is None or key[0][0] == company_id]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+answer_cache = AnswerCache()
@@ -1,94 +1,262 @@
+import asyncio
+import threading
+from datetime import timedelta
 from typing import List, Optional, Dict
-from config.config import get_supabase_client
+from dateutil.parser import isoparse
+from config.config import get_async_supabase_client
+from core.language_core import language_detector
+from core.history_core import HISTORY_FOLD_BATCH, build_history, fold_into_summary, get_history_budget
+from core.session_core import session_store
+from core.write_queue_core import write_queue
 from datetime import datetime, timezone
+
+_message_clock_lock = threading.Lock()
+_last_message_at = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _message_timestamp() -> str:
+    """created_at for a new chat message, later than every one issued before by this process.
+
+    The user and model messages of a turn are written in one multi-row insert, where a server default now()
+    would give both the same created_at and leave their order to chance.
+    """
+    global _last_message_at
+    with _message_clock_lock:
+        _last_message_at = max(datetime.now(timezone.utc), _last_message_at + timedelta(microseconds=1))
+        return _last_message_at.isoformat()
+
+
+def _message_metadata(role: str, message: str, metadata: Optional[Dict]) -> Dict:
+    # Whether a user message's language came from the LLM; the language detector only trains on those
+    metadata = dict(metadata or {})
+    if role == "user" and metadata.get("user_language"):
+        metadata["language_source"] = language_detector.label_source(message, metadata["user_language"])
+    return metadata
+
+
+def _merge_form_data(current, base, mine):
+    """current with the fields that changed from base to mine applied (None counts as no fields)"""
+    current, base, mine = dict(current or {}), base or {}, mine or {}
+    for field in base:
+        if field not in mine:
+            current.pop(field, None)
+    for field, value in mine.items():
+        if field not in base or base[field] != value:
+            current[field] = value
+    return current or None
+
+
 class Chat:
-    def __init__(self):
-        self.client = get_supabase_client()
+    # Chat is only used on the chat pipeline, so it talks to Supabase through the async client.
+    # History summaries live on chat_conversations.history_summary (text) / history_summary_until (timestamptz),
+    # added by sql/chat_conversations_history_summary.sql.
+    # Conversation rows are cached per user in session_store, last_message_at doubles as their version.
+
+    async def create_conversation(self, user_id: int) -> int:
+        conversation_id = await session_store.get_conversation_id(user_id)
+        if conversation_id is not None:
+            return conversation_id
 
-    def create_conversation(self, user_id: int) -> int:        
+        client = await get_async_supabase_client()
 
-        existing = (
-            self.client.table("chat_conversations")
-            .select("id")
+        # Load the whole row so the session also covers get_conversations_record
+        existing = await (
+            client.table("chat_conversations")
+            .select("*")
             .eq("user_profile_id", user_id)
             .limit(1)
             .execute()
         )
 
         if existing.data and len(existing.data) > 0:
+            await session_store.put(existing.data[0])
             return existing.data[0]["id"]
 
         # If not, create a new conversation
-        response = (
-            self.client.table("chat_conversations")
+        response = await (
+            client.table("chat_conversations")
             .insert({"user_profile_id": user_id})
             .execute()
         )
 
-        return response.data[0]["id"] if response.data else None
+        if not response.data:
+            return None
+        await session_store.put(response.data[0])
+        return response.data[0]["id"]
+
+    async def update_conversation(self, conversation_id: int, form_data):
+        # Write-through: the session is updated now, the row by the write-behind queue
+        version = datetime.now(timezone.utc).isoformat()
+        previous = await session_store.update(conversation_id, {"form_data": form_data, "last_message_at": version})
+        previous_version = previous.get("last_message_at") if previous else None
+
+        match = {"id": conversation_id}
+        on_done = None
+        if previous_version is not None:
+            # Only overwrite the row this session was loaded from
+            match["last_message_at"] = previous_version
+            base_form_data = previous.get("form_data")
+            on_done = lambda row: self.__check_version(row, conversation_id, base_form_data, form_data, version)
 
-    def update_conversation(self, conversation_id: int, form_data):
-        self.client.table("chat_conversations").update({
+        await write_queue.update("chat_conversations", {
             "form_data": form_data,
-            "last_message_at": "now()",
-        }).eq("id", conversation_id).execute()
+            "last_message_at": version,
+        }, match, on_done=on_done, key=("conversation", conversation_id))
 
-    def add_message(self, conversation_id: int, role: str, message: str, metadata: Optional[Dict] = None) -> Dict:
+    async def __check_version(self, row, conversation_id: int, base_form_data, form_data, version: str):
+        if row is not None:
+            return
+
+        # Someone else (another worker) changed the row: drop the stale session, then apply only the fields
+        # this turn changed on top of the row as it is now, again conditional on it not changing meanwhile
+        print(f"Conversation {conversation_id} changed outside this session, merging this turn's form data")
+        await session_store.invalidate(conversation_id)
+        client = await get_async_supabase_client()
+        response = await (
+            client.table("chat_conversations")
+            .select("form_data, last_message_at")
+            .eq("id", conversation_id)
+            .limit(1)
+            .execute()
+        )
+        if not response.data:
+            return
+
+        current = response.data[0]
+        merged = _merge_form_data(current.get("form_data"), base_form_data, form_data)
+        query = client.table("chat_conversations").update({
+            "form_data": merged,
+            "last_message_at": version,
+        }).eq("id", conversation_id)
+        if current.get("last_message_at") is None:
+            query = query.is_("last_message_at", "null")
+        else:
+            query = query.eq("last_message_at", current["last_message_at"])
+
+        updated = await query.execute()
+        if not updated.data:
+            # Changed yet again; the next turn starts from that row and asks for whatever is missing
+            print(f"Conversation {conversation_id} changed again, dropping this turn's form data")
+
+    async def add_message(self, conversation_id: int, role: str, message: str, metadata: Optional[Dict] = None) -> Dict:
+        client = await get_async_supabase_client()
 
         message_data = {
             "conversation_id": conversation_id,
             "role": role,
             "message": message,
-            "message_metadata": metadata or {},
+            "message_metadata": _message_metadata(role, message, metadata),
+            "created_at": _message_timestamp(),
         }
 
-        insert_resp = self.client.table(
+        insert_resp = await client.table(
             "chat_messages").insert(message_data).execute()
 
         return insert_resp.data[0] if insert_resp.data else None
 
-    def get_conversation_messages(self, conversation_id: int) -> List[Dict]:
-        response = self.client.table("chat_messages")\
+    async def enqueue_message(self, conversation_id: int, role: str, message: str, metadata: Optional[Dict] = None):
+        """add_message through the write-behind queue, for when the caller does not need the row back"""
+        await write_queue.insert("chat_messages", {
+            "conversation_id": conversation_id,
+            "role": role,
+            "message": message,
+            "message_metadata": _message_metadata(role, message, metadata),
+            "created_at": _message_timestamp(),
+        }, key=("conversation", conversation_id))
+
+    async def get_conversation_messages(self, conversation_id: int) -> List[Dict]:
+        await write_queue.flush(("conversation", conversation_id))
+        client = await get_async_supabase_client()
+        response = await client.table("chat_messages")\
             .select("*")\
             .eq("conversation_id", conversation_id)\
             .order("created_at", desc=False)\
+            .order("id", desc=False)\
             .execute()
         return response.data or []
 
-   
 
-    def get_recent_messages(self, conversation_id: int, max_messages=None) -> List[Dict]:
+
+    async def get_recent_messages(self, conversation_id: int, max_messages=None, token_budget=None) -> List[Dict]:
+        """Today's history for the prompt: a rolling summary of older turns plus the last max_messages verbatim"""
+        await write_queue.flush(("conversation", conversation_id))
+        client = await get_async_supabase_client()
         start_of_day = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        max_messages = max_messages or 6
+        token_budget = token_budget or get_history_budget("default")
 
-        response = (
-            self.client
+        messages_query = (
+            client
             .table("chat_messages")
             .select("role, message, created_at")
             .eq("conversation_id", conversation_id)
             .gte("created_at", start_of_day.isoformat())  # ISO 8601 with timezone
-            .order("created_at", desc=False)
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(max_messages + HISTORY_FOLD_BATCH)
             .execute()
         )
+        response, (summary, summary_until) = await asyncio.gather(
+            messages_query, self.__get_history_summary(client, conversation_id))
 
-        raw_messages = response.data or []
+        # The summary only covers today, like the history itself
+        if summary_until is None or summary_until < start_of_day:
+            summary, summary_until = None, None
 
-        formatted_messages = [
-            {
-                "role": "assistant" if msg["role"] == "model" else "user",
-                "content": f"Previous message: " +  msg["message"]
-            }
-            for msg in raw_messages
+        raw_messages = [
+            msg for msg in reversed(response.data or [])
             if msg["role"] in ("user", "model") and msg["message"]
+            and (summary_until is None or isoparse(msg["created_at"]) > summary_until)
         ]
 
-        return formatted_messages
+        history, folded = build_history(raw_messages, summary, max_messages, token_budget)
+        if folded:
+            # Persisting the new summary is off the hot path, the next request picks it up. It is best effort
+            # and has its own key, so flushing the conversation never waits on it (or on its retries)
+            values = {
+                "history_summary": fold_into_summary(summary, folded),
+                "history_summary_until": folded[-1]["created_at"],
+            }
+            await session_store.update(conversation_id, values)
+            await write_queue.update("chat_conversations", values, {"id": conversation_id},
+                                     key=("history_summary", conversation_id))
+
+        return history
+
+    async def __get_history_summary(self, client, conversation_id: int):
+        row = await session_store.get(conversation_id)
+        if row is not None:
+            until = row.get("history_summary_until")
+            return row.get("history_summary"), isoparse(until) if until else None
 
-    
-    def get_conversations_record(self, convo_id: int):
-        convo = self.client.table("chat_conversations").select(
+        try:
+            response = await (
+                client.table("chat_conversations")
+                .select("history_summary, history_summary_until")
+                .eq("id", conversation_id)
+                .limit(1)
+                .execute()
+            )
+        except Exception as e:
+            print(f"Could not read history summary: {e}")
+            return None, None
+
+        row = response.data[0] if response.data else {}
+        until = row.get("history_summary_until")
+        return row.get("history_summary"), isoparse(until) if until else None
+
+    async def get_conversations_record(self, convo_id: int):
+        session = await session_store.get(convo_id)
+        if session is not None:
+            return session
+
+        await write_queue.flush(("conversation", convo_id))
+        client = await get_async_supabase_client()
+        convo = await client.table("chat_conversations").select(
             "*").eq("id", convo_id).single().execute()
         print("Convo:", convo.data)
         if convo.data:
+            await session_store.put(convo.data)
             return convo.data
         return None
-    
\ No newline at end of file
+
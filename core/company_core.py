@@ -1,8 +1,78 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from config.config import get_async_supabase_client, get_supabase_client
+from exceptions.global_exception import GlobalException
 
+# How long a user's role and company are trusted, and how long a failed lookup (unknown user) is
+USER_COMPANY_TTL = float(os.getenv("USER_COMPANY_TTL", str(10 * 60)))
+USER_COMPANY_MISS_TTL = float(os.getenv("USER_COMPANY_MISS_TTL", "60"))
+USER_COMPANY_MAX_ENTRIES = int(os.getenv("USER_COMPANY_MAX_ENTRIES", "10000"))
 
-from typing import List
-from config.config import get_supabase_client
-from exceptions.global_exception import GlobalException
+
+class UserCompanyCache:
+    """Per-process LRU of user_profile_id -> (role_id, company_id), or the GlobalException resolving it raised.
+
+    Call invalidate() after changing a user's role (user_roles) or company (user_profiles, company_farmers).
+    """
+
+    def __init__(self, ttl: float = USER_COMPANY_TTL, miss_ttl: float = USER_COMPANY_MISS_TTL,
+                 max_entries: int = USER_COMPANY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_profile_id: int) -> Optional[Tuple[int, int]]:
+        """The cached (role_id, company_id), None when not cached; raises the cached error of an unknown user"""
+        with self._lock:
+            entry = self._entries.get(user_profile_id)
+            if entry is None or entry[2] <= time.monotonic():
+                self._entries.pop(user_profile_id, None)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_profile_id)
+            self.hits += 1
+            resolved, error = entry[0], entry[1]
+
+        if error is not None:
+            raise GlobalException(*error)
+        return resolved
+
+    def put(self, user_profile_id: int, role_id: int, company_id: int):
+        self.__set(user_profile_id, ((role_id, company_id), None), self.ttl)
+
+    def put_error(self, user_profile_id: int, error: GlobalException):
+        self.__set(user_profile_id, (None, (error.message, error.status_code)), self.miss_ttl)
+
+    def invalidate(self, user_profile_id: Optional[int] = None) -> int:
+        """Forget one user, or everyone"""
+        with self._lock:
+            if user_profile_id is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            return 1 if self._entries.pop(user_profile_id, None) is not None else 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __set(self, user_profile_id: int, value: tuple, ttl: float):
+        with self._lock:
+            self._entries[user_profile_id] = (*value, time.monotonic() + ttl)
+            self._entries.move_to_end(user_profile_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+user_company_cache = UserCompanyCache()
 
 
 class Company:
@@ -26,48 +96,82 @@ class Company:
     # Function for fetching the ID of the user using user_profile_id
     # THIS IS FOR ADMIN/SALES REP
     def get_user_company(self, user_profile_id: int):
-        print(user_profile_id)
-
-        # Get user role
-        role_response = self.client.table("user_roles") \
+        return self.get_user_role_and_company(user_profile_id)[1]
+
+    async def get_user_company_async(self, user_profile_id: int):
+        return (await self.get_user_role_and_company_async(user_profile_id))[1]
+
+    def get_user_role_and_company(self, user_profile_id: int) -> Tuple[int, int]:
+        cached = user_company_cache.get(user_profile_id)
+        if cached is not None:
+            return cached
+
+        try:
+            # Get user role
+            role_response = self.__role_query(self.client, user_profile_id).execute()
+            role_id = self.__get_role_id(role_response)
+
+            # Check role and query company id accordingly
+            query, not_found_message = self.__company_query(self.client, role_id, user_profile_id)
+            company_id = self.__get_company_id(query.execute(), not_found_message)
+        except GlobalException as e:
+            user_company_cache.put_error(user_profile_id, e)
+            raise
+
+        user_company_cache.put(user_profile_id, role_id, company_id)
+        return role_id, company_id
+
+    async def get_user_role_and_company_async(self, user_profile_id: int) -> Tuple[int, int]:
+        cached = user_company_cache.get(user_profile_id)
+        if cached is not None:
+            return cached
+
+        client = await get_async_supabase_client()
+        try:
+            role_response = await self.__role_query(client, user_profile_id).execute()
+            role_id = self.__get_role_id(role_response)
+
+            query, not_found_message = self.__company_query(client, role_id, user_profile_id)
+            company_id = self.__get_company_id(await query.execute(), not_found_message)
+        except GlobalException as e:
+            user_company_cache.put_error(user_profile_id, e)
+            raise
+
+        user_company_cache.put(user_profile_id, role_id, company_id)
+        return role_id, company_id
+
+    def __role_query(self, client, user_profile_id: int):
+        return client.table("user_roles") \
             .select("role_id") \
-            .eq("user_profile_id", user_profile_id) \
-            .execute()
+            .eq("user_profile_id", user_profile_id)
 
+    def __get_role_id(self, role_response) -> int:
         if not role_response.data or len(role_response.data) == 0:
             raise GlobalException("User role not found.", 404)
 
-        role_id = role_response.data[0]["role_id"]
-        company_id = None
+        return role_response.data[0]["role_id"]
 
-        # Check role and query company id accordingly
+    def __company_query(self, client, role_id: int, user_profile_id: int):
         if role_id in [1, 2]:
-            response = self.client.table("user_profiles") \
+            query = client.table("user_profiles") \
                 .select("company_id") \
-                .eq("id", user_profile_id) \
-                .execute()
-
-            # Check if response has data before accessing
-            if not response.data or len(response.data) == 0:
-                raise GlobalException("User profile not found.", 404)
-
-            company_id = response.data[0]['company_id']
+                .eq("id", user_profile_id)
+            return query, "User profile not found."
 
         elif role_id == 3:
-            response = self.client.table("company_farmers") \
+            query = client.table("company_farmers") \
                 .select("company_id") \
-                .eq("farmer_user_profile_id", user_profile_id) \
-                .execute()
+                .eq("farmer_user_profile_id", user_profile_id)
+            return query, "Farmer company association not found."
 
-            # Check if response has data before accessing
-            if not response.data or len(response.data) == 0:
-                raise GlobalException(
-                    "Farmer company association not found.", 404)
+        raise GlobalException("Unknown user role.", 400)
 
-            company_id = response.data[0]["company_id"]
+    def __get_company_id(self, response, not_found_message: str):
+        # Check if response has data before accessing
+        if not response.data or len(response.data) == 0:
+            raise GlobalException(not_found_message, 404)
 
-        else:
-            raise GlobalException("Unknown user role.", 400)
+        company_id = response.data[0]["company_id"]
 
         # Final validation for company_id
         if company_id is None:
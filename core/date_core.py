@@ -0,0 +1,193 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+DATE_FORMAT = "%Y/%m/%d"
+
+MONTHS = {
+    "january": 1, "jan": 1, "enero": 1,
+    "february": 2, "feb": 2, "pebrero": 2, "febrero": 2,
+    "march": 3, "mar": 3, "marso": 3,
+    "april": 4, "apr": 4, "abril": 4,
+    "may": 5, "mayo": 5,
+    "june": 6, "jun": 6, "hunyo": 6, "junio": 6,
+    "july": 7, "jul": 7, "hulyo": 7, "julio": 7,
+    "august": 8, "aug": 8, "agosto": 8,
+    "september": 9, "sep": 9, "sept": 9, "setyembre": 9, "septiyembre": 9, "septyembre": 9,
+    "october": 10, "oct": 10, "oktubre": 10, "octubre": 10,
+    "november": 11, "nov": 11, "nobyembre": 11, "noviembre": 11,
+    "december": 12, "dec": 12, "disyembre": 12, "diciembre": 12,
+}
+WEEKDAYS = {
+    "monday": 0, "mon": 0, "lunes": 0,
+    "tuesday": 1, "tue": 1, "tues": 1, "martes": 1,
+    "wednesday": 2, "wed": 2, "miyerkules": 2, "miyerkoles": 2, "mierkoles": 2,
+    "thursday": 3, "thu": 3, "thurs": 3, "huwebes": 3, "huebes": 3,
+    "friday": 4, "fri": 4, "biyernes": 4, "byernes": 4, "biernes": 4,
+    "saturday": 5, "sat": 5, "sabado": 5,
+    "sunday": 6, "sun": 6, "linggo": 6, "dominggo": 6,
+}
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "a": 1, "an": 1, "isang": 1, "isa": 1, "dalawang": 2, "dalawa": 2, "tatlong": 3, "tatlo": 3, "apat": 4, "limang": 5,
+    "lima": 5, "anim": 6, "pitong": 7, "pito": 7, "walong": 8, "walo": 8, "siyam": 9, "sampung": 10, "sampu": 10,
+    "usa": 1, "duha": 2, "tulo": 3, "upat": 4, "unom": 6, "napulo": 10,
+}
+
+# Fixed offsets in days; longer phrases are listed before the words they contain
+RELATIVE_DAYS = [
+    ("day before yesterday", -2), ("day after tomorrow", 2),
+    ("kamakalawa", -2), ("samakalawa", 2), ("sa makalawa", 2), ("makalawa", 2), ("sunod ugma", 2),
+    ("today", 0), ("tonight", 0), ("this morning", 0), ("this afternoon", 0), ("earlier", 0),
+    ("ngayong araw", 0), ("ngayon", 0), ("kanina", 0), ("mamaya", 0), ("karon", 0), ("ganina", 0),
+    ("yesterday", -1), ("last night", -1), ("kahapon", -1), ("kagabi", -1), ("gahapon", -1),
+    ("tomorrow", 1), ("bukas", 1), ("ugma", 1),
+    ("this week", 0), ("ngayong linggo", 0), ("karong semana", 0),
+    ("last week", -7), ("a week ago", -7), ("nakaraang linggo", -7), ("noong isang linggo", -7), ("nakaraang semana", -7),
+    ("miaging semana", -7), ("next week", 7), ("susunod na linggo", 7), ("sunod nga semana", 7), ("sunod semana", 7),
+]
+
+COUNT = r"(\d+|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")"
+UNIT = r"(days?|araw|adlaw|weeks?|linggo|semana)"
+PAST_MARKERS = ("last", "noong", "nakaraang", "nakaraan", "niadtong", "niadto", "miaging", "sadtong", "past")
+NEXT_MARKERS = ("next", "susunod", "sunod", "darating", "coming", "upcoming")
+THIS_MARKERS = ("this", "ngayong", "karong", "nitong")
+
+# "3 days ago", "tatlong araw na ang nakalipas", "nakaraang 3 araw", "3 ka adlaw na ang milabay", "in 2 days"
+AGO_PATTERNS = [
+    re.compile(rf"\b{COUNT}\s+(?:ka\s+)?{UNIT}\s+(?:na\s+)?(?:ago|ang\s+nakalipas|nakalipas|nakaraan|ang\s+milabay|milabay|ang\s+nakaraan)\b"),
+    re.compile(rf"\b(?:nakaraang|nakalipas\s+na|miaging)\s+{COUNT}\s+(?:ka\s+)?{UNIT}\b"),
+]
+AHEAD_PATTERNS = [
+    re.compile(rf"\b(?:in|after|within|pagkalipas\s+ng|sa\s+loob\s+ng|human\s+sa)\s+{COUNT}\s+(?:ka\s+)?{UNIT}\b"),
+    re.compile(rf"\b{COUNT}\s+(?:ka\s+)?{UNIT}\s+(?:from\s+now|mula\s+ngayon|gikan\s+karon)\b"),
+]
+ISO_PATTERN = re.compile(r"\b(\d{4})[/-](\d{1,2})[/-](\d{1,2})\b")
+# "1/2 kg" and "3/4 sako" are fractions, not dates
+FRACTION_UNITS = r"(?:kgs?|kilos?|kilograms?|g|grams?|gramo|sako|sacks?|bags?|trays?|liters?|litro|l)\b"
+NUMERIC_PATTERN = re.compile(rf"\b(\d{{1,2}})/(\d{{1,2}})(?:/(\d{{2}}|\d{{4}}))?\b(?!\s*{FRACTION_UNITS})")
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+MONTH_DAY_PATTERN = re.compile(rf"\b({MONTH_NAMES})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?(?:,?\s+(\d{{4}}))?\b")
+DAY_MONTH_PATTERN = re.compile(rf"\b(?:ika-?\s*)?(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:ng\s+|sa\s+|of\s+)?({MONTH_NAMES})\b\.?(?:,?\s+(\d{{4}}))?")
+WEEKDAY_PATTERN = re.compile(
+    rf"\b(?:({'|'.join(PAST_MARKERS + NEXT_MARKERS + THIS_MARKERS)})(?:\s+na|\s+nga)?\s+)?"
+    rf"(?:(sa|noong|kaniadtong)\s+)?({'|'.join(sorted(WEEKDAYS, key=len, reverse=True))})\b"
+)
+
+
+class DateMatch(NamedTuple):
+    value: date
+    start: int
+    end: int
+
+    def formatted(self) -> str:
+        return self.value.strftime(DATE_FORMAT)
+
+
+def find_dates(text: str, today: Optional[date] = None, prefer: str = "past") -> List[DateMatch]:
+    """Every date expression in text, in order, resolved against today.
+
+    prefer decides bare weekdays and dates without a year: "past" (logs of what happened) picks the latest one
+    not after today, "future" (plans) the earliest one not before today.
+    """
+    today = today or datetime.today().date()
+    lowered = (text or "").lower()
+    found: List[DateMatch] = []
+
+    def add(value: Optional[date], match_start: int, match_end: int):
+        if value is None or any(start < match_end and match_start < end for _, start, end in found):
+            return
+        found.append(DateMatch(value, match_start, match_end))
+
+    for match in ISO_PATTERN.finditer(lowered):
+        add(_safe_date(int(match.group(1)), int(match.group(2)), int(match.group(3))), match.start(), match.end())
+
+    for pattern, month_group, day_group in ((MONTH_DAY_PATTERN, 1, 2), (DAY_MONTH_PATTERN, 2, 1)):
+        for match in pattern.finditer(lowered):
+            # "may" is also a Tagalog word ("may 3 namatay", "3 may sakit"), so it needs a year or "ika-"/"ng"/"of"
+            if match.group(month_group) == "may" and not match.group(3) \
+                    and not re.search(r"\bika-?|\s(?:ng|of|sa)\s", match.group(0)):
+                continue
+            year = int(match.group(3)) if match.group(3) else None
+            add(_resolve_day(today, MONTHS[match.group(month_group)], int(match.group(day_group)), year, prefer),
+                match.start(), match.end())
+
+    for match in NUMERIC_PATTERN.finditer(lowered):
+        year = int(match.group(3)) if match.group(3) else None
+        if year is not None and year < 100:
+            year += 2000
+        add(_resolve_day(today, int(match.group(1)), int(match.group(2)), year, prefer), match.start(), match.end())
+
+    for patterns, sign in ((AGO_PATTERNS, -1), (AHEAD_PATTERNS, 1)):
+        for pattern in patterns:
+            for match in pattern.finditer(lowered):
+                add(today + sign * _span(match.group(1), match.group(2)), match.start(), match.end())
+
+    for phrase, offset in RELATIVE_DAYS:
+        for match in re.finditer(rf"\b{re.escape(phrase)}\b", lowered):
+            add(today + timedelta(days=offset), match.start(), match.end())
+
+    for match in WEEKDAY_PATTERN.finditer(lowered):
+        marker, preposition, weekday = match.groups()
+        # Bare "linggo" usually means "week", and short English forms are ordinary words ("sat", "sun", "mar")
+        if marker is None and preposition is None and (weekday == "linggo" or len(weekday) <= 4):
+            continue
+        # "sa Lunes" is the coming Monday, "noong Lunes" the last one
+        if marker is None and preposition is not None:
+            marker = "next" if preposition == "sa" else "last"
+        add(_resolve_weekday(today, WEEKDAYS[weekday], marker, prefer), match.start(), match.end())
+
+    return sorted(found, key=lambda item: item.start)
+
+
+def find_date(text: str, today: Optional[date] = None, prefer: str = "past") -> Optional[DateMatch]:
+    dates = find_dates(text, today, prefer)
+    return dates[0] if dates else None
+
+
+def normalize_date(text: str, today: Optional[date] = None, prefer: str = "past") -> Optional[str]:
+    """First date in text as YYYY/MM/DD, None if it has none"""
+    match = find_date(text, today, prefer)
+    return match.formatted() if match else None
+
+
+def _safe_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _resolve_day(today: date, month: int, day: int, year: Optional[int], prefer: str) -> Optional[date]:
+    if year is not None:
+        return _safe_date(year, month, day)
+
+    value = _safe_date(today.year, month, day)
+    if value is None:
+        return None
+    if prefer == "past" and value > today:
+        return _safe_date(today.year - 1, month, day)
+    if prefer == "future" and value < today:
+        return _safe_date(today.year + 1, month, day)
+    return value
+
+
+def _resolve_weekday(today: date, weekday: int, marker: Optional[str], prefer: str) -> date:
+    days_back = (today.weekday() - weekday) % 7
+    days_ahead = (weekday - today.weekday()) % 7
+
+    if marker in PAST_MARKERS:
+        return today - timedelta(days=days_back or 7)
+    if marker in NEXT_MARKERS:
+        return today + timedelta(days=days_ahead or 7)
+    if marker in THIS_MARKERS:
+        # The day of the current Monday-to-Sunday week
+        return today + timedelta(days=weekday - today.weekday())
+    return today - timedelta(days=days_back) if prefer == "past" else today + timedelta(days=days_ahead)
+
+
+def _span(count: str, unit: str) -> timedelta:
+    amount = int(count) if count.isdigit() else NUMBER_WORDS[count]
+    if unit.startswith(("week", "linggo", "semana")):
+        return timedelta(weeks=amount)
+    return timedelta(days=amount)
@@ -1,6 +1,8 @@
 from datetime import datetime
 from typing import List, Optional, Dict
-from config.config import get_supabase_client
+from config.config import get_async_supabase_client, get_supabase_client
+from core.faq_index_core import faq_index
+from core.write_queue_core import write_queue
 
 
 
@@ -16,8 +18,29 @@ class Faq:
       "company_id": company_id
     }).execute()
 
+    faq_index.add(response.data[0] if response.data else None)
     return response.data[0]["id"] if response.data[0] else None
+
+  async def insert_faq_async(self, question: str, answer: str, category: str, company_id: int):
+    client = await get_async_supabase_client()
+    response = await client.table("faq").insert({
+      "category": category,
+      "question": question,
+      "answer": answer,
+      "company_id": company_id
+    }).execute()
+
+    faq_index.add(response.data[0] if response.data else None)
+    return response.data[0]["id"] if response.data else None
   
+  async def enqueue_faq(self, question: str, answer: str, category: str, company_id: int):
+    await write_queue.insert("faq", {
+      "category": category,
+      "question": question,
+      "answer": answer,
+      "company_id": company_id
+    }, on_done=faq_index.add)
+
   def get_faq(self, limit: int = 10, offset: int = 0):
         
     category_counts = self.client.rpc("faq_category_counts").execute()
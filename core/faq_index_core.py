@@ -0,0 +1,247 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from core.answer_cache_core import FILLER_WORDS
+
+# Snapshot of the indexed rows (farmer questions and answers), off unless set; point it at a private directory,
+# not a shared temp dir. The file is written readable by its owner only
+FAQ_INDEX_SNAPSHOT = os.getenv("FAQ_INDEX_SNAPSHOT", "")
+FAQ_INDEX_PAGE_SIZE = int(os.getenv("FAQ_INDEX_PAGE_SIZE", "1000"))
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+
+# Words that show up in nearly every question and only make the posting lists long
+STOPWORDS = FILLER_WORDS | frozenset({
+    "a", "an", "the", "is", "are", "was", "be", "to", "of", "in", "on", "for", "and", "or", "it", "i", "my",
+    "me", "you", "your", "what", "how", "do", "does", "can", "should", "with", "at", "this", "that",
+    "ang", "ng", "sa", "mga", "na", "at", "ay", "ko", "mo", "ano", "paano", "si", "ni", "kay", "yung", "ung",
+    "ba", "kung", "para", "may", "ako", "ikaw", "siya", "ito", "iyan", "iyon", "unsa", "ug", "og", "nga",
+})
+
+QUESTION_WEIGHT = 2
+FAQ_FIELDS = ("id", "question", "answer", "category", "company_id", "updated_at")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in STOPWORDS]
+
+
+class CompanyFaqIndex:
+    """BM25 postings for the FAQ rows of one company"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_terms: Dict[int, Counter] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def add(self, doc_id: int, question: str, answer: str):
+        # Question words count double, they describe what the row is about
+        terms = Counter()
+        for token in tokenize(question):
+            terms[token] += QUESTION_WEIGHT
+        terms.update(tokenize(answer))
+
+        self.doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+
+    def remove(self, doc_id: int):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+
+    def score(self, query_terms: List[str], k1: float, b: float) -> Dict[int, float]:
+        count = len(self.doc_lengths)
+        if not count:
+            return {}
+
+        average_length = self.total_length / count
+        scores: Dict[int, float] = {}
+        for term in set(query_terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, frequency in posting.items():
+                norm = k1 * (1 - b + b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+        return scores
+
+
+class FaqIndex:
+    """In-process inverted index over faq.question/answer, partitioned by company_id"""
+
+    def __init__(self, snapshot_path: str = FAQ_INDEX_SNAPSHOT, k1: float = 1.2, b: float = 0.75):
+        self.snapshot_path = snapshot_path
+        self.k1 = k1
+        self.b = b
+        self._companies: Dict[Optional[int], CompanyFaqIndex] = {}
+        self._docs: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, row: Dict):
+        """Index a faq row, replacing any earlier version with the same id"""
+        if not row or row.get("id") is None:
+            return
+
+        doc = {field: row.get(field) for field in FAQ_FIELDS}
+        with self._lock:
+            self.__remove(doc["id"])
+            self._docs[doc["id"]] = doc
+            self._companies.setdefault(doc["company_id"], CompanyFaqIndex()).add(doc["id"], doc["question"], doc["answer"])
+
+    def add_many(self, rows: List[Dict]):
+        for row in rows:
+            self.add(row)
+
+    def remove(self, faq_id: int):
+        with self._lock:
+            self.__remove(faq_id)
+
+    def search(self, company_id: Optional[int], query: str, limit: int = 10, category: Optional[str] = None) -> List[Dict]:
+        query_terms = tokenize(query)
+        if not query_terms:
+            return []
+
+        with self._lock:
+            company_index = self._companies.get(company_id)
+            if company_index is None:
+                return []
+
+            scores = company_index.score(query_terms, self.k1, self.b)
+            if category:
+                scores = {doc_id: score for doc_id, score in scores.items() if self._docs[doc_id]["category"] == category}
+
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [{**self._docs[doc_id], "score": round(score, 4)} for doc_id, score in top]
+
+    def top_k_answers(self, company_id: Optional[int], question: str, k: int = 3, min_score: float = 0.0) -> List[Dict]:
+        """Most similar previously answered questions, for the chat handlers"""
+        return [result for result in self.search(company_id, question, k) if result["score"] >= min_score]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "documents": len(self._docs),
+                "companies": len(self._companies),
+                "terms": sum(len(index.postings) for index in self._companies.values()),
+            }
+
+    def rebuild(self, client) -> int:
+        """Replace the index with every faq row in the database"""
+        rows = self.__fetch(client)
+        with self._lock:
+            self._companies = {}
+            self._docs = {}
+        self.add_many(rows)
+        return len(rows)
+
+    def warm(self, client) -> int:
+        """Load the snapshot if there is one and catch up on rows added, edited or deleted since, otherwise rebuild.
+
+        Rows are compared by updated_at, which sql/faq_updated_at.sql keeps current for edits made anywhere; without
+        the column (or with a snapshot from before it was indexed) the snapshot cannot be trusted and is rebuilt.
+        """
+        if not self.load_snapshot():
+            return self.rebuild(client)
+
+        try:
+            current = {row["id"]: row.get("updated_at") for row in self.__fetch(client, fields=("id", "updated_at"))}
+        except Exception as e:
+            print(f"faq.updated_at unavailable, rebuilding the FAQ index: {e}")
+            return self.rebuild(client)
+
+        with self._lock:
+            known = {doc_id: doc.get("updated_at") for doc_id, doc in self._docs.items()}
+        if any(updated_at is None for updated_at in known.values()) or any(updated_at is None for updated_at in current.values()):
+            return self.rebuild(client)
+
+        for faq_id in known.keys() - current.keys():
+            self.remove(faq_id)
+
+        changed = [faq_id for faq_id, updated_at in current.items() if updated_at != known.get(faq_id)]
+        for start in range(0, len(changed), FAQ_INDEX_PAGE_SIZE):
+            response = (
+                client.table("faq")
+                .select(", ".join(FAQ_FIELDS))
+                .in_("id", changed[start:start + FAQ_INDEX_PAGE_SIZE])
+                .execute()
+            )
+            self.add_many(response.data or [])
+        return len(self._docs)
+
+    def save_snapshot(self) -> bool:
+        if not self.snapshot_path:
+            return False
+
+        with self._lock:
+            docs = list(self._docs.values())
+
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as file:
+            json.dump({"version": 1, "docs": docs}, file, ensure_ascii=False)
+        os.replace(temp_path, self.snapshot_path)
+        return True
+
+    def load_snapshot(self) -> bool:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable FAQ index snapshot: {e}")
+            return False
+
+        self.add_many(snapshot.get("docs", []))
+        return True
+
+    def __fetch(self, client, after_id: int = 0, fields=FAQ_FIELDS) -> List[Dict]:
+        rows = []
+        while True:
+            response = (
+                client.table("faq")
+                .select(", ".join(fields))
+                .gt("id", after_id)
+                .order("id")
+                .limit(FAQ_INDEX_PAGE_SIZE)
+                .execute()
+            )
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < FAQ_INDEX_PAGE_SIZE:
+                return rows
+            after_id = page[-1]["id"]
+
+    def __remove(self, faq_id: int):
+        doc = self._docs.pop(faq_id, None)
+        if doc is None:
+            return
+
+        company_index = self._companies.get(doc["company_id"])
+        if company_index is not None:
+            company_index.remove(faq_id)
+
+
+faq_index = FaqIndex()
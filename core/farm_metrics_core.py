@@ -0,0 +1,223 @@
+from datetime import timezone
+from typing import Dict, List, Optional
+
+from dateutil.parser import parse
+
+FEED_INTAKE_STATUSES = ("eating_well", "picky", "not_eating")
+FEED_INTAKE_WEIGHTS = {"eating_well": 1.0, "picky": 0.5, "not_eating": 0.0}
+# Health score penalties per affected bird, and per incident with symptoms or a suspected cause
+SICKNESS_PENALTY = 2
+MORTALITY_PENALTY = 4
+NOTE_PENALTY = 1
+
+
+class FarmMetrics:
+    """Every farm widget metric from one pass over a feed program's performance logs and health incidents.
+
+    Used by the v2 widget endpoints, the combined v2 dashboard and the dashboard view model, so each number
+    is computed the same way everywhere.
+    """
+
+    def __init__(self, logs: Optional[List[Dict]] = None, incidents: Optional[List[Dict]] = None):
+        # Newest first, the order every widget lists logs in
+        self.logs = sorted(logs or [], key=lambda log: log["created_at"], reverse=True)
+        self.incidents = incidents or []
+
+        self.total_weight_kg = 0.0
+        self.log_mortality = 0
+        self.feed_intake_summary = {status: 0 for status in FEED_INTAKE_STATUSES}
+        self.recent_feed_records = []
+        self.latest_per_day: Dict[str, Dict] = {}
+        self.mortality_events = []
+
+        weights_valid = True
+        for log in self.logs:
+            created_at = parse(log["created_at"])
+            day = created_at.date().isoformat()
+            self.latest_per_day.setdefault(day, log)
+
+            try:
+                self.total_weight_kg += float(log.get("average_weight_kg", 0.0))
+            except (ValueError, TypeError):
+                weights_valid = False
+
+            mortality_count = log.get("mortality_count")
+            if mortality_count:
+                self.log_mortality += mortality_count
+                self.mortality_events.append((created_at, mortality_count, "performance_log"))
+
+            behavior = log.get("feed_intake_status")
+            if behavior in self.feed_intake_summary:
+                self.feed_intake_summary[behavior] += 1
+            self.recent_feed_records.append({
+                "date": created_at.isoformat(),
+                "feed_intake_status": behavior,
+                "feed_intake_kg": log.get("feed_intake_kg")
+            })
+
+        self.total_weight_kg = round(self.total_weight_kg, 3) if weights_valid else 0.0
+
+        self.sick_count = 0
+        self.incident_mortality = 0
+        self.notes_count = 0
+        self.incident_penalty = 0
+        self.recent_issues = []
+        for incident in self.incidents:
+            kind = incident.get("incident_type")
+            affected = incident.get("affected_count", 0)
+
+            if kind == "sickness":
+                self.sick_count += affected
+                self.incident_penalty += affected * SICKNESS_PENALTY
+            elif kind == "mortality":
+                self.incident_mortality += affected
+                self.incident_penalty += affected * MORTALITY_PENALTY
+                if affected > 0 and incident.get("created_at"):
+                    self.mortality_events.append((parse(incident["created_at"]), affected, "health_incident"))
+            if incident.get("symptoms") or incident.get("suspected_cause"):
+                self.notes_count += 1
+                self.incident_penalty += NOTE_PENALTY
+
+            self.recent_issues.append({
+                "date": incident.get("incident_date"),
+                "incident_type": kind,
+                "affected_count": affected,
+                "symptoms": incident.get("symptoms"),
+                "suspected_cause": incident.get("suspected_cause"),
+                "requires_vet_visit": incident.get("requires_vet_visit"),
+                "feed_info": incident.get("feed_info"),
+                "actions_taken": incident.get("actions_taken"),
+            })
+
+        self.mortality_events.sort(key=lambda event: _aware(event[0]))
+
+    @property
+    def latest_log(self) -> Dict:
+        return self.logs[0] if self.logs else {}
+
+    def growth_rate(self) -> Dict:
+        """Average daily gain between the oldest and the newest log"""
+        if len(self.logs) < 2:
+            return {"growth_rate": 0.0, "raw_gain_kg": 0.0}
+
+        first_log = self.logs[-1]
+        last_log = self.logs[0]
+        try:
+            weight_start = float(first_log.get("average_weight_kg", 0.0))
+            weight_end = float(last_log.get("average_weight_kg", 0.0))
+            days = (parse(last_log["created_at"]) - parse(first_log["created_at"])).days
+        except (ValueError, TypeError) as e:
+            print(f"Error calculating growth rate: {e}")
+            return {"growth_rate": 0.0, "raw_gain_kg": 0.0}
+
+        if days <= 0:
+            return {"growth_rate": 0.0, "raw_gain_kg": 0.0}
+        return {
+            "growth_rate": round((weight_end - weight_start) / days, 3),
+            "raw_gain_kg": round(weight_end - weight_start, 3)
+        }
+
+    def flock_tracking(self, initial_flock_size: int) -> Dict:
+        """Flock size after every mortality (performance logs and incidents) in date order"""
+        if initial_flock_size <= 0:
+            return {
+                "current_flock_size": initial_flock_size,
+                "total_mortality": 0,
+                "mortality_percentage": 0.0,
+                "survival_rate": 1.0,
+                "mortality_breakdown": {"from_performance_logs": 0, "from_health_incidents": 0}
+            }
+
+        current_flock_size = initial_flock_size
+        breakdown = {"performance_log": 0, "health_incident": 0}
+        for _, count, source in self.mortality_events:
+            current_flock_size = max(0, current_flock_size - count)
+            breakdown[source] += count
+
+        total_mortality = breakdown["performance_log"] + breakdown["health_incident"]
+        return {
+            "current_flock_size": current_flock_size,
+            "total_mortality": total_mortality,
+            "mortality_percentage": round((total_mortality / initial_flock_size) * 100, 2),
+            "survival_rate": round(current_flock_size / initial_flock_size, 4),
+            "mortality_breakdown": {
+                "from_performance_logs": breakdown["performance_log"],
+                "from_health_incidents": breakdown["health_incident"]
+            }
+        }
+
+    def growth_chart(self, target_weight: float) -> List[Dict]:
+        """Latest weight of every day with a log, oldest day first"""
+        return [
+            {
+                "date": day,
+                "actual_weight": float(log.get("average_weight_kg", 0.0)),
+                "target_weight": target_weight
+            }
+            for day, log in sorted(self.latest_per_day.items())
+        ]
+
+    def recent_records(self, start_date: Optional[str] = None) -> List[Dict]:
+        """Logged weights, newest first; with start_date each record also gets its day of the program"""
+        records = []
+        for log in self.logs:
+            log_date = parse(log["created_at"]).date()
+            record = {"date": log_date.isoformat()}
+            if start_date:
+                record["day"] = f"Day {(log_date - parse(start_date).date()).days + 1}"
+            record["actual_weight"] = float(log.get("average_weight_kg", 0.0))
+            record["note"] = log.get("notes", "")
+            records.append(record)
+        return records
+
+    def feed_intake_behavior(self) -> Dict:
+        total = sum(self.feed_intake_summary.values())
+        behavior_score = 0.0
+        if total > 0:
+            weighted_score = sum(count * FEED_INTAKE_WEIGHTS[status] for status, count in self.feed_intake_summary.items())
+            behavior_score = round((weighted_score / total) * 100, 2)
+
+        return {
+            "behavior_score": behavior_score,
+            "behavior_status": max(self.feed_intake_summary, key=self.feed_intake_summary.get) if total else "no_data",
+            "summary": dict(self.feed_intake_summary),
+            "recent_feed_records": list(self.recent_feed_records),
+        }
+
+    def health_watch(self, include_log_mortality: bool = False) -> Dict:
+        """Health score and issues from the incidents; optionally counting performance log mortality as issues too"""
+        mortality_count = self.incident_mortality
+        health_score = 100 - self.incident_penalty
+        recent_issues = list(self.recent_issues)
+
+        if include_log_mortality:
+            mortality_count += self.log_mortality
+            health_score -= self.log_mortality * MORTALITY_PENALTY
+            for log in self.logs:
+                if log.get("mortality_count"):
+                    recent_issues.append({
+                        "date": log.get("created_at"),
+                        "incident_type": "mortality",
+                        "affected_count": log["mortality_count"],
+                        "symptoms": "Recorded in performance log",
+                        "suspected_cause": log.get("notes", "Not specified"),
+                        "requires_vet_visit": False,
+                        "feed_info": None,
+                        "actions_taken": None,
+                    })
+            recent_issues.sort(key=lambda issue: _aware(parse(issue["date"])), reverse=True)
+
+        return {
+            "health_score": max(0, min(health_score, 100)),
+            "issue_summary": {
+                "sick": self.sick_count,
+                "mortality": mortality_count,
+                "notes": self.notes_count
+            },
+            "recent_issues": recent_issues
+        }
+
+
+def _aware(value):
+    # Incident dates are plain dates while log timestamps carry a timezone
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
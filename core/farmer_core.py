@@ -2,6 +2,7 @@ from datetime import datetime, timezone
 from typing import List, Optional, Dict
 from config.config import get_supabase_client
 from core.company_core import Company
+from core.reference_data_core import reference_data
 from exceptions.global_exception import GlobalException
 
 
@@ -31,10 +32,7 @@ class Farmer:
         days_used = (current_date - date).days
 
         # Get feed product info
-        feed_product_response = self.client.table("feed_products").select("*") \
-            .eq("id", feed_product_id).single().execute()
-
-        feed_product = feed_product_response.data or {}
+        feed_product = reference_data.feed_product(feed_product_id) or {}
         return days_used, feed_product.get("name", "")
 
     def create_farm_health_incident(self, farmer_user_profile_id: int, form_data: Dict):
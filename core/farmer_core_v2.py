@@ -1,8 +1,11 @@
 from dateutil.parser import parse
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
-from config.config import get_supabase_client
+from config.config import get_async_supabase_client, get_supabase_client
 from core.company_core import Company
+from core.farm_metrics_core import FarmMetrics
+from core.query_executor_core import QueryPlan
+from core.reference_data_core import reference_data
 from exceptions.global_exception import GlobalException
 from models.feed_calculator_model import CreateFeedCalculatorPayload, FeedCalculatorDto, UpdateFeedCalculatorPayload
 
@@ -32,14 +35,8 @@ class FarmerV2:
 
     # Get active feed program (NOTE ONLY ONE ACTIVE PROGRAM IS ALLOWED)
     def get_active_feed_program(self, farmer_user_profile_id: int):
-        response = (
-            self.Client.table("feed_programs")
-            .select("*")
-            .eq("farmer_user_profile_id", farmer_user_profile_id)
-            .eq("status", "active")
-            .limit(1)
-            .execute()
-        )
+        response = self.__active_feed_program_query(
+            self.Client, farmer_user_profile_id).execute()
 
         if not response.data or len(response.data) == 0:
             raise GlobalException(
@@ -51,51 +48,102 @@ class FarmerV2:
 
         return updated_program
 
+    async def get_active_feed_program_async(self, farmer_user_profile_id: int):
+        client = await get_async_supabase_client()
+        response = await self.__active_feed_program_query(
+            client, farmer_user_profile_id).execute()
+
+        if not response.data or len(response.data) == 0:
+            raise GlobalException(
+                "There is no current active feed program.", 404)
+
+        return await self._update_days_on_feed_async(response.data[0])
+
+    def __active_feed_program_query(self, client, farmer_user_profile_id: int):
+        return (
+            client.table("feed_programs")
+            .select("*")
+            .eq("farmer_user_profile_id", farmer_user_profile_id)
+            .eq("status", "active")
+            .limit(1)
+        )
+
     def _update_days_on_feed(self, feed_program: dict) -> dict:
         try:
-            start_date_str = feed_program.get("start_date")
-            if not start_date_str:
+            update = self.__get_days_on_feed_update(feed_program)
+            if update is None:
                 return feed_program
 
-            start_date = parse(start_date_str)
-            if start_date.tzinfo is None:
-                start_date = start_date.replace(tzinfo=timezone.utc)
-
-            now_utc = datetime.now(timezone.utc)
-            time_diff = now_utc - start_date
-            total_hours = time_diff.total_seconds() / 3600
-            
-            new_days_on_feed = int(total_hours // 24) + 1
-            current_days_on_feed = feed_program.get("days_on_feed", 1)
-
-            if new_days_on_feed != current_days_on_feed:
-                update_response = (
-                    self.Client.table("feed_programs")
-                    .update({
-                        "days_on_feed": new_days_on_feed,
-                        "updated_at": now_utc.isoformat()
-                    })
-                    .eq("id", feed_program["id"])
-                    .execute()
-                )
-
-                if update_response.data:
-                    feed_program["days_on_feed"] = new_days_on_feed
-                    feed_program["updated_at"] = now_utc.isoformat()
-                    # print(f"Successfully updated days_on_feed from {current_days_on_feed} to {new_days_on_feed} for feed program {feed_program['id']}")
-                else:
-                    print(f"Failed to update days_on_feed for feed program {feed_program['id']}")
-            else:
-                print(f"No update needed. Days on feed is correct: {current_days_on_feed}")
+            update_response = (
+                self.Client.table("feed_programs")
+                .update(update)
+                .eq("id", feed_program["id"])
+                .execute()
+            )
 
+            return self.__apply_days_on_feed_update(feed_program, update, update_response)
+
+        except Exception as e:
+            print(f"Error updating days_on_feed: {e}")
+            import traceback
+            traceback.print_exc()
             return feed_program
 
+    async def _update_days_on_feed_async(self, feed_program: dict) -> dict:
+        try:
+            update = self.__get_days_on_feed_update(feed_program)
+            if update is None:
+                return feed_program
+
+            client = await get_async_supabase_client()
+            update_response = await (
+                client.table("feed_programs")
+                .update(update)
+                .eq("id", feed_program["id"])
+                .execute()
+            )
+
+            return self.__apply_days_on_feed_update(feed_program, update, update_response)
+
         except Exception as e:
             print(f"Error updating days_on_feed: {e}")
             import traceback
             traceback.print_exc()
             return feed_program
 
+    def __get_days_on_feed_update(self, feed_program: dict) -> Optional[dict]:
+        start_date_str = feed_program.get("start_date")
+        if not start_date_str:
+            return None
+
+        start_date = parse(start_date_str)
+        if start_date.tzinfo is None:
+            start_date = start_date.replace(tzinfo=timezone.utc)
+
+        now_utc = datetime.now(timezone.utc)
+        time_diff = now_utc - start_date
+        total_hours = time_diff.total_seconds() / 3600
+
+        new_days_on_feed = int(total_hours // 24) + 1
+        current_days_on_feed = feed_program.get("days_on_feed", 1)
+
+        if new_days_on_feed == current_days_on_feed:
+            print(f"No update needed. Days on feed is correct: {current_days_on_feed}")
+            return None
+
+        return {
+            "days_on_feed": new_days_on_feed,
+            "updated_at": now_utc.isoformat()
+        }
+
+    def __apply_days_on_feed_update(self, feed_program: dict, update: dict, update_response) -> dict:
+        if update_response.data:
+            feed_program.update(update)
+            # print(f"Successfully updated days_on_feed to {update['days_on_feed']} for feed program {feed_program['id']}")
+        else:
+            print(f"Failed to update days_on_feed for feed program {feed_program['id']}")
+        return feed_program
+
     # Update current active feed program (helper method when farmer switched midway without explicitly marking the current program as incomplete or complete)
     def update_current_active_feed_program(self, farmer_user_profile_id: int):
         response = (
@@ -159,14 +207,9 @@ class FarmerV2:
 
     # Method to get current feed product associated with active feed program
     def get_active_feed_product(self, farmer_user_profile_id: int):
-        feed_program_response = (
-            self.Client.table("feed_programs")
-            .select("id, feed_product_id, days_on_feed, status")
-            .eq("farmer_user_profile_id", farmer_user_profile_id)
-            .eq("status", "active")
-            .limit(1)
-            .execute()
-        )
+        # Same query as get_active_feed_program, so a request asking for both reads the row once (see core.identity_map_core)
+        feed_program_response = self.__active_feed_program_query(
+            self.Client, farmer_user_profile_id).execute()
 
         if not feed_program_response.data:
             return None  # No active feed program
@@ -174,18 +217,27 @@ class FarmerV2:
         feed_program = feed_program_response.data[0]
 
         # Fetch feed product details
-        feed_product_response = (
-            self.Client.table("feed_products")
-            .select("id, name, feed_stage, age_range_start, age_range_end, goal")
-            .eq("id", feed_program["feed_product_id"])
-            .limit(1)
-            .execute()
-        )
+        feed_product = reference_data.feed_product(feed_program["feed_product_id"])
 
-        if not feed_product_response.data:
-            return None  # No feed product found
+        return self.__build_feed_product_dto(feed_program, feed_product)
 
-        feed_product = feed_product_response.data[0]
+    async def get_active_feed_product_async(self, farmer_user_profile_id: int):
+        client = await get_async_supabase_client()
+        feed_program_response = await self.__active_feed_program_query(
+            client, farmer_user_profile_id).execute()
+
+        if not feed_program_response.data:
+            return None  # No active feed program
+
+        feed_program = feed_program_response.data[0]
+
+        feed_product = await reference_data.feed_product_async(feed_program["feed_product_id"])
+
+        return self.__build_feed_product_dto(feed_program, feed_product)
+
+    def __build_feed_product_dto(self, feed_program: dict, feed_product: Optional[dict]) -> Optional[dict]:
+        if not feed_product:
+            return None  # No feed product found
 
         # Build DTO
         feed_product_dto = {
@@ -257,154 +309,10 @@ class FarmerV2:
 
     def read_growth_performance(self, farmer_user_profile_id: int) -> Dict:
         try:
-            user_exists = (self.Client.table("user_profiles")
-                           .select("id")
-                           .eq("id", farmer_user_profile_id)
-                           .limit(1)
-                           .execute())
-
-            if not user_exists.data:
-                raise GlobalException(
-                    f"User profile ID {farmer_user_profile_id} does not exist", 404)
-
-            # Get active feed program
-            try:
-                feed_program = self.get_active_feed_program(
-                    farmer_user_profile_id)
-                feed_program_start_date = feed_program.get("start_date")
-                feed_program_end_date = feed_program.get("end_date")
-                feed_product_id = feed_program.get("feed_product_id")
-                # Get initial flock size from the active feed program
-                initial_flock_size = feed_program.get("animal_quantity", 0)
-            except:
+            data = self.__read_feed_program_data(farmer_user_profile_id, errors=Exception)
+            if data is None:
                 return self.__get_default_growth_performance()
-
-            # get farm performance logs within the active feed program
-            farm_performance_logs = []
-            if feed_program_start_date:
-                query = (
-                    self.Client.table("farm_performance_logs")
-                    .select("*")
-                    .eq("user_profile_id", farmer_user_profile_id)
-                    .gte("created_at", feed_program_start_date)
-                    # Order by oldest first for tracking
-                    .order("created_at", desc=False)
-                )
-                if feed_program_end_date:
-                    query = query.lte("created_at", feed_program_end_date)
-
-                farm_logs_response = query.execute()
-                farm_performance_logs = farm_logs_response.data or []
-
-            # get health incidents within the active feed program
-            health_incidents = []
-            if feed_program_start_date:
-                query = (
-                    self.Client.table("health_incidents")
-                    .select("*")
-                    .eq("farmer_user_profile_id", farmer_user_profile_id)
-                    .gte("created_at", feed_program_start_date)
-                    # Order by oldest first for tracking
-                    .order("created_at", desc=False)
-                )
-                if feed_program_end_date:
-                    query = query.lte("created_at", feed_program_end_date)
-
-                health_incidents_response = query.execute()
-                health_incidents = health_incidents_response.data or []
-
-            if not farm_performance_logs and not health_incidents:
-                return self.__get_default_growth_performance()
-
-            # Calculate dynamic flock tracking from both sources
-            flock_tracking = self.__calculate_dynamic_flock_size(
-                initial_flock_size, farm_performance_logs, health_incidents)
-
-            current_flock_size = flock_tracking["current_flock_size"]
-            total_mortality = flock_tracking["total_mortality"]
-            mortality_percentage = flock_tracking["mortality_percentage"]
-            survival_rate = flock_tracking["survival_rate"]
-
-            total_farm_performance_logs = len(farm_performance_logs)
-            # Re-order for latest first after calculations
-            farm_performance_logs_desc = sorted(farm_performance_logs,
-                                                key=lambda x: x["created_at"], reverse=True)
-            latest_farm_performance_log = farm_performance_logs_desc[0]
-
-            # Get the growth rate
-            growth_data = self.__calculate_growth_rate(farm_performance_logs)
-            growth_rate = growth_data["growth_rate"]
-
-            # performance calculation section
-            try:
-                total_weight_kg = round(
-                    sum(float(log.get("average_weight_kg", 0.0)) for log in farm_performance_logs), 3)
-
-                # fcr = float(latest_farm_performance_log.get("feed_convertion_ratio", 1.0))
-                # if fcr > 0:
-                #     performance_index = round(
-                #         ((average_weight * survival_rate) / fcr) * 100, 2)
-                # else:
-                #     performance_index = 0.0
-            except (ValueError, TypeError):
-                # average_weight = 0.0
-                total_weight_kg = 0.0
-                # performance_index = 0.0
-
-            actual_weight = float(
-                latest_farm_performance_log.get("average_weight_kg", 0.0))
-
-            # Get target weight based on current feed product
-            target_weight = self.__get_target_weight_by_feed_product(
-                feed_product_id)
-
-            # Build growth chart data - only for current feed program period
-            growth_chart_data = []
-            if feed_program_start_date and farm_performance_logs:
-                latest_per_day = {}
-                for log in farm_performance_logs:
-                    date_str = parse(log["created_at"]).date().isoformat()
-                    latest_per_day[date_str] = log
-
-                growth_chart_data = [
-                    {
-                        "date": date,
-                        "actual_weight": float(log.get("average_weight_kg", 0.0)),
-                        "target_weight": target_weight
-                    }
-                    for date, log in sorted(latest_per_day.items())
-                ]
-
-            # Build recent records - only for current feed program period
-            recent_records = []
-            if feed_program_start_date and farm_performance_logs_desc:
-                for log in farm_performance_logs_desc:
-                    log_date = parse(log["created_at"]).date()
-                    recent_records.append({
-                        "date": log_date.isoformat(),
-                        "actual_weight": float(log.get("average_weight_kg", 0.0)),
-                        "note": log.get("notes", "")
-                    })
-
-            return {
-                "daily_average_growth_rate": growth_rate,
-                "actual_weight": actual_weight,
-                "target_weight": target_weight,
-                "growth_chart_data": growth_chart_data,
-                "performance_analytics": {
-                    "total_logs": total_farm_performance_logs,
-                    "total_weight_kg": total_weight_kg,
-                    "mortality_count": total_mortality,
-                    "mortality_percentage": mortality_percentage,
-                    "initial_flock_size": initial_flock_size,  # Starting flock size
-                    # Current flock size after mortalities
-                    "current_flock_size": current_flock_size,
-                    # "survival_rate": survival_rate,
-                    # Breakdown by source
-                    "mortality_breakdown": flock_tracking["mortality_breakdown"],
-                    "recent_records": recent_records,
-                }
-            }
+            return self.__build_growth_performance(data)
 
         except GlobalException:
             raise
@@ -414,90 +322,10 @@ class FarmerV2:
 
     def read_feed_intake_behavior(self, farmer_user_profile_id: int):
         try:
-            user_exists = (self.Client.table("user_profiles")
-                           .select("id")
-                           .eq("id", farmer_user_profile_id)
-                           .limit(1)
-                           .execute())
-
-            if not user_exists.data:
-                raise GlobalException(
-                    f"User profile ID {farmer_user_profile_id} does not exist.")
-
-            try:
-                feed_program = self.get_active_feed_program(
-                    farmer_user_profile_id)
-                feed_program_start_date = feed_program.get("start_date")
-                feed_program_end_date = feed_program.get("end_date")
-                feed_product_id = feed_program.get("feed_product_id")
-            except GlobalException:
-                return self.__get_default_feed_intake_behavior()
-
-            # get farm performance logs within the active feed program
-            farm_performance_logs = []
-            if feed_program_start_date:
-                query = (
-                    self.Client.table("farm_performance_logs")
-                    .select("*")
-                    .eq("user_profile_id", farmer_user_profile_id)
-                    .gte("created_at", feed_program_start_date)
-                    .order("created_at", desc=True)
-                )
-                if feed_program_end_date:
-                    query = query.lte("created_at", feed_program_end_date)
-
-                farm_logs_response = query.execute()
-                farm_performance_logs = farm_logs_response.data or []
-
-            # If no logs for this feed program, return defaults
-            if not farm_performance_logs:
+            data = self.__read_feed_program_data(farmer_user_profile_id, with_incidents=False, with_target=False)
+            if data is None:
                 return self.__get_default_feed_intake_behavior()
-
-            # Feed intake analysis
-            feed_intake_summary = {
-                "eating_well": 0,
-                "picky": 0,
-                "not_eating": 0
-            }
-            total_feed_behavior_logs = 0
-
-            recent_feed_records = []
-            for log in farm_performance_logs:
-                behavior = log.get("feed_intake_status")
-                if behavior in feed_intake_summary:
-                    feed_intake_summary[behavior] += 1
-                    total_feed_behavior_logs += 1
-
-                log_date = parse(log["created_at"])
-                recent_feed_records.append({
-                    "date": log_date.isoformat(),
-                    "feed_intake_status": behavior,
-                    "feed_intake_kg": log.get("feed_intake_kg")
-                })
-
-            # Calculate behavior score
-            score_weights = {
-                "eating_well": 1.0,
-                "picky": 0.5,
-                "not_eating": 0.0
-            }
-
-            behavior_score = 0.0
-            if total_feed_behavior_logs > 0:
-                weighted_score = sum(
-                    feed_intake_summary[k] * score_weights[k] for k in feed_intake_summary)
-                behavior_score = round(
-                    (weighted_score / total_feed_behavior_logs) * 100, 2)
-
-            dominant_status = max(
-                feed_intake_summary, key=feed_intake_summary.get) if total_feed_behavior_logs > 0 else "no_data"
-
-            return {
-                "behavior_score": behavior_score,
-                "behavior_status": dominant_status,
-                "summary": feed_intake_summary,
-                "recent_feed_records": recent_feed_records,
-            }
+            return self.__build_feed_intake_behavior(data)
 
         except GlobalException:
             raise  # Re-raise GlobalException (user not found, etc.)
@@ -507,25 +335,6 @@ class FarmerV2:
 
     def read_health_watch(self, farmer_user_profile_id: int, filter_type: Optional[str] = None) -> Dict:
         try:
-            user_exists = (self.Client.table("user_profiles")
-                        .select("id")
-                        .eq("id", farmer_user_profile_id)
-                        .limit(1)
-                        .execute())
-
-            if not user_exists.data:
-                raise GlobalException(
-                    f"User profile ID {farmer_user_profile_id} does not exist.", status_code=404)
-
-            try:
-                feed_program = self.get_active_feed_program(
-                    farmer_user_profile_id)
-                feed_program_start_date = feed_program.get("start_date")
-                feed_program_end_date = feed_program.get("end_date")
-                feed_product_id = feed_program.get("feed_product_id")
-            except GlobalException:
-                return self.__get_default_health_watch()
-
             # Calculate filter date based on filter_type
             filter_start_date = None
             if filter_type == "daily":
@@ -539,133 +348,126 @@ class FarmerV2:
                 filter_start_date = start_of_week.replace(
                     hour=0, minute=0, second=0, microsecond=0).isoformat()
 
-            # Get health incidents within the active feed program period and apply additional filter if specified
-            health_incidents = []
-            if feed_program_start_date:
-                query = (self.Client.table("health_incidents")
-                        .select("*")
-                        .eq("farmer_user_profile_id", farmer_user_profile_id)
-                        .gte("created_at", feed_program_start_date)
-                        .order("created_at", desc=True))
-
-                if feed_program_end_date:
-                    query = query.lte("created_at", feed_program_end_date)
-
-                # Apply additional date filter if specified
-                if filter_start_date:
-                    # Use the later of feed_program_start_date or filter_start_date
-                    effective_start_date = max(
-                        feed_program_start_date, filter_start_date)
-                    query = query.gte("created_at", effective_start_date)
-
-                incident_logs_response = query.execute()
-                health_incidents = incident_logs_response.data or []
-
-            # Get farm performance logs within the active feed program period and apply additional filter if specified
-            farm_performance_logs = []
-            if feed_program_start_date:
-                query = (
-                    self.Client.table("farm_performance_logs")
-                    .select("*")
-                    .eq("user_profile_id", farmer_user_profile_id)
-                    .gte("created_at", feed_program_start_date)
-                    .order("created_at", desc=True)
-                )
-                if feed_program_end_date:
-                    query = query.lte("created_at", feed_program_end_date)
-
-                # Apply additional date filter if specified
-                if filter_start_date:
-                    # Use the later of feed_program_start_date or filter_start_date
-                    effective_start_date = max(
-                        feed_program_start_date, filter_start_date)
-                    query = query.gte("created_at", effective_start_date)
-
-                farm_logs_response = query.execute()
-                farm_performance_logs = farm_logs_response.data or []
-
-            # If no incidents or performance logs for this feed program, return defaults
-            if not health_incidents and not farm_performance_logs:
+            data = self.__read_feed_program_data(farmer_user_profile_id, since=filter_start_date, with_target=False)
+            if data is None:
                 return self.__get_default_health_watch()
+            return self.__build_health_watch(data, filter_type)
 
-            sick_count = 0
-            mortality_count = 0
-            notes_count = 0
-            health_score = 100
-
-            recent_issues = []
-
-            # Process health incidents
-            for incident in health_incidents:
-                kind = incident.get("incident_type")
-                affected = incident.get("affected_count", 0)
-                has_note = bool(incident.get("symptoms")
-                                or incident.get("suspected_cause"))
-
-                if kind == "sickness":
-                    sick_count += affected
-                    health_score -= affected * 2
-                elif kind == "mortality":
-                    mortality_count += affected
-                    health_score -= affected * 4
-                if has_note:
-                    notes_count += 1
-                    health_score -= 1
-
-                recent_issues.append({
-                    "date": incident.get("incident_date"),
-                    "incident_type": kind,
-                    "affected_count": affected,
-                    "symptoms": incident.get("symptoms"),
-                    "suspected_cause": incident.get("suspected_cause"),
-                    "requires_vet_visit": incident.get("requires_vet_visit"),
-                    "feed_info": incident.get("feed_info"),
-                    "actions_taken": incident.get("actions_taken"),
-                })
-
-            # Process farm performance logs for mortality data
-            for log in farm_performance_logs:
-                log_mortality = log.get("mortality_count", 0)
-                if log_mortality > 0:
-                    mortality_count += log_mortality
-                    health_score -= log_mortality * 4  # Same penalty as health incident mortality
-
-                    # Add to recent issues for visibility
-                    recent_issues.append({
-                        "date": log.get("created_at"),
-                        "incident_type": "mortality",
-                        "affected_count": log_mortality,
-                        "symptoms": "Recorded in performance log",
-                        "suspected_cause": log.get("notes", "Not specified"),
-                        "requires_vet_visit": False,
-                        "feed_info": None,
-                        "actions_taken": None,
-                    })
-
-            # Sort recent issues by date (most recent first)
-            recent_issues.sort(key=lambda x: parse(x["date"]), reverse=True)
-
-            health_score = max(0, min(health_score, 100))
+        except GlobalException:
+            raise  # Re-raise GlobalException (user not found, etc.)
+        except Exception as e:
+            raise GlobalException(
+                f"Error fetching health watch data: {e}", status_code=500)
+
+    def read_dashboard(self, farmer_user_profile_id: int) -> Dict:
+        """Growth performance, feed intake behavior and health watch from one fetch of the feed program's rows"""
+        try:
+            data = self.__read_feed_program_data(farmer_user_profile_id)
+            if data is None:
+                return {
+                    "growth_performance": self.__get_default_growth_performance(),
+                    "feed_intake_behavior": self.__get_default_feed_intake_behavior(),
+                    "health_watch": self.__get_default_health_watch(),
+                }
 
             return {
-                "health_score": health_score,
-                "issue_summary": {
-                    "sick": sick_count,
-                    "mortality": mortality_count,
-                    "notes": notes_count
-                },
-                "recent_issues": recent_issues,
-                "filter_applied": filter_type or "all"
+                "growth_performance": self.__build_growth_performance(data),
+                "feed_intake_behavior": self.__build_feed_intake_behavior(data),
+                "health_watch": self.__build_health_watch(data, None),
             }
 
         except GlobalException:
-            raise  # Re-raise GlobalException (user not found, etc.)
+            raise
         except Exception as e:
             raise GlobalException(
-                f"Error fetching health watch data: {e}", status_code=500)
+                f"Error fetching farm dashboard: {e}", status_code=500)
 
     # HELPER METHODS SECTION -----------------------------------
 
+    def __read_feed_program_data(self, farmer_user_profile_id: int, errors=GlobalException, since: Optional[str] = None,
+                                 with_incidents: bool = True, with_target: bool = True) -> Optional[Dict]:
+        """Active feed program, its performance logs and health incidents as FarmMetrics, and its target weight.
+
+        Raises 404 for unknown users and returns None when there is no active feed program (or getting it fails
+        with one of errors). since limits the logs and incidents to those created from that date.
+        """
+        # Profile check and active program first, then everything scoped to the program at once
+        plan = QueryPlan() \
+            .add("user_exists", lambda _: self.__user_exists(farmer_user_profile_id)) \
+            .add("feed_program", lambda _: self.__try_active_feed_program(farmer_user_profile_id, errors)) \
+            .add("farm_performance_logs", lambda results: self.__feed_program_rows(
+                "farm_performance_logs", "user_profile_id", farmer_user_profile_id, results["feed_program"],
+                since=since), depends_on=["feed_program"])
+        if with_target:
+            plan.add("target_weight", lambda results: self.__get_target_weight_by_feed_product(
+                (results["feed_program"] or {}).get("feed_product_id")), depends_on=["feed_program"])
+        if with_incidents:
+            plan.add("health_incidents", lambda results: self.__feed_program_rows(
+                "health_incidents", "farmer_user_profile_id", farmer_user_profile_id, results["feed_program"],
+                since=since), depends_on=["feed_program"])
+        results = plan.run()
+
+        if not results["user_exists"]:
+            raise GlobalException(
+                f"User profile ID {farmer_user_profile_id} does not exist.", status_code=404)
+
+        if results["feed_program"] is None:
+            return None
+
+        return {
+            "feed_program": results["feed_program"],
+            "metrics": FarmMetrics(results["farm_performance_logs"], results.get("health_incidents")),
+            "target_weight": results.get("target_weight", 0.0),
+        }
+
+    def __build_growth_performance(self, data: Dict) -> Dict:
+        metrics: FarmMetrics = data["metrics"]
+        if not metrics.logs and not metrics.incidents:
+            return self.__get_default_growth_performance()
+
+        # Get initial flock size from the active feed program
+        initial_flock_size = data["feed_program"].get("animal_quantity", 0)
+        flock_tracking = metrics.flock_tracking(initial_flock_size)
+        target_weight = data["target_weight"]
+
+        return {
+            "daily_average_growth_rate": metrics.growth_rate()["growth_rate"],
+            "actual_weight": float(metrics.latest_log.get("average_weight_kg", 0.0)),
+            "target_weight": target_weight,
+            "growth_chart_data": metrics.growth_chart(target_weight),
+            "performance_analytics": {
+                "total_logs": len(metrics.logs),
+                "total_weight_kg": metrics.total_weight_kg,
+                "mortality_count": flock_tracking["total_mortality"],
+                "mortality_percentage": flock_tracking["mortality_percentage"],
+                "initial_flock_size": initial_flock_size,  # Starting flock size
+                # Current flock size after mortalities
+                "current_flock_size": flock_tracking["current_flock_size"],
+                # Breakdown by source
+                "mortality_breakdown": flock_tracking["mortality_breakdown"],
+                "recent_records": metrics.recent_records(),
+            }
+        }
+
+    def __build_feed_intake_behavior(self, data: Dict) -> Dict:
+        metrics: FarmMetrics = data["metrics"]
+        # If no logs for this feed program, return defaults
+        if not metrics.logs:
+            return self.__get_default_feed_intake_behavior()
+        return metrics.feed_intake_behavior()
+
+    def __build_health_watch(self, data: Dict, filter_type: Optional[str]) -> Dict:
+        metrics: FarmMetrics = data["metrics"]
+        # If no incidents or performance logs for this feed program, return defaults
+        if not metrics.incidents and not metrics.logs:
+            return self.__get_default_health_watch()
+
+        # Performance log mortality counts as an issue too
+        return {
+            **metrics.health_watch(include_log_mortality=True),
+            "filter_applied": filter_type or "all"
+        }
+
     def __get_default_growth_performance(self) -> Dict:
         """Return default growth performance structure for new users or users without active feed program"""
         return {
@@ -684,41 +486,6 @@ class FarmerV2:
             }
         }
 
-    def __calculate_growth_rate(self, logs: List[Dict]) -> Dict:
-        """Calculate growth rate from performance logs"""
-        if len(logs) < 2:
-            return {
-                "growth_rate": 0.0,
-                "raw_gain_kg": 0.0
-            }
-
-        first_log = logs[-1]  # Oldest log in the period
-        last_log = logs[0]    # Most recent log in the period
-
-        try:
-            weight_start = float(first_log.get("average_weight_kg", 0.0))
-            weight_end = float(last_log.get("average_weight_kg", 0.0))
-            date_start = parse(first_log["created_at"])
-            date_end = parse(last_log["created_at"])
-
-            days = (date_end - date_start).days
-            if days <= 0:
-                return {
-                    "growth_rate": 0.0,
-                    "raw_gain_kg": 0.0
-                }
-
-            return {
-                "growth_rate": round((weight_end - weight_start) / days, 3),
-                "raw_gain_kg": round((weight_end - weight_start), 3)
-            }
-        except (ValueError, TypeError) as e:
-            print(f"Error calculating growth rate: {e}")
-            return {
-                "growth_rate": 0.0,
-                "raw_gain_kg": 0.0
-            }
-
     def __get_default_feed_intake_behavior(self) -> Dict:
         """Return default feed intake behavior structure for new users or users without active feed program"""
         return {
@@ -744,96 +511,42 @@ class FarmerV2:
             "recent_issues": []
         }
 
-    # def __get_flock_size(self, farmer_user_profile_id: int) -> int:
-    #     """Get flock size for the farmer"""
-    #     try:
-    #         # Get flock size
-    #         flock_size_response = self.Client.table("farmer_livestock").select("quantity") \
-    #             .eq("farmer_user_profile_id", farmer_user_profile_id).single().execute()
-
-    #         if flock_size_response.data:
-    #             return flock_size_response.data.get("quantity", 0)
-    #     except Exception:
-    #         pass
-
-    #     return 0
-    
-    def __calculate_dynamic_flock_size(self, initial_flock_size: int, farm_performance_logs: List[Dict], health_incidents: List[Dict]) -> Dict:
-        if initial_flock_size <= 0:
-            return {
-                "current_flock_size": initial_flock_size,
-                "total_mortality": 0,
-                "mortality_percentage": 0.0,
-                "survival_rate": 1.0,
-                "mortality_breakdown": {
-                    "from_performance_logs": 0,
-                    "from_health_incidents": 0
-                }
-            }
+    def __user_exists(self, farmer_user_profile_id: int) -> bool:
+        response = (self.Client.table("user_profiles")
+                    .select("id")
+                    .eq("id", farmer_user_profile_id)
+                    .limit(1)
+                    .execute())
+        return bool(response.data)
 
-        current_flock_size = initial_flock_size
-        mortality_from_performance_logs = 0
-        mortality_from_health_incidents = 0
-
-        # Combine and sort all mortality events chronologically
-        mortality_events = []
-
-        # Add mortality events from farm performance logs
-        for log in farm_performance_logs:
-            mortality_count = log.get("mortality_count", 0)
-            if mortality_count > 0:
-                mortality_events.append({
-                    "date": log["created_at"],
-                    "count": mortality_count,
-                    "source": "performance_log",
-                    "log": log
-                })
-
-        # Add mortality events from health incidents
-        for incident in health_incidents:
-            if incident.get("incident_type") == "mortality":
-                affected_count = incident.get("affected_count", 0)
-                if affected_count > 0:
-                    mortality_events.append({
-                        "date": incident["created_at"],
-                        "count": affected_count,
-                        "source": "health_incident",
-                        "incident": incident
-                    })
-
-        # Sort all mortality events chronologically
-        mortality_events.sort(key=lambda x: parse(x["date"]))
-
-        # Process mortality events in chronological order
-        for event in mortality_events:
-            mortality_count = event["count"]
-            current_flock_size = max(0, current_flock_size - mortality_count)
-            
-            if event["source"] == "performance_log":
-                mortality_from_performance_logs += mortality_count
-            else:
-                mortality_from_health_incidents += mortality_count
-
-        total_mortality = mortality_from_performance_logs + mortality_from_health_incidents
-
-        # Calculate percentages based on initial flock size
-        if initial_flock_size > 0:
-            mortality_percentage = round((total_mortality / initial_flock_size) * 100, 2)
-            survival_rate = round((current_flock_size / initial_flock_size), 4)
-        else:
-            mortality_percentage = 0.0
-            survival_rate = 1.0
+    def __try_active_feed_program(self, farmer_user_profile_id: int, errors) -> Optional[dict]:
+        """Active feed program, None when there is none (or it fails with one of errors)"""
+        try:
+            return self.get_active_feed_program(farmer_user_profile_id)
+        except errors:
+            return None
+
+    def __feed_program_rows(self, table: str, user_column: str, farmer_user_profile_id: int, feed_program: Optional[dict],
+                            since: Optional[str] = None) -> List[Dict]:
+        """Rows of table created within the feed program period, optionally only those since a later date"""
+        feed_program_start_date = feed_program.get("start_date") if feed_program else None
+        if not feed_program_start_date:
+            return []
+
+        query = (
+            self.Client.table(table)
+            .select("*")
+            .eq(user_column, farmer_user_profile_id)
+            .gte("created_at", feed_program_start_date)
+            .order("created_at", desc=True)
+        )
+        if feed_program.get("end_date"):
+            query = query.lte("created_at", feed_program["end_date"])
+        if since:
+            # Use the later of feed_program_start_date or since
+            query = query.gte("created_at", max(feed_program_start_date, since))
 
-        return {
-            "current_flock_size": current_flock_size,
-            "total_mortality": total_mortality,
-            "mortality_percentage": mortality_percentage,
-            "survival_rate": survival_rate,
-            "mortality_breakdown": {
-                "from_performance_logs": mortality_from_performance_logs,
-                "from_health_incidents": mortality_from_health_incidents
-            }
-        }
+        return query.execute().data or []
 
     def __get_target_weight_by_feed_product(self, feed_product_id: Optional[int]) -> float:
         """Get target weight based on feed product ID"""
@@ -841,23 +554,22 @@ class FarmerV2:
             return 0.0
 
         try:
-            target_weight_response = self.Client.table("feed_growth_targets").select("target_weight_kg") \
-                .eq("feed_product_id", feed_product_id).limit(1).single().execute()
-
-            if target_weight_response.data:
-                return float(target_weight_response.data["target_weight_kg"])
+            target_weight_kg = reference_data.target_weight_kg(feed_product_id)
+            if target_weight_kg is not None:
+                return float(target_weight_kg)
         except Exception:
             pass
 
         return 0.0
 
 
-def create_health_incident_with_program(farmer_instance: FarmerV2, user_id: int, company_id: int, form_data: dict, parsed: dict) -> bool:
+async def create_health_incident_with_program(farmer_instance: FarmerV2, user_id: int, company_id: int, form_data: dict, parsed: dict) -> bool:
     """Create health incident linked to active feed program"""
     try:
         # Create health incident - association with feed program is handled
         # by date range logic in FarmerV2 read methods
-        farmer_instance.Client.table("health_incidents").insert({
+        client = await get_async_supabase_client()
+        await client.table("health_incidents").insert({
             "farmer_user_profile_id": user_id,
             **form_data,
             "reported_by": user_id,
@@ -870,12 +582,13 @@ def create_health_incident_with_program(farmer_instance: FarmerV2, user_id: int,
         return False
 
 
-def create_performance_log_with_program(farmer_instance: FarmerV2, user_id: int, company_id: int, form_data: dict, parsed: dict) -> bool:
+async def create_performance_log_with_program(farmer_instance: FarmerV2, user_id: int, company_id: int, form_data: dict, parsed: dict) -> bool:
     """Create performance log linked to active feed program"""
     try:
         # Create performance log - association with feed program is handled
         # by date range logic in FarmerV2 read methods
-        farmer_instance.Client.table("farm_performance_logs").insert({
+        client = await get_async_supabase_client()
+        await client.table("farm_performance_logs").insert({
             "company_id": company_id,
             "user_profile_id": user_id,
             **form_data
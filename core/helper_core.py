@@ -2,52 +2,24 @@ import re
 import json
 from datetime import datetime
 
-from config.config import get_gpt_model, get_gpt_client
 from core.chat_core import Chat
+from core.history_core import get_history_budget
 from core.company_core import Company
 from core.faq_core import Faq
+from core.prompt_core import prompt_registry
 from core.farmer_core import Farmer
+from core.helper_core_v2 import REQUIRED, SALES_LANGUAGE_INSTRUCTION, add_language_classification, build_messages, call_openai, detect_language, gather_stages, run_callback, stage_result
+from core.language_core import detect_language_locally
 from core.salesrep_core import SalesRep
-
-client = get_gpt_client()
-gptModel = get_gpt_model()
+from core.slot_core import extract_date_fields
 
 
 def load_prompt(file_path):
-    with open(file_path, "r", encoding="utf-8") as file:
-        return file.read()
+    return prompt_registry.get_text(file_path)
 
 
 def load_functions(file_path):
-    with open(file_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def detect_language(prompt):
-  # detect language
-  system_instruction_language = load_prompt("prompts/language_detector.txt")
-  functions_language = load_functions("prompts/language_detector.json")
-
-  messages = [
-    {"role": "system", "content": system_instruction_language},
-    {"role": "user", "content": prompt}
-  ]
-
-  language = call_openai(messages, functions_language, "detect_language")
-
-  return language.get("user_language")
-
-
-def call_openai(messages, functions, function_name):
-    response = client.chat.completions.create(
-        model=gptModel,
-        messages=messages,
-        functions=[functions],
-        function_call={"name": function_name}
-    )
-
-    # Extract the function call arguments as JSON
-    arguments = response.choices[0].message.function_call.arguments
-    return json.loads(arguments)
+    return prompt_registry.get_functions(file_path)
 
 
 def extract_json(text):
@@ -62,115 +34,131 @@ def extract_json(text):
         raise ValueError(f"Invalid JSON response: {cleaned}")
 
 
-def store_message_faq(chat_id, prompt, response, category, user_company_id, metadata=None):
+async def store_message_faq(chat_id, prompt, response, category, user_company_id, metadata=None):
     chat = Chat()
     faq = Faq()
-    chat.add_message(chat_id, "user", prompt, metadata)
-    chat.add_message(chat_id, "model", response, metadata)
-    faq.insert_faq(prompt, response, category, user_company_id)
+    # Written by the write-behind queue, the response does not wait for them
+    await chat.enqueue_message(chat_id, "user", prompt, metadata)
+    await chat.enqueue_message(chat_id, "model", response, metadata)
+    await faq.enqueue_faq(prompt, response, category, user_company_id)
 
 
-def handle_log(chat_id, user_id, prompt, prompt_file, form_key, function_name, on_complete):
+async def handle_log(chat_id, user_id, prompt, prompt_file, form_key, function_name, on_complete, detected_language=None):
   chat = Chat()
   farmer = Farmer()
   company = Company()
 
   print(user_id)
   # Get user company
-  user_company_id = company.get_user_company(user_id)
+  user_company_id = await company.get_user_company_async(user_id)
   today = datetime.today().strftime("%Y/%m/%d")
 
   system_instruction = load_prompt(f"{prompt_file}.txt")
   functions = load_functions(f"{prompt_file}.json")
 
-  convo_res = chat.get_conversations_record(chat_id)
+  convo_res = await chat.get_conversations_record(chat_id)
   form_data = convo_res.get("form_data") or {}
+  if form_key != "":
+    # Dates like "kahapon" or "last Monday" are resolved here rather than by the model
+    form_data.update(extract_date_fields(prompt, prompt_file, form_key, form_data))
 
-  chat_history = chat.get_recent_messages(chat_id, get_max_messages())
+  chat_history = await chat.get_recent_messages(chat_id, get_max_messages(), get_history_budget("log"))
   
   form_summary = "\n".join([f"{k.replace('_', ' ').capitalize()}: {v}" for k, v in form_data.items() if v]) or "None yet"
 
-  chat_history.append({
-    "role": "user",
-    "content": f"{prompt}\n\nToday’s date is {today}. \n\n(Previously collected info):\n{form_summary}"
-  })
-
-  messages = [
-      {"role": "system", "content": system_instruction}] + chat_history
+  # Without a detected language this is the system prompt, the history and the user turn, as before
+  messages = build_messages(
+    system_instruction,
+    chat_history,
+    f"{prompt}\n\nToday’s date is {today}. \n\n(Previously collected info):\n{form_summary}",
+    detected_language
+  )
   # response_text = call_openai(messages)
-  parsed = call_openai(messages, functions, function_name)
+  parsed = await call_openai(messages, functions, function_name)
 
   if form_key != "":
       new_fields = parsed.get(form_key, {})
       form_data.update({k: v for k, v in new_fields.items() if v})
 
-      chat.update_conversation(chat_id, form_data=form_data)
+      await chat.update_conversation(chat_id, form_data=form_data)
 
       if parsed["next_action"] == "log_complete":
-          on_complete(farmer, user_id, form_data, parsed)
-          chat.update_conversation(chat_id, None)
+          await run_callback(on_complete, farmer, user_id, form_data, parsed)
+          await chat.update_conversation(chat_id, None)
 
-  store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"], user_company_id,
-                    metadata={"form_data": form_data, "next_action": parsed["next_action"]})
+  metadata = {"form_data": form_data, "next_action": parsed["next_action"]}
+  if detected_language:
+    metadata["user_language"] = detected_language
+  await store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"], user_company_id, metadata=metadata)
   return parsed
 
 
-def handle_log_sales(chat_id, user_id, prompt, prompt_file, form_key, function_name, on_complete):
+async def handle_log_sales(chat_id, user_id, prompt, prompt_file, form_key, function_name, on_complete, detected_language=None):
   chat = Chat()
   salesrep = SalesRep()
   company = Company()
 
+  # Fetch the independent lookups concurrently
+  stages = {
+    "user_company_id": (company.get_user_company_async(user_id), REQUIRED),
+    "convo_res": (chat.get_conversations_record(chat_id), REQUIRED),
+    "chat_history": (chat.get_recent_messages(chat_id, get_max_messages(), get_history_budget("log")), []),
+  }
+  if not detected_language:
+    stages["detected_language"] = (detect_language(prompt), detect_language_locally(prompt)[0] or "English")
+  context = await gather_stages(stages)
+
   # Get user company
-  user_company_id = company.get_user_company(user_id)
+  user_company_id = stage_result(context, "user_company_id")
   today = datetime.today().strftime("%Y/%m/%d")
 
   system_instruction = load_prompt(f"{prompt_file}.txt")
   functions = load_functions(f"{prompt_file}.json")
 
-  convo_res = chat.get_conversations_record(chat_id)
+  convo_res = stage_result(context, "convo_res")
   form_data = convo_res.get("form_data") or {}
+  # Sale and visit dates like "kahapon" or "sa Lunes" are resolved here rather than by the model
+  form_data.update(extract_date_fields(prompt, prompt_file, form_key, form_data))
 
-  chat_history = chat.get_recent_messages(chat_id, get_max_messages())
+  chat_history = context["chat_history"]
   form_summary = "\n".join(
       [f"{k.replace('_', ' ').capitalize()}: {v}"for k, v in form_data.items() if v]) or "None yet"
 
-  chat_history.append({
-    "role": "user",
-    "content": f"{prompt}\n\nToday’s date is {today}. \n\n(Previously collected info):\n{form_summary}"
-  })
-
-  detected_language = detect_language(prompt)
-
-  chat_history.append({
-      "role": "system", 
-      "content": f" Strictly follow this language: {detected_language} when responding." + system_instruction 
-  })
+  detected_language = detected_language or context["detected_language"]
 
-  messages = chat_history
+  messages = build_messages(
+    system_instruction,
+    chat_history,
+    f"{prompt}\n\nToday’s date is {today}. \n\n(Previously collected info):\n{form_summary}",
+    detected_language,
+    SALES_LANGUAGE_INSTRUCTION
+  )
 
-  parsed = call_openai(messages, functions, function_name)  
+  parsed = await call_openai(messages, functions, function_name)  
   new_fields = parsed.get(form_key, {})
   form_data.update({k: v for k, v in new_fields.items() if v})
 
-  chat.update_conversation(chat_id, form_data=form_data)
-  store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"], user_company_id,
-                    metadata={"form_data": form_data, "next_action": parsed["next_action"]})
+  await chat.update_conversation(chat_id, form_data=form_data)
+  await store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"], user_company_id,
+                    metadata={"form_data": form_data, "next_action": parsed["next_action"], "user_language": detected_language})
 
   if parsed["next_action"] == "log_complete":    
-    on_complete(salesrep, user_id, form_data, parsed)
-    chat.update_conversation(chat_id, None)
+    await run_callback(on_complete, salesrep, user_id, form_data, parsed)
+    await chat.update_conversation(chat_id, None)
 
   return parsed
 
 
-def handle_intent(prompt, prompt_file, function_name):
+async def handle_intent(prompt, prompt_file, function_name, classify_language=False):
   system_instruction = load_prompt(f"{prompt_file}.txt")
   functions = load_functions(f"{prompt_file}.json")
+  if classify_language:
+    system_instruction, functions = add_language_classification(system_instruction, functions)
   messages = [
     {"role": "system", "content": system_instruction},
     {"role": "user", "content": prompt}
   ]
-  parsed = call_openai(messages, functions, function_name)
+  parsed = await call_openai(messages, functions, function_name)
   return parsed
 
 
@@ -1,30 +1,50 @@
+import asyncio
+import inspect
+import os
 import re
 import json
 from datetime import datetime
 
-from config.config import get_gpt_model, get_gpt_client
 from core.chat_core import Chat
+from core.history_core import get_history_budget
 from core.company_core import Company
 from core.faq_core import Faq
+from core.faq_index_core import faq_index
+from core.intent_core import INTENT_CLASSIFIER_MODE, get_intent_classifier, polite_kind, polite_reply
+from core.llm_router_core import llm_router
+from core.language_core import LANGUAGE_CONFIDENCE_THRESHOLD, detect_language_locally, language_detector
+from core.prompt_core import prompt_registry
 from core.farmer_core import Farmer
 from core.farmer_core_v2 import FarmerV2
 from core.salesrep_core import SalesRep
+from core.slot_core import SLOT_EXTRACTION_MODE, complete_log_locally, extract_slots
+from core.write_queue_core import write_queue
 from exceptions.global_exception import GlobalException
 
-client = get_gpt_client()
-gptModel = get_gpt_model()
+# Deadline (seconds) for each pre-LLM lookup gathered by gather_stages
+CONTEXT_STAGE_TIMEOUT = float(os.getenv("CONTEXT_STAGE_TIMEOUT", "5"))
+
+# Marks a gather_stages stage whose failure must reach the caller
+REQUIRED = object()
+
+# Earlier answers to similar questions of the same company handed to the LLM as reference (0 turns it off), and the
+# BM25 score a stored question needs to count as similar
+FAQ_CONTEXT_ANSWERS = int(os.getenv("FAQ_CONTEXT_ANSWERS", "3"))
+FAQ_CONTEXT_MIN_SCORE = float(os.getenv("FAQ_CONTEXT_MIN_SCORE", "3.0"))
 
 
 def load_prompt(file_path):
-    with open(file_path, "r", encoding="utf-8") as file:
-        return file.read()
+    return prompt_registry.get_text(file_path)
 
 def load_functions(file_path):
-    with open(file_path, "r", encoding="utf-8") as file:
-        return json.load(file)
+    return prompt_registry.get_functions(file_path)
 
-def detect_language(prompt):
-    # detect language
+async def detect_language(prompt):
+    language, confidence = detect_language_locally(prompt)
+    if language and confidence >= LANGUAGE_CONFIDENCE_THRESHOLD:
+        return language
+
+    # Fall back to the LLM for short or ambiguous messages
     system_instruction_language = load_prompt("prompts/language_detector.txt")
     functions_language = load_functions("prompts/language_detector.json")
 
@@ -33,24 +53,52 @@ def detect_language(prompt):
         {"role": "user", "content": prompt}
     ]
 
-    language = call_openai(messages, functions_language, "detect_language")
+    language = (await call_openai(messages, functions_language, "detect_language")).get("user_language")
+    language_detector.learn_from_llm(prompt, language)
 
-    return language.get("user_language")
+    return language
 
 
-def call_openai(messages, functions, function_name):
+async def call_openai(messages, functions, function_name, on_delta=None):
+    """Forced function call through the LLM router (OpenAI unless LLM_ROUTES says otherwise); returns the arguments.
 
-    response = client.chat.completions.create(
-        model=gptModel,
-        messages=messages,
-        functions=[functions],
-        function_call={"name": function_name}
-    )
+    With on_delta the call is streamed and each new piece of the response field is passed to it.
+    """
+    return await llm_router.call(messages, functions, function_name, on_delta)
+
+def format_similar_answers(company_id, prompt, functions) -> str:
+    """faq_index.top_k_answers for the prompt, limited to the categories the handler answers (not log turns)"""
+    if FAQ_CONTEXT_ANSWERS <= 0:
+        return ""
+
+    categories = set(functions["parameters"]["properties"]["log_type"]["enum"])
+    answers = [
+        answer for answer in faq_index.top_k_answers(company_id, prompt, FAQ_CONTEXT_ANSWERS * 2, FAQ_CONTEXT_MIN_SCORE)
+        if answer["category"] in categories and answer["question"].strip().lower() != prompt.strip().lower()
+    ][:FAQ_CONTEXT_ANSWERS]
+    if not answers:
+        return ""
+
+    examples = "\n".join(f"Q: {answer['question']}\nA: {answer['answer']}" for answer in answers)
+    return f"Earlier answers to similar questions (reference only, they may not fit this question):\n{examples}"
+
+LANGUAGE_INSTRUCTION = "Ignore all previous instructions about language matching. Always answer in {language}."
+SALES_LANGUAGE_INSTRUCTION = "Strictly follow this language: {language} when responding."
 
-    # Extract the function call arguments as JSON
-    arguments = response.choices[0].message.function_call.arguments
 
-    return json.loads(arguments)
+def build_messages(system_instruction, history, user_content, language=None, language_instruction=None):
+    """Static system prompt first so every call with the same prompt file shares a cacheable prefix.
+
+    The per-request parts (history, the user turn, and the language line last so it still overrides
+    the prompt's own language rules) only come after it.
+    """
+    messages = [{"role": "system", "content": system_instruction}]
+    messages.extend(history)
+    messages.append({"role": "user", "content": user_content})
+    if language:
+        messages.append({"role": "system", "content": (language_instruction or LANGUAGE_INSTRUCTION).format(language=language)})
+    return messages
+
 
 def extract_json(text):
     match = re.search(r"```json\s*(\{.*?\})\s*```",
@@ -63,91 +111,233 @@ def extract_json(text):
     except json.JSONDecodeError:
         raise ValueError(f"Invalid JSON response: {cleaned}")
 
-def store_message_faq(chat_id, prompt, response, category, user_company_id=None, metadata=None):
+async def store_message_faq(chat_id, prompt, response, category, user_company_id=None, metadata=None):
     chat = Chat()
     faq = Faq()
-    chat.add_message(chat_id, "user", prompt, metadata)
-    chat.add_message(chat_id, "model", response, metadata)
-    faq.insert_faq(prompt, response, category, user_company_id)
+    # Written by the write-behind queue, the response does not wait for them
+    await chat.enqueue_message(chat_id, "user", prompt, metadata)
+    await chat.enqueue_message(chat_id, "model", response, metadata)
+    await faq.enqueue_faq(prompt, response, category, user_company_id)
+
+
+async def run_callback(callback, *args):
+    # Log completion callbacks are either async or plain sync core methods
+    if inspect.iscoroutinefunction(callback):
+        return await callback(*args)
+    return await asyncio.to_thread(callback, *args)
+
+async def gather_stages(stages: dict) -> dict:
+    """Run independent lookups concurrently.
+
+    stages maps a name to (awaitable, fallback) or (awaitable, fallback, timeout). A stage that fails
+    or misses its deadline resolves to its fallback; REQUIRED stages keep the exception instead, which
+    stage_result raises when the caller reads it.
+    """
+    async def run(name, awaitable, fallback, timeout=CONTEXT_STAGE_TIMEOUT):
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except Exception as e:
+            if fallback is REQUIRED:
+                return e
+            print(f"Context stage {name} failed, using fallback: {e!r}")
+            return fallback
+
+    names = list(stages)
+    results = await asyncio.gather(*(run(name, *stages[name]) for name in names))
+    return dict(zip(names, results))
 
-def handle_log(chat_id, user_id, prompt, prompt_file, form_key, function_name, on_complete):
+
+def stage_result(results: dict, name: str):
+    result = results[name]
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+async def get_active_feed_program_or_none(farmer: FarmerV2, user_id: int):
+    try:
+        return await farmer.get_active_feed_program_async(user_id)
+    except GlobalException:
+        return None
+
+
+async def detect_language_with_program(active_program_task, prompt):
+    """detect_language, skipped (None) when the user has no active feed program"""
+    if await asyncio.shield(active_program_task) is None:
+        return None
+    return await detect_language(prompt)
+
+
+async def handle_log(chat_id, user_id, prompt, prompt_file, form_key, function_name, on_complete, detected_language=None, on_delta=None):
     chat = Chat()
     farmer = FarmerV2()
     company = Company()
 
+    # The lookups run at once; only the language stage waits for the active program, there is no point paying
+    # for an LLM language call on a turn that ends with the "no active feed program" reply
+    active_program_task = asyncio.ensure_future(get_active_feed_program_or_none(farmer, user_id))
+    stages = {
+        "active_program": (asyncio.shield(active_program_task), REQUIRED),
+        "user_company_id": (company.get_user_company_async(user_id), REQUIRED),
+        "convo_res": (chat.get_conversations_record(chat_id), REQUIRED),
+        "chat_history": (chat.get_recent_messages(chat_id, get_max_messages(), get_history_budget("log")), []),
+        "feed_context": (get_feed_program_context(farmer, user_id), NO_FEED_PROGRAM_CONTEXT),
+    }
+    if not detected_language:
+        stages["detected_language"] = (detect_language_with_program(active_program_task, prompt),
+                                       detect_language_locally(prompt)[0] or "English")
+    context = await gather_stages(stages)
+
     # Check if user has active feed program first
-    try:
-        active_program = farmer.get_active_feed_program(user_id)
-        has_active_program = True
-    except GlobalException:
-        has_active_program = False
+    active_program = stage_result(context, "active_program")
+    if active_program is None:
         # Return graceful response if no active program
         return handle_no_active_program_response(prompt, form_key)
+    has_active_program = True
 
     # Get user company
-    user_company_id = company.get_user_company(user_id)
+    user_company_id = stage_result(context, "user_company_id")
     today = datetime.today().strftime("%Y/%m/%d")
 
     system_instruction = load_prompt(f"{prompt_file}.txt")
     functions = load_functions(f"{prompt_file}.json")
 
-    convo_res = chat.get_conversations_record(chat_id)
+    convo_res = stage_result(context, "convo_res")
     form_data = convo_res.get("form_data") or {}
 
-    chat_history = chat.get_recent_messages(chat_id, get_max_messages())
-    
-    # Add active feed program context to form summary
-    feed_context = get_feed_program_context(farmer, user_id)
-    form_summary = "\n".join([f"{k.replace('_', ' ').capitalize()}: {v}" for k, v in form_data.items() if v]) or "None yet"
-    detected_language = detect_language(prompt)
-    chat_history.append({
-        "role": "user",
-        "content": f"{prompt}\n\nToday's date is {today}.\n\n{feed_context}\n\n(Previously collected info):\n{form_summary}"
-    })
-    chat_history.append({
-        "role": "system", 
-        "content": f" Ignore all previous instructions about language matching. Always answer in {detected_language}.\n" + system_instruction 
-    })
-    
-    messages = chat_history
-    parsed = call_openai(messages, functions, function_name)
+    chat_history = context["chat_history"]
+    detected_language = detected_language or context["detected_language"]
+
+    # Numbers, statuses and dates stated in the message go into form_data before the LLM sees it
+    extracted = {}
+    if form_key != "" and SLOT_EXTRACTION_MODE != "off":
+        last_question = next((m["content"] for m in reversed(chat_history) if m["role"] == "assistant"), None)
+        extracted = extract_slots(prompt, form_key, form_data, last_question)
+        form_data.update(extracted)
+
+    parsed = None
+    if extracted and SLOT_EXTRACTION_MODE == "on":
+        # Every required field known: the log is completed without an LLM turn
+        parsed = complete_log_locally(prompt_file, form_key, form_data, detected_language, prompt)
+
+    if parsed is None:
+        # Add active feed program context to form summary
+        feed_context = context["feed_context"]
+        form_summary = "\n".join([f"{k.replace('_', ' ').capitalize()}: {v}" for k, v in form_data.items() if v]) or "None yet"
+
+        messages = build_messages(
+            system_instruction,
+            chat_history,
+            f"{prompt}\n\nToday's date is {today}.\n\n{feed_context}\n\n(Previously collected info):\n{form_summary}",
+            detected_language
+        )
+        parsed = await call_openai(messages, functions, function_name, on_delta)
 
     if form_key != "":
         new_fields = parsed.get(form_key, {})
         form_data.update({k: v for k, v in new_fields.items() if v})
 
-        chat.update_conversation(chat_id, form_data=form_data)
+        await chat.update_conversation(chat_id, form_data=form_data)
 
         if parsed["next_action"] == "log_complete":
-            success = on_complete(farmer, user_id, user_company_id, form_data, parsed)
+            success = await run_callback(on_complete, farmer, user_id, user_company_id, form_data, parsed)
             if success:
-                chat.update_conversation(chat_id, None)
+                await chat.update_conversation(chat_id, None)
 
-    store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"], user_company_id,
-                      metadata={"form_data": form_data, "next_action": parsed["next_action"], "feed_program_id": active_program.get("id") if has_active_program else None})
+    await store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"], user_company_id,
+                      metadata={"form_data": form_data, "next_action": parsed["next_action"], "feed_program_id": active_program.get("id") if has_active_program else None, "user_language": detected_language})
     return parsed
   
-def handle_intent(prompt, prompt_file, function_name):
+async def handle_intent(prompt, prompt_file, function_name, classify_language=False):
     system_instruction = load_prompt(f"{prompt_file}.txt")
     functions = load_functions(f"{prompt_file}.json")
+    if classify_language:
+        system_instruction, functions = add_language_classification(system_instruction, functions)
     messages = [
         {"role": "system", "content": system_instruction},
         {"role": "user", "content": prompt}
     ]
-    parsed = call_openai(messages, functions, function_name)
+    parsed = await call_openai(messages, functions, function_name)
     return parsed
 
 
+async def classify_intent(prompt, prompt_file, function_name, classify_language=False):
+    """handle_intent with a local fast path for messages the intent classifier is sure about"""
+    if INTENT_CLASSIFIER_MODE == "off":
+        return await handle_intent(prompt, prompt_file, function_name, classify_language)
+
+    classifier = get_intent_classifier(prompt_file)
+    local_intent, confidence = classifier.fast_path(prompt)
+    if INTENT_CLASSIFIER_MODE == "on" and local_intent is not None:
+        return build_local_intent(prompt, local_intent, confidence, classify_language)
+
+    parsed = await handle_intent(prompt, prompt_file, function_name, classify_language)
+
+    # Shadow comparison, then let the classifier learn from the LLM's answer; the stored label is what it
+    # trains on after a restart
+    predicted, _ = classifier.predict(prompt)
+    classifier.record_agreement(predicted, parsed.get("id"))
+    classifier.learn(prompt, parsed.get("id"))
+    if parsed.get("id") is not None:
+        await write_queue.insert("intent_labels", {"classifier": prompt_file, "message": prompt, "intent_id": parsed["id"]})
+    if classify_language:
+        language_detector.learn_from_llm(prompt, parsed.get("user_language"))
+    return parsed
+
+
+def build_local_intent(prompt, intent_id, confidence, classify_language=False):
+    # Same shape as the classify_intent function call result
+    language, language_confidence = detect_language_locally(prompt)
+    kind = polite_kind(prompt) if intent_id == 6 else None
+
+    intent = {
+        "id": intent_id,
+        "confidence": round(confidence, 2),
+        "response": polite_reply(kind, language) if kind else "",
+        "download_guide": None,
+        "help_request": None,
+    }
+    if classify_language:
+        # Leave it to the handler's own detection when the local guess is weak
+        intent["user_language"] = language if language_confidence >= LANGUAGE_CONFIDENCE_THRESHOLD else None
+    return intent
+
+
+def add_language_classification(system_instruction, functions):
+    """Extend an intent prompt/schema so the same call also returns user_language"""
+    language_property = load_functions("prompts/language_detector.json")["parameters"]["properties"]["user_language"]
+
+    parameters = functions["parameters"]
+    parameters["properties"]["user_language"] = language_property
+    parameters["required"] = parameters.get("required", []) + ["user_language"]
+
+    system_instruction += (
+        "\n\nAlso classify the language of the user's message in user_language. "
+        "Base it strictly on the words of the message; a mix of English and Tagalog is 'Taglish' "
+        "and a mix of English and Bisaya is 'Bislish'."
+    )
+    return system_instruction, functions
+
+
 def get_max_messages():
     return 6
+
+
+NO_FEED_PROGRAM_CONTEXT = "No active feed program. User needs to start a feed program first."
   
   
-def get_feed_program_context(farmer: FarmerV2, user_id: int) -> str:
-    """Get feed program context for AI responses"""
+async def get_active_feed_product_or_none(farmer: FarmerV2, user_id: int):
     try:
-        feed_product = farmer.get_active_feed_product(user_id)
-        if feed_product:
-            return f"""
+        return await farmer.get_active_feed_product_async(user_id)
+    except Exception:
+        return None
+
+
+def format_feed_program_context(feed_product) -> str:
+    if not feed_product:
+        return NO_FEED_PROGRAM_CONTEXT
+
+    return f"""
           Active Feed Program Context:
             Feed: {feed_product['feed_name']}
             Stage: {feed_product['feed_stage']}
@@ -155,19 +345,19 @@ def get_feed_program_context(farmer: FarmerV2, user_id: int) -> str:
             Goal: {feed_product['feed_goal']}
             Age Range: {feed_product['age_range_start']}-{feed_product['age_range_end']} days
             """
-        else:
-            return "No active feed program. User needs to start a feed program first."
-    except Exception:
-        return "No active feed program. User needs to start a feed program first."
+
+
+async def get_feed_program_context(farmer: FarmerV2, user_id: int) -> str:
+    """Get feed program context for AI responses"""
+    return format_feed_program_context(await get_active_feed_product_or_none(farmer, user_id))
 
 
 def handle_no_active_program_response(prompt: str, form_key: str) -> dict:
     """Handle responses when user has no active feed program"""
     
-    # Detect language from prompt (simple detection)
-    is_filipino = any(word in prompt.lower() for word in [
-        'ang', 'ng', 'sa', 'po', 'kasi', 'dahil', 'para', 'mga', 'ako', 'mo', 'ko'
-    ])
+    # Local detection only, no need to spend an LLM call on a canned reply
+    language, _ = detect_language_locally(prompt)
+    is_filipino = language not in (None, "English")
     
     if is_filipino:
         if "health" in form_key or "incident" in form_key:
@@ -0,0 +1,69 @@
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Prompt budget (estimated tokens) for the conversation history of each kind of chat call
+HISTORY_TOKEN_BUDGETS = {
+    "general": int(os.getenv("HISTORY_TOKENS_GENERAL", "1500")),
+    "log": int(os.getenv("HISTORY_TOKENS_LOG", "1000")),
+    "default": int(os.getenv("HISTORY_TOKENS_DEFAULT", "1200")),
+}
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+# Unsummarized messages fetched on top of the verbatim window, to be folded into the summary
+HISTORY_FOLD_BATCH = int(os.getenv("HISTORY_FOLD_BATCH", "20"))
+SUMMARY_LINE_CHARS = 160
+SUMMARY_HEADER = "Summary of the earlier conversation today:\n"
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    # Roughly four characters per token for English/Filipino text, close enough for budgeting
+    return math.ceil(len(text or "") / 4)
+
+
+def get_history_budget(kind: str) -> int:
+    return HISTORY_TOKEN_BUDGETS.get(kind, HISTORY_TOKEN_BUDGETS["default"])
+
+
+def build_history(messages: List[Dict], summary: Optional[str], max_messages: int, token_budget: int) -> Tuple[List[Dict], List[Dict]]:
+    """Split chronological chat_messages rows into (prompt messages, rows to fold into the summary).
+
+    The last max_messages rows stay verbatim as long as they fit in token_budget together with the summary;
+    older rows, and verbatim rows that do not fit, are returned for folding.
+    """
+    verbatim = messages[-max_messages:] if max_messages else list(messages)
+    folded = messages[:len(messages) - len(verbatim)]
+
+    budget = token_budget - estimate_tokens(summary)
+    used = sum(estimate_tokens(row["message"]) for row in verbatim)
+    while len(verbatim) > 1 and used > budget:
+        row = verbatim.pop(0)
+        used -= estimate_tokens(row["message"])
+        folded.append(row)
+
+    history = []
+    if summary:
+        history.append({"role": "system", "content": SUMMARY_HEADER + summary})
+
+    for row in verbatim:
+        content = row["message"]
+        # A single message over the budget is cut rather than dropped
+        if estimate_tokens(content) > budget > 0:
+            content = content[:budget * 4]
+        history.append({"role": "assistant" if row["role"] == "model" else "user", "content": content})
+
+    return history, folded
+
+
+def fold_into_summary(summary: Optional[str], rows: List[Dict], token_limit: int = HISTORY_SUMMARY_TOKENS) -> str:
+    """Extractive rolling summary: one short line per folded message, oldest lines dropped past token_limit"""
+    lines = summary.splitlines() if summary else []
+    for row in rows:
+        speaker = "Assistant" if row["role"] == "model" else "User"
+        text = " ".join(row["message"].split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS - 3].rstrip() + "..."
+        lines.append(f"- {speaker}: {text}")
+
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > token_limit:
+        lines.pop(0)
+    return "\n".join(lines)
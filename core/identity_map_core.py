@@ -0,0 +1,201 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from core.metrics_core import metrics
+
+# Memoize identical Supabase reads within one HTTP request (see main.py)
+IDENTITY_MAP_ENABLED = os.getenv("IDENTITY_MAP_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Response headers that describe the wire encoding, not the cached (already decoded) body
+WIRE_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class IdentityMap:
+    """PostgREST reads of one request by table and query; any write to a table drops what was read from it.
+
+    Entries are futures, so a read already on its way (e.g. from a concurrent stage of the same chat turn) is
+    waited for instead of being sent again. They resolve to None when the read did not succeed.
+    """
+
+    def __init__(self):
+        self._tables: Dict[str, Dict[tuple, Future]] = {}
+        self._lock = threading.Lock()
+        # Tables with writes queued in the write-behind queue (see core.write_queue_core)
+        self._deferred = set()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, table: str, key: tuple, join_pending: bool = True) -> Tuple[Future, bool]:
+        """The future of the read and whether the caller has to make it (and resolve() it)"""
+        with self._lock:
+            reads = self._tables.setdefault(table, {})
+            future = reads.get(key)
+            owner = future is None or not (join_pending or future.done())
+            if future is None:
+                future = reads[key] = Future()
+            elif owner:
+                # Made again rather than waited for; the copy is not remembered
+                future = Future()
+            if owner:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.inc("identity_map_lookups_total", {"table": table, "result": "miss" if owner else "hit"})
+        return future, owner
+
+    def resolve(self, table: str, key: tuple, future: Future, response: Optional[httpx.Response]):
+        if response is not None and response.status_code == 200:
+            headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in WIRE_HEADERS]
+            future.set_result((response.status_code, headers, response.content))
+            return
+        # Failed reads are not remembered; whoever waited on this one makes its own
+        with self._lock:
+            if self._tables.get(table, {}).get(key) is future:
+                del self._tables[table][key]
+        future.set_result(None)
+
+    def invalidate(self, table: Optional[str] = None):
+        with self._lock:
+            if table is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table, None)
+
+    def defer(self, table: str):
+        """A write to table was queued; it is dropped now and again once the write lands"""
+        with self._lock:
+            self._tables.pop(table, None)
+            self._deferred.add(table)
+
+    def landed(self):
+        """The queued writes are written; reads made while they waited may be stale"""
+        with self._lock:
+            for table in self._deferred:
+                self._tables.pop(table, None)
+            self._deferred.clear()
+
+
+request_identity_map: contextvars.ContextVar[Optional[IdentityMap]] = contextvars.ContextVar("request_identity_map", default=None)
+
+
+@contextmanager
+def identity_map_scope():
+    """Reads made inside share one identity map (a no-op when IDENTITY_MAP_ENABLED is off)"""
+    identity_map = IdentityMap() if IDENTITY_MAP_ENABLED else None
+    token = request_identity_map.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        request_identity_map.reset(token)
+
+
+def defer_write(table: str):
+    identity_map = request_identity_map.get()
+    if identity_map is not None:
+        identity_map.defer(table)
+
+
+def deferred_writes_landed():
+    identity_map = request_identity_map.get()
+    if identity_map is not None:
+        identity_map.landed()
+
+
+class IdentityMapTransport(httpx.BaseTransport):
+    """Serves repeated PostgREST GETs of the current request from its identity map"""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        identity_map = request_identity_map.get()
+        table = _table(request)
+        if identity_map is None or table is None:
+            return self.transport.handle_request(request)
+
+        if request.method != "GET":
+            identity_map.invalidate(table)
+            response = self.transport.handle_request(request)
+            # Reads that ran alongside the write may have cached the old rows
+            identity_map.invalidate(table)
+            return response
+
+        key = _key(request)
+        # Sync clients are also called from the event loop, where waiting on an async read would deadlock
+        future, owner = identity_map.lookup(table, key, join_pending=False)
+        if not owner:
+            cached = future.result()
+            return _response(request, cached) if cached is not None else self.transport.handle_request(request)
+
+        response = None
+        try:
+            response = self.transport.handle_request(request)
+            if response.status_code == 200:
+                response.read()
+        finally:
+            identity_map.resolve(table, key, future, response)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncIdentityMapTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        identity_map = request_identity_map.get()
+        table = _table(request)
+        if identity_map is None or table is None:
+            return await self.transport.handle_async_request(request)
+
+        if request.method != "GET":
+            identity_map.invalidate(table)
+            response = await self.transport.handle_async_request(request)
+            identity_map.invalidate(table)
+            return response
+
+        key = _key(request)
+        future, owner = identity_map.lookup(table, key)
+        if not owner:
+            cached = await asyncio.wrap_future(future)
+            return _response(request, cached) if cached is not None else await self.transport.handle_async_request(request)
+
+        response = None
+        try:
+            response = await self.transport.handle_async_request(request)
+            if response.status_code == 200:
+                await response.aread()
+        finally:
+            identity_map.resolve(table, key, future, response)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def _table(request: httpx.Request) -> Optional[str]:
+    # Table endpoints only; RPC functions may read or write anything, so they are neither cached nor invalidating
+    path = request.url.path
+    if "/rest/v1/" not in path:
+        return None
+    target = path.split("/rest/v1/", 1)[1]
+    return None if not target or target.startswith("rpc/") else target
+
+
+def _key(request: httpx.Request) -> tuple:
+    # The query string holds the filters; Accept and Prefer decide single-object and count responses
+    return (str(request.url), request.headers.get("accept"), request.headers.get("prefer"), request.headers.get("range"))
+
+
+def _response(request: httpx.Request, cached: Tuple[int, list, bytes]) -> httpx.Response:
+    status_code, headers, content = cached
+    return httpx.Response(status_code, headers=headers, content=content, request=request)
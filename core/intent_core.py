@@ -0,0 +1,272 @@
+import math
+import os
+import random
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.prompt_core import prompt_registry
+
+# "on" answers confident messages locally, "shadow" only compares with the LLM, "off" disables the classifier.
+# Only switch to "on" once stats() shows the shadow agreement with the LLM is high enough
+INTENT_CLASSIFIER_MODE = os.getenv("INTENT_CLASSIFIER_MODE", "shadow").lower()
+INTENT_LOCAL_CONFIDENCE = float(os.getenv("INTENT_LOCAL_CONFIDENCE", "0.9"))
+# The linear model is only trusted once it has seen this many labelled messages besides the seed samples,
+# with at least INTENT_MIN_LABEL_SAMPLES of every intent (a history of one intent teaches it nothing)
+INTENT_MIN_TRAINING_SAMPLES = int(os.getenv("INTENT_MIN_TRAINING_SAMPLES", "200"))
+INTENT_MIN_LABEL_SAMPLES = int(os.getenv("INTENT_MIN_LABEL_SAMPLES", "10"))
+INTENT_TRAINING_LIMIT = int(os.getenv("INTENT_TRAINING_LIMIT", "5000"))
+INTENT_AGREEMENT_LOG_EVERY = int(os.getenv("INTENT_AGREEMENT_LOG_EVERY", "50"))
+
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+(?:-[^\W\d_]+)*", re.UNICODE)
+DESCRIPTION_PATTERN = re.compile(r"^\s*(\d+)\.\s*(.+)$")
+EXAMPLE_PATTERN = re.compile(r"['\"“](.+?)['\"”]")
+
+# Intents whose handlers need nothing from the LLM classification besides the id
+MODEL_FAST_PATH_INTENTS = frozenset({1})
+
+# A message made only of these words is a greeting, thanks or acknowledgement (intent 6)
+GREETING_WORDS = frozenset({"hi", "hello", "hey", "good", "morning", "afternoon", "evening", "day", "magandang", "umaga",
+                            "hapon", "gabi", "araw", "tanghali", "maayong", "buntag", "gabii", "adlaw"})
+THANKS_WORDS = frozenset({"thank", "thanks", "thankyou", "ty", "salamat", "maraming", "daghang", "kaayo", "much", "so", "very", "lot", "a"})
+ACKNOWLEDGE_WORDS = frozenset({"ok", "okay", "okey", "sige", "noted", "ge", "yes", "oo", "opo", "cge", "alright", "nice", "great", "ayos"})
+POLITE_FILLERS = frozenset({"po", "ho", "sir", "maam", "ma'am", "doc", "bai", "you", "nimo", "ninyo", "sa", "inyo", "lang", "na", "nalang", "pud", "din", "rin", "naman"})
+
+POLITE_REPLIES = {
+    "thanks": {
+        "English": "You're welcome! Is there anything else I can help you with?",
+        "Tagalog": "Walang anuman po! May iba pa po ba akong maitutulong?",
+        "Bisaya": "Walay sapayan! Naa pa bay lain nga akong matabang?",
+    },
+    "greeting": {
+        "English": "Hello! How can I help you with your farm today?",
+        "Tagalog": "Magandang araw po! Ano po ang maitutulong ko sa inyong manukan?",
+        "Bisaya": "Maayong adlaw! Unsa man akong matabang sa imong manukan?",
+    },
+    "acknowledge": {
+        "English": "Alright! Just let me know if you have other questions.",
+        "Tagalog": "Sige po! Sabihan n'yo lang po ako kung may tanong pa kayo.",
+        "Bisaya": "Sige! Pahibalo lang kung naa pa kay pangutana.",
+    },
+}
+REPLY_LANGUAGES = {"Tagalog": "Tagalog", "Taglish": "Tagalog", "Bisaya": "Bisaya", "Bislish": "Bisaya"}
+
+
+def polite_kind(text: str) -> Optional[str]:
+    """Greeting/thanks/acknowledge if the message is nothing but that, else None"""
+    words = [word for word in TOKEN_PATTERN.findall((text or "").lower()) if word not in POLITE_FILLERS]
+    if not words or len(words) > 5:
+        return None
+
+    if not all(word in ACKNOWLEDGE_WORDS or word in THANKS_WORDS or word in GREETING_WORDS for word in words):
+        return None
+    if any(word in ("thank", "thanks", "thankyou", "ty", "salamat") for word in words):
+        return "thanks"
+    if all(word in GREETING_WORDS for word in words):
+        return "greeting"
+    return "acknowledge"
+
+
+def polite_reply(kind: str, language: Optional[str]) -> str:
+    return POLITE_REPLIES[kind][REPLY_LANGUAGES.get(language, "English")]
+
+
+class IntentClassifier:
+    """Softmax regression over hashed word and character n-grams, trained online from LLM classifications"""
+
+    def __init__(self, prompt_file: str, buckets: int = 1 << 18, learning_rate: float = 0.5, epochs: int = 8):
+        self.prompt_file = prompt_file
+        self.buckets = buckets
+        self.learning_rate = learning_rate
+        self.epochs = epochs
+        self._weights: Dict[int, Dict[int, float]] = {}
+        self._bias: Dict[int, float] = {}
+        self._learned: Counter = Counter()
+        self._trained = False
+        self._lock = threading.Lock()
+        self.compared = 0
+        self.agreed = 0
+        self.confusion: Counter = Counter()
+
+    def labels(self) -> List[int]:
+        return sorted(self._weights)
+
+    def learn(self, text: str, intent_id: int):
+        """Single SGD step, used for every message the LLM classifies"""
+        features = self.__features(text)
+        if not features or intent_id is None:
+            return
+
+        with self._lock:
+            self.__step(features, int(intent_id))
+            self._learned[int(intent_id)] += 1
+
+    def train(self, samples: Iterable[Tuple[str, int]], counts_as_history: bool = True) -> int:
+        samples = [(self.__features(text), int(intent_id)) for text, intent_id in samples if text and intent_id is not None]
+        samples = [(features, intent_id) for features, intent_id in samples if features]
+
+        order = random.Random(0)
+        with self._lock:
+            for _ in range(self.epochs):
+                order.shuffle(samples)
+                for features, intent_id in samples:
+                    self.__step(features, intent_id)
+            if counts_as_history:
+                self._learned.update(intent_id for _, intent_id in samples)
+            self._trained = True
+        return len(samples)
+
+    def ensure_trained(self):
+        if not self._trained:
+            self.train(self.__prompt_samples(), counts_as_history=False)
+
+    def train_from_intent_labels(self, client, limit: int = INTENT_TRAINING_LIMIT) -> int:
+        self.ensure_trained()
+
+        # classify_intent stores every message the LLM classified with this classifier (sql/intent_labels.sql)
+        response = (
+            client.table("intent_labels")
+            .select("message, intent_id")
+            .eq("classifier", self.prompt_file)
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
+
+        labels = set(self.labels())
+        samples = [
+            (row["message"], int(row["intent_id"]))
+            for row in response.data or []
+            if row.get("message") and row.get("intent_id") is not None and int(row["intent_id"]) in labels
+        ]
+        return self.train(samples)
+
+    def history_ready(self) -> bool:
+        """Whether the labelled history is large and varied enough for the fast path"""
+        with self._lock:
+            learned = self._learned
+            return (sum(learned.values()) >= INTENT_MIN_TRAINING_SAMPLES
+                    and all(learned[label] >= INTENT_MIN_LABEL_SAMPLES for label in self._weights))
+
+    def predict(self, text: str) -> Tuple[Optional[int], float]:
+        self.ensure_trained()
+
+        kind = polite_kind(text)
+        if kind is not None:
+            return 6, 0.99
+
+        features = self.__features(text)
+        if not features:
+            return None, 0.0
+
+        with self._lock:
+            probabilities = self.__probabilities(features)
+        intent_id = max(probabilities, key=probabilities.get)
+        return intent_id, probabilities[intent_id]
+
+    def fast_path(self, text: str) -> Tuple[Optional[int], float]:
+        """Intent to use without calling the LLM, or (None, confidence) when the LLM should decide"""
+        intent_id, confidence = self.predict(text)
+
+        if intent_id == 6 and polite_kind(text) is not None:
+            return intent_id, confidence
+        if intent_id in MODEL_FAST_PATH_INTENTS and confidence >= INTENT_LOCAL_CONFIDENCE and self.history_ready():
+            return intent_id, confidence
+        return None, confidence
+
+    def record_agreement(self, local_intent: Optional[int], llm_intent: int):
+        with self._lock:
+            self.compared += 1
+            if local_intent == llm_intent:
+                self.agreed += 1
+            else:
+                self.confusion[(local_intent, llm_intent)] += 1
+            compared, agreed = self.compared, self.agreed
+
+        if compared % INTENT_AGREEMENT_LOG_EVERY == 0:
+            print(f"Intent classifier {self.prompt_file}: local/LLM agreement {agreed / compared:.1%} ({agreed}/{compared})")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "mode": INTENT_CLASSIFIER_MODE,
+                "learned": sum(self._learned.values()),
+                "learned_per_intent": dict(self._learned),
+                "compared": self.compared,
+                "agreed": self.agreed,
+                "agreement": self.agreed / self.compared if self.compared else None,
+                "confusion": {f"{local}->{llm}": count for (local, llm), count in self.confusion.most_common(10)},
+            }
+
+    def __step(self, features: Dict[int, float], intent_id: int):
+        if intent_id not in self._weights:
+            self._weights[intent_id] = {}
+            self._bias[intent_id] = 0.0
+
+        probabilities = self.__probabilities(features)
+        for label, probability in probabilities.items():
+            gradient = self.learning_rate * ((1.0 if label == intent_id else 0.0) - probability)
+            weights = self._weights[label]
+            for feature, value in features.items():
+                weights[feature] = weights.get(feature, 0.0) + gradient * value
+            self._bias[label] += gradient * 0.1
+
+    def __probabilities(self, features: Dict[int, float]) -> Dict[int, float]:
+        if not self._weights:
+            return {}
+
+        scores = {}
+        for label, weights in self._weights.items():
+            scores[label] = self._bias[label] + sum(weights.get(feature, 0.0) * value for feature, value in features.items())
+
+        top = max(scores.values())
+        exps = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    def __features(self, text: str) -> Dict[int, float]:
+        words = TOKEN_PATTERN.findall((text or "").lower())
+        if not words:
+            return {}
+
+        grams = [f"w:{word}" for word in words]
+        grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            grams += [f"c:{padded[i:i + 4]}" for i in range(max(1, len(padded) - 3))]
+
+        counts = Counter(zlib.crc32(gram.encode("utf-8")) % self.buckets for gram in grams)
+        norm = math.sqrt(sum(count * count for count in counts.values()))
+        return {feature: count / norm for feature, count in counts.items()}
+
+    def __prompt_samples(self) -> List[Tuple[str, int]]:
+        # Intent descriptions (and the examples quoted in them) from the classifier prompt
+        samples = []
+        for line in prompt_registry.get_text(f"{self.prompt_file}.txt").splitlines():
+            match = DESCRIPTION_PATTERN.match(line)
+            if not match:
+                continue
+            intent_id = int(match.group(1))
+            samples.append((match.group(2), intent_id))
+            samples.extend((example, intent_id) for example in EXAMPLE_PATTERN.findall(match.group(2)))
+
+        labels = {intent_id for _, intent_id in samples}
+        seeds = prompt_registry.get("prompts/intent_samples.json").data
+        for intent_id, examples in seeds.items():
+            if int(intent_id) in labels:
+                samples.extend((example, int(intent_id)) for example in examples)
+        return samples
+
+
+_classifiers: Dict[str, IntentClassifier] = {}
+_classifiers_lock = threading.Lock()
+
+
+def get_intent_classifier(prompt_file: str) -> IntentClassifier:
+    classifier = _classifiers.get(prompt_file)
+    if classifier is None:
+        with _classifiers_lock:
+            classifier = _classifiers.setdefault(prompt_file, IntentClassifier(prompt_file))
+    return classifier
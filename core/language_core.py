@@ -0,0 +1,282 @@
+import math
+import os
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.prompt_core import prompt_registry
+
+LANGUAGE_CONFIDENCE_THRESHOLD = float(os.getenv("LANGUAGE_CONFIDENCE_THRESHOLD", "0.6"))
+LANGUAGE_TRAINING_LIMIT = int(os.getenv("LANGUAGE_TRAINING_LIMIT", "5000"))
+# Distinct n-grams (and English words) kept; once full, only n-grams already known are counted
+LANGUAGE_MAX_VOCABULARY = int(os.getenv("LANGUAGE_MAX_VOCABULARY", "200000"))
+# Recent messages labelled by the LLM, so their stored label can be told apart from a local guess
+LANGUAGE_LLM_LABELS = int(os.getenv("LANGUAGE_LLM_LABELS", "2000"))
+# Times a word has to turn up in LLM-labelled English messages before it counts as English
+LANGUAGE_ENGLISH_MIN_COUNT = int(os.getenv("LANGUAGE_ENGLISH_MIN_COUNT", "3"))
+
+TOKEN_PATTERN = re.compile(r"[a-zñ]+(?:-[a-zñ]+)*")
+EXAMPLE_PATTERN = re.compile(r"[\"“](.+?)[\"”]")
+
+# Base language -> label used when the message is mixed with English
+MIXED_LANGUAGES = {
+    "Tagalog": "Taglish",
+    "Bisaya": "Bislish",
+}
+BASE_LANGUAGES = {mixed: base for base, mixed in MIXED_LANGUAGES.items()}
+
+# Common English words plus farm vocabulary that shows up untranslated in Taglish/Bislish messages
+ENGLISH_WORDS = frozenset("""
+a about after again all am an and any are as ask at average bag bags be because been before best bird birds
+booster broiler broilers but by can check chick chicks chicken chickens day days dealer did died do does dont
+eat eating enough farm farms feed feeder feeding feeds fcr for from get getting good grower guide had has have
+he hello help her hi his how i if in intake is it its just kg know last later layer layers left log many me
+mix more morning mortality much my need no not now of ok okay on one only or our out pellet pellets please
+price report sales she should sick since so some starter stock than thank thanks that the their them then
+there they this to today tomorrow too two up very visit visited want was we week weight well were what when
+where which who why will with would yes yesterday you your
+""".split())
+
+
+class LanguageDetector:
+    """Naive Bayes over word and character n-grams; English is measured separately so mixes can be labelled"""
+
+    def __init__(self, min_ngram: int = 2, max_ngram: int = 4, alpha: float = 0.5, word_weight: int = 3,
+                 max_vocabulary: int = LANGUAGE_MAX_VOCABULARY):
+        self.min_ngram = min_ngram
+        self.max_ngram = max_ngram
+        self.alpha = alpha
+        self.word_weight = word_weight
+        self.max_vocabulary = max_vocabulary
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._totals: Dict[str, int] = defaultdict(int)
+        self._vocabulary = set()
+        self._english_words = set(ENGLISH_WORDS)
+        # Occurrences in English-labelled messages of words not (yet) in _english_words
+        self._english_candidates: Dict[str, int] = defaultdict(int)
+        self._log_probs: Optional[Dict[str, Tuple[Dict[str, float], float]]] = None
+        self._trained = False
+        self._llm_labels: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def learn(self, text: str, language: str, trusted: bool = False):
+        """Count text under language. Untrusted (LLM) labels only make a word English once it has been seen
+        LANGUAGE_ENGLISH_MIN_COUNT times, and never a word already known from another language"""
+        if not language:
+            return
+
+        words = TOKEN_PATTERN.findall(text.lower())
+        if language == "English":
+            with self._lock:
+                for word in words:
+                    if word in self._english_words or self.__known_locally(word):
+                        continue
+                    if len(self._english_words) >= self.max_vocabulary:
+                        break
+                    if trusted:
+                        self._english_words.add(word)
+                        continue
+                    if word not in self._english_candidates and len(self._english_candidates) >= self.max_vocabulary:
+                        continue
+                    self._english_candidates[word] += 1
+                    if self._english_candidates[word] >= LANGUAGE_ENGLISH_MIN_COUNT:
+                        self._english_words.add(word)
+                        del self._english_candidates[word]
+            return
+
+        # Mixed labels train their base language on the non-English words only
+        base_language = BASE_LANGUAGES.get(language, language)
+        features = self.__features([word for word in words if word not in self._english_words])
+        if not features:
+            return
+
+        with self._lock:
+            counts = self._counts[base_language]
+            counted = 0
+            for feature in features:
+                if feature not in self._vocabulary:
+                    if len(self._vocabulary) >= self.max_vocabulary:
+                        continue
+                    self._vocabulary.add(feature)
+                counts[feature] += 1
+                counted += 1
+            self._totals[base_language] += counted
+            self._log_probs = None
+
+    def learn_from_llm(self, text: str, language: str):
+        """learn() from a label the LLM gave, remembered so label_source() can vouch for it when it is stored"""
+        if not language:
+            return
+        # The seed samples first, so words they know are never taken for English
+        self.ensure_trained()
+        self.learn(text, language)
+        with self._lock:
+            self._llm_labels[text] = language
+            self._llm_labels.move_to_end(text)
+            while len(self._llm_labels) > LANGUAGE_LLM_LABELS:
+                self._llm_labels.popitem(last=False)
+
+    def label_source(self, text: str, language: Optional[str]) -> str:
+        """"llm" when the LLM labelled text with language, else "local" (this detector's own guess)"""
+        with self._lock:
+            return "llm" if language and self._llm_labels.get(text) == language else "local"
+
+    def train(self, samples: Iterable[Tuple[str, str]], trusted: bool = False) -> int:
+        # English samples first so their words are excluded from the other languages
+        samples = sorted(samples, key=lambda sample: sample[1] != "English")
+        for text, language in samples:
+            self.learn(text, language, trusted)
+        self._trained = True
+        return len(samples)
+
+    def ensure_trained(self):
+        if not self._trained:
+            self.train(self.__prompt_samples(), trusted=True)
+
+    def train_from_chat_messages(self, client, limit: int = LANGUAGE_TRAINING_LIMIT) -> int:
+        self.ensure_trained()
+
+        # Messages stored by the chat handlers carry the language the reply was written in. Only the labels the
+        # LLM gave are used: training on this detector's own guesses would reinforce its mistakes
+        response = (
+            client.table("chat_messages")
+            .select("message, message_metadata->>user_language")
+            .eq("role", "user")
+            .eq("message_metadata->>language_source", "llm")
+            .not_.is_("message_metadata->>user_language", "null")
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
+
+        allowed = set(self.__allowed_languages())
+        samples = [
+            (row["message"], row["user_language"])
+            for row in response.data or []
+            if row.get("message") and row.get("user_language") in allowed
+        ]
+        return self.train(samples)
+
+    def detect(self, text: str) -> Tuple[Optional[str], float]:
+        self.ensure_trained()
+
+        words = TOKEN_PATTERN.findall(text.lower())
+        if not words:
+            return None, 0.0
+
+        # Very short messages ("ok", "salamat") are shared across languages
+        length_factor = min(1.0, len(words) / 3)
+
+        local_words = [word for word in words if word not in self._english_words]
+        # Shares are compared as integer counts, 1 - 4/5 is a hair under 0.2 in floating point
+        english_count = len(words) - len(local_words)
+        english_share = english_count / len(words)
+        if english_count * 100 >= 85 * len(words) or not local_words:
+            return "English", round(english_share * length_factor, 4)
+
+        language, confidence = self.__classify(local_words)
+        if language is None:
+            return None, 0.0
+
+        if english_count * 5 >= len(words):
+            language = MIXED_LANGUAGES.get(language, language)
+
+        known_share = sum(1 for word in local_words if "w:" + word in self._vocabulary) / len(local_words)
+        confidence *= length_factor * (0.5 + 0.5 * known_share)
+        # Words several languages use ("kumusta ka na") alone say little about which one this is
+        base_language = BASE_LANGUAGES.get(language, language)
+        if not any(self.__only_in(base_language, "w:" + word) for word in local_words):
+            confidence *= 0.5
+
+        return language, round(confidence, 4)
+
+    def __known_locally(self, word: str) -> bool:
+        feature = "w:" + word
+        return any(feature in counts for counts in self._counts.values())
+
+    def __only_in(self, language: str, feature: str) -> bool:
+        counts = self._counts.get(language)
+        if not counts or feature not in counts:
+            return False
+        return not any(feature in other for name, other in self._counts.items() if name != language)
+
+    def __classify(self, words: List[str]) -> Tuple[Optional[str], float]:
+        log_probs = self.__get_log_probs()
+        if not log_probs:
+            return None, 0.0
+
+        features = self.__features(words)
+        scores = {}
+        for language, (table, unseen) in log_probs.items():
+            scores[language] = sum(table.get(feature, unseen) for feature in features) / len(features)
+
+        # Softmax over the per-feature log likelihood; the factor sharpens it into a usable confidence
+        best = max(scores.values())
+        weights = {language: math.exp((score - best) * 8) for language, score in scores.items()}
+        language = max(weights, key=weights.get)
+        return language, weights[language] / sum(weights.values())
+
+    def __get_log_probs(self) -> Dict[str, Tuple[Dict[str, float], float]]:
+        log_probs = self._log_probs
+        if log_probs is not None:
+            return log_probs
+
+        with self._lock:
+            vocabulary_size = len(self._vocabulary) + 1
+            log_probs = {}
+            for language, counts in self._counts.items():
+                denominator = math.log(self._totals[language] + self.alpha * vocabulary_size)
+                table = {
+                    feature: math.log(count + self.alpha) - denominator
+                    for feature, count in counts.items()
+                }
+                log_probs[language] = (table, math.log(self.alpha) - denominator)
+            self._log_probs = log_probs
+
+        return log_probs
+
+    def __features(self, words: List[str]) -> List[str]:
+        features = []
+        for word in words:
+            features.extend(["w:" + word] * self.word_weight)
+            padded = f" {word} "
+            for size in range(self.min_ngram, self.max_ngram + 1):
+                for start in range(len(padded) - size + 1):
+                    features.append(padded[start:start + size])
+        return features
+
+    def __allowed_languages(self) -> List[str]:
+        schema = prompt_registry.get_functions("prompts/language_detector.json")
+        return schema["parameters"]["properties"]["user_language"]["enum"]
+
+    def __prompt_samples(self) -> List[Tuple[str, str]]:
+        allowed = set(self.__allowed_languages())
+        samples = []
+
+        # "Language (notes)" heading followed by an example line in prompts/language_detector.txt
+        language = None
+        for line in prompt_registry.get_text("prompts/language_detector.txt").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            example = EXAMPLE_PATTERN.search(line)
+            if example and language:
+                samples.append((example.group(1), language))
+                language = None
+                continue
+            heading = line.split(" (")[0]
+            language = heading if heading in allowed else None
+
+        for language, texts in prompt_registry.get_functions("prompts/language_samples.json").items():
+            if language in allowed:
+                samples.extend((text, language) for text in texts)
+
+        return samples
+
+
+language_detector = LanguageDetector()
+
+
+def detect_language_locally(text: str) -> Tuple[Optional[str], float]:
+    return language_detector.detect(text)
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+import random
+import threading
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.config import GEMINI_KEY, get_async_gpt_client, get_gemini_client, get_gpt_model, get_llm_model
+from core.llm_usage_core import llm_usage
+from core.metrics_core import metrics, track_llm_call
+from core.resilience_core import LlmUnavailableError, ResilientLlmCaller, is_provider_rejection
+from core.streaming_core import JsonStringFieldStreamer
+
+# Ordered "provider:model" candidates per call site (function name), as JSON; "default" covers the rest.
+# Without it every call goes to OpenAI first and fails over to Gemini when a Gemini key is configured.
+LLM_ROUTES = os.getenv("LLM_ROUTES", "")
+# "priority" tries candidates in order, "latency" tries the fastest healthy one first
+LLM_ROUTING = os.getenv("LLM_ROUTING", "priority").lower()
+# Routes every call to the fake provider (tests, benchmarks, local runs without keys)
+LLM_FAKE = os.getenv("LLM_FAKE", "false").lower() in ("1", "true", "yes")
+LLM_LATENCY_ALPHA = float(os.getenv("LLM_LATENCY_ALPHA", "0.2"))
+# Share of calls in latency mode that try another candidate, so its latency stays known
+LLM_EXPLORE_RATE = float(os.getenv("LLM_EXPLORE_RATE", "0.05"))
+
+OnText = Callable[[str], Awaitable[None]]
+
+
+class LlmProvider:
+    """One backend able to answer a forced function call; returns (arguments JSON, OpenAI-shaped usage)"""
+
+    name = "provider"
+
+    async def complete(self, model: str, messages: List[Dict], functions: Dict, function_name: str) -> Tuple[str, object]:
+        raise NotImplementedError
+
+    async def stream(self, model: str, messages: List[Dict], functions: Dict, function_name: str, on_text: OnText) -> Tuple[str, object]:
+        # Providers without incremental function arguments send the response field in one piece
+        arguments, usage = await self.complete(model, messages, functions, function_name)
+        text = JsonStringFieldStreamer("response").feed(arguments)
+        if text:
+            await on_text(text)
+        return arguments, usage
+
+
+class OpenAIProvider(LlmProvider):
+    name = "openai"
+
+    async def complete(self, model, messages, functions, function_name):
+        response = await get_async_gpt_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            functions=[functions],
+            function_call={"name": function_name}
+        )
+        return response.choices[0].message.function_call.arguments, response.usage
+
+    async def stream(self, model, messages, functions, function_name, on_text):
+        stream = await get_async_gpt_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            functions=[functions],
+            function_call={"name": function_name},
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        streamer = JsonStringFieldStreamer("response")
+        arguments = []
+        usage = None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            function_call = chunk.choices[0].delta.function_call
+            if not function_call or not function_call.arguments:
+                continue
+
+            arguments.append(function_call.arguments)
+            text = streamer.feed(function_call.arguments)
+            if text:
+                await on_text(text)
+        return "".join(arguments), usage
+
+
+class GeminiProvider(LlmProvider):
+    name = "gemini"
+
+    async def complete(self, model, messages, functions, function_name):
+        from google.genai import types
+
+        # Gemini takes one system instruction; system lines after the history (language) are appended to it
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        contents = [
+            types.Content(role="model" if m["role"] == "assistant" else "user", parts=[types.Part(text=m["content"])])
+            for m in messages if m["role"] != "system"
+        ]
+        config = types.GenerateContentConfig(
+            system_instruction=system or None,
+            tools=[types.Tool(function_declarations=[types.FunctionDeclaration(
+                name=functions["name"],
+                description=functions.get("description"),
+                parameters_json_schema=functions["parameters"],
+            )])],
+            tool_config=types.ToolConfig(function_calling_config=types.FunctionCallingConfig(
+                mode="ANY", allowed_function_names=[function_name])),
+            automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
+        )
+
+        response = await get_gemini_client().aio.models.generate_content(model=model, contents=contents, config=config)
+        if not response.function_calls:
+            raise LlmUnavailableError(f"Gemini returned no {function_name} call")
+
+        metadata = response.usage_metadata
+        usage = SimpleNamespace(
+            prompt_tokens=getattr(metadata, "prompt_token_count", 0) or 0,
+            completion_tokens=getattr(metadata, "candidates_token_count", 0) or 0,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=getattr(metadata, "cached_content_token_count", 0) or 0),
+        )
+        return json.dumps(response.function_calls[0].args or {}), usage
+
+
+class FakeProvider(LlmProvider):
+    """Answers instantly with schema-shaped arguments; responder(function_name, messages) can supply them"""
+
+    name = "fake"
+
+    def __init__(self, responder: Optional[Callable[[str, List[Dict]], Dict]] = None, latency: float = 0.0):
+        self.responder = responder
+        self.latency = latency
+
+    async def complete(self, model, messages, functions, function_name):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        arguments = self.responder(function_name, messages) if self.responder else None
+        if arguments is None:
+            arguments = fake_arguments(functions["parameters"])
+        usage = SimpleNamespace(prompt_tokens=sum(len(m["content"]) for m in messages) // 4, completion_tokens=20,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=0))
+        return json.dumps(arguments), usage
+
+    async def stream(self, model, messages, functions, function_name, on_text):
+        arguments, usage = await self.complete(model, messages, functions, function_name)
+        response = json.loads(arguments).get("response")
+        if isinstance(response, str):
+            for start in range(0, len(response), 16):
+                await on_text(response[start:start + 16])
+        return arguments, usage
+
+
+def fake_arguments(schema: Dict):
+    """Smallest value that satisfies a JSON schema: first enum value, zero, empty string, required keys only"""
+    kind = schema.get("type")
+    kind = next((k for k in kind if k != "null"), "null") if isinstance(kind, list) else kind
+    if "enum" in schema:
+        return next((value for value in schema["enum"] if value is not None), None)
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {name: fake_arguments(properties.get(name, {})) for name in schema.get("required", properties)}
+    if kind == "array":
+        return []
+    if kind in ("integer", "number"):
+        return 1
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return "Fake response"
+
+
+class LlmRouter:
+    """Routes each call site to an ordered list of provider/model candidates with failover between them"""
+
+    def __init__(self, routes: Optional[Dict[str, List[str]]] = None, routing: str = LLM_ROUTING):
+        self.providers: Dict[str, LlmProvider] = {
+            "openai": OpenAIProvider(),
+            "gemini": GeminiProvider(),
+            "fake": FakeProvider(),
+        }
+        self.callers: Dict[str, ResilientLlmCaller] = {}
+        self.routes = routes or self.__default_routes()
+        self.routing = routing
+        self._latency: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def register(self, provider: LlmProvider):
+        self.providers[provider.name] = provider
+
+    def set_routes(self, routes: Dict[str, List[str]]):
+        self.routes = routes
+
+    def candidates(self, call_site: str) -> List[Tuple[str, str]]:
+        route = self.routes.get(call_site) or self.routes["default"]
+        candidates = [tuple(entry.split(":", 1)) for entry in route]
+        if self.routing != "latency" or len(candidates) < 2:
+            return candidates
+
+        # Fastest first by smoothed latency; unmeasured candidates count as fastest so they get measured
+        ordered = sorted(candidates, key=lambda candidate: self._latency.get(":".join(candidate), 0.0))
+        if random.random() < LLM_EXPLORE_RATE:
+            ordered.append(ordered.pop(0))
+        return ordered
+
+    async def call(self, messages: List[Dict], functions: Dict, function_name: str, on_delta: Optional[OnText] = None) -> Dict:
+        """Parsed function call arguments from the first candidate that answers"""
+        errors = []
+        for provider_name, model in self.candidates(function_name):
+            # A provider with an open circuit fails at once, so failover does not wait on it
+            caller = self.__caller(provider_name)
+            try:
+                arguments = await self.__call_provider(provider_name, model, caller, messages, functions, function_name, on_delta)
+            except LlmUnavailableError as e:
+                errors.append(f"{provider_name}: {e}")
+                if on_delta is not None and getattr(e, "streamed", False):
+                    raise
+                metrics.inc("llm_failovers_total", {"call_site": function_name, "provider": provider_name})
+                continue
+            except Exception as e:
+                # A provider rejecting the request (bad parameter, auth, quota) says nothing about the next one
+                if not is_provider_rejection(e):
+                    raise
+                print(f"LLM provider {provider_name} rejected {function_name}: {e}")
+                errors.append(f"{provider_name}: {e}")
+                metrics.inc("llm_failovers_total", {"call_site": function_name, "provider": provider_name})
+                continue
+            return json.loads(arguments)
+
+        raise LlmUnavailableError(f"No LLM provider answered {function_name} ({'; '.join(errors)})")
+
+    async def __call_provider(self, provider_name, model, caller, messages, functions, function_name, on_delta) -> str:
+        provider = self.providers[provider_name]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        async with track_llm_call(function_name, model) as call:
+            if on_delta is None:
+                run = lambda: provider.complete(model, messages, functions, function_name)
+                arguments, usage = await caller.run(function_name, run)
+            else:
+                async def on_text(text):
+                    call.record_delta()
+                    await on_delta(text)
+
+                # No hedging, and no retry or failover once text went out to the client
+                run = lambda: provider.stream(model, messages, functions, function_name, on_text)
+                try:
+                    arguments, usage = await caller.run(function_name, run, hedge=False, can_retry=lambda: call.first_delta is None)
+                except LlmUnavailableError as e:
+                    e.streamed = call.first_delta is not None
+                    raise
+            call.record_usage(llm_usage.record(function_name, usage))
+
+        self.__record_latency(f"{provider_name}:{model}", loop.time() - started)
+        return arguments
+
+    def __record_latency(self, candidate: str, seconds: float):
+        with self._lock:
+            previous = self._latency.get(candidate)
+            self._latency[candidate] = seconds if previous is None else previous + LLM_LATENCY_ALPHA * (seconds - previous)
+
+    def __caller(self, provider_name: str) -> ResilientLlmCaller:
+        caller = self.callers.get(provider_name)
+        if caller is None:
+            with self._lock:
+                caller = self.callers.setdefault(provider_name, ResilientLlmCaller(provider_name))
+        return caller
+
+    def __default_routes(self) -> Dict[str, List[str]]:
+        if LLM_FAKE:
+            return {"default": ["fake:fake"]}
+        if LLM_ROUTES:
+            return json.loads(LLM_ROUTES)
+
+        default = [f"openai:{get_gpt_model()}"]
+        if GEMINI_KEY:
+            default.append(f"gemini:{get_llm_model()}")
+        return {"default": default}
+
+
+llm_router = LlmRouter()
@@ -0,0 +1,47 @@
+import os
+import threading
+from typing import Dict
+
+LLM_USAGE_LOG_EVERY = int(os.getenv("LLM_USAGE_LOG_EVERY", "50"))
+
+
+class LlmUsageStats:
+    """Token usage per call site (function name), mainly to see how much of each prompt the provider cached"""
+
+    def __init__(self, log_every: int = LLM_USAGE_LOG_EVERY):
+        self.log_every = log_every
+        self._sites: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, call_site: str, usage) -> Dict[str, int]:
+        if usage is None:
+            return {}
+
+        details = getattr(usage, "prompt_tokens_details", None)
+        tokens = {
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+            "completion_tokens": usage.completion_tokens or 0,
+        }
+
+        with self._lock:
+            site = self._sites.setdefault(call_site, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0})
+            site["calls"] += 1
+            for name, value in tokens.items():
+                site[name] += value
+            calls, prompt_tokens, cached_tokens = site["calls"], site["prompt_tokens"], site["cached_tokens"]
+
+        if self.log_every and calls % self.log_every == 0:
+            hit_rate = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+            print(f"Prompt cache {call_site}: {hit_rate:.1%} of prompt tokens cached over {calls} calls")
+        return tokens
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                call_site: {**site, "cache_hit_rate": site["cached_tokens"] / site["prompt_tokens"] if site["prompt_tokens"] else 0.0}
+                for call_site, site in self._sites.items()
+            }
+
+
+llm_usage = LlmUsageStats()
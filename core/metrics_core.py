@@ -0,0 +1,183 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# Timings of the current HTTP request, as (name, seconds); set by the timing middleware in main.py
+request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("request_timings", default=None)
+# HTTP attempts made by the current LLM call (retries and hedged requests included)
+llm_attempts: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("llm_attempts", default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms rendered in the Prometheus text format for GET /metrics"""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, labels: Dict[str, str], value: float):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, labels: Dict[str, str], value: float, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.buckets), list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        lines = []
+        described = set()
+
+        def header(name: str, default_kind: str):
+            if name in described:
+                return
+            described.add(name)
+            kind, text = self._help.get(name, (default_kind, ""))
+            if text:
+                lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+        for (name, labels), buckets, counts, total, count in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+metrics = MetricsRegistry()
+metrics.describe("llm_call_duration_seconds", "histogram", "Wall time of LLM calls per call site")
+metrics.describe("llm_first_delta_seconds", "histogram", "Time until a streamed LLM call produced its first response text")
+metrics.describe("llm_call_tokens", "histogram", "Tokens per LLM call by kind (prompt, completion, cached)")
+metrics.describe("llm_tokens_total", "counter", "Tokens used by LLM calls by kind (prompt, completion, cached)")
+metrics.describe("llm_calls_total", "counter", "LLM calls per call site and outcome")
+metrics.describe("llm_retries_total", "counter", "Extra HTTP requests made by LLM calls (retries and hedges)")
+metrics.describe("llm_failovers_total", "counter", "LLM calls handed to the next provider after one failed")
+metrics.describe("llm_hedged_requests_total", "counter", "LLM calls that sent a hedged second request")
+metrics.describe("llm_circuit_opened_total", "counter", "Times the LLM circuit breaker opened")
+metrics.describe("llm_circuit_state", "gauge", "LLM circuit breaker state (0 closed, 1 half open, 2 open)")
+metrics.describe("identity_map_lookups_total", "counter", "Supabase reads looked up in the request identity map, by table and hit/miss")
+metrics.describe("reference_data_lookups_total", "counter", "Feed product and growth target lookups served from memory (hit) or the database (miss)")
+metrics.describe("write_queue_failed_writes_total", "counter", "Queued writes that failed after every retry and went to the dead letter table")
+metrics.describe("http_request_duration_seconds", "histogram", "Wall time of HTTP requests per route")
+
+
+def add_request_timing(name: str, seconds: float):
+    timings = request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+async def count_llm_attempt(request):
+    """httpx request hook on the LLM client, counts every attempt of the current call"""
+    attempts = llm_attempts.get()
+    if attempts is not None:
+        attempts[0] += 1
+
+
+class LlmCall:
+    def __init__(self, call_site: str, model: str):
+        self.call_site = call_site
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_delta: Optional[float] = None
+        self.tokens: Dict[str, int] = {}
+
+    def record_usage(self, tokens: Dict[str, int]):
+        self.tokens = tokens
+
+    def record_delta(self):
+        if self.first_delta is None:
+            self.first_delta = time.perf_counter() - self.started
+
+
+@asynccontextmanager
+async def track_llm_call(call_site: str, model: str):
+    """Latency, tokens, retries and outcome of one LLM call, also added to the request's timing headers"""
+    call = LlmCall(call_site, model)
+    attempts = [0]
+    token = llm_attempts.set(attempts)
+    status = "ok"
+    try:
+        yield call
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        llm_attempts.reset(token)
+        elapsed = time.perf_counter() - call.started
+        labels = {"call_site": call_site, "model": model}
+
+        metrics.observe("llm_call_duration_seconds", {**labels, "status": "ok" if status == "ok" else "error"}, elapsed)
+        metrics.inc("llm_calls_total", {**labels, "status": status})
+        if attempts[0] > 1:
+            metrics.inc("llm_retries_total", labels, attempts[0] - 1)
+        if call.first_delta is not None:
+            metrics.observe("llm_first_delta_seconds", labels, call.first_delta)
+        for kind, value in call.tokens.items():
+            kind = kind.replace("_tokens", "")
+            metrics.inc("llm_tokens_total", {**labels, "kind": kind}, value)
+            metrics.observe("llm_call_tokens", {**labels, "kind": kind}, value, TOKEN_BUCKETS)
+
+        add_request_timing(f"llm_{call_site}", elapsed)
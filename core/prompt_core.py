@@ -0,0 +1,109 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+PROMPT_HOT_RELOAD = os.getenv("PROMPT_HOT_RELOAD", "false").lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class PromptFile:
+    name: str
+    content: str
+    data: Any
+    hash: str
+    mtime: float
+
+
+class PromptRegistry:
+    """In-memory cache of the files under prompts/, keyed by file name (e.g. "ask_farmer_intent.json")"""
+
+    def __init__(self, directory: str = PROMPTS_DIR, hot_reload: bool = PROMPT_HOT_RELOAD):
+        self.directory = directory
+        self.hot_reload = hot_reload
+        self._files: Dict[str, PromptFile] = {}
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        files = {}
+        for file_name in sorted(os.listdir(self.directory)):
+            if file_name.endswith((".txt", ".json")):
+                files[file_name] = self.__read(file_name)
+
+        with self._lock:
+            self._files = files
+
+        return len(files)
+
+    def get(self, file_path: str) -> PromptFile:
+        name = self.__to_name(file_path)
+        prompt_file = self._files.get(name)
+
+        if prompt_file is None:
+            prompt_file = self.__store(self.__read(name))
+        elif self.hot_reload and self.__mtime(name) != prompt_file.mtime:
+            print(f"Reloading prompt file: {name}")
+            prompt_file = self.__store(self.__read(name))
+
+        return prompt_file
+
+    def get_text(self, file_path: str) -> str:
+        return self.get(file_path).content
+
+    def get_functions(self, file_path: str) -> Dict:
+        # Callers may add/alter fields on the schema, so never hand out the cached object
+        return copy.deepcopy(self.get(file_path).data)
+
+    def get_hash(self, *file_paths: str) -> str:
+        if len(file_paths) == 1:
+            return self.get(file_paths[0]).hash
+
+        combined = hashlib.sha256()
+        for file_path in file_paths:
+            combined.update(self.get(file_path).hash.encode("utf-8"))
+        return combined.hexdigest()
+
+    def __to_name(self, file_path: str) -> str:
+        normalized = os.path.normpath(file_path)
+        if os.path.isabs(normalized):
+            return os.path.relpath(normalized, self.directory)
+
+        prefix = os.path.basename(self.directory) + os.sep
+        if normalized.startswith(prefix):
+            return normalized[len(prefix):]
+        return normalized
+
+    def __mtime(self, name: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(os.path.join(self.directory, name))
+        except OSError:
+            return None
+
+    def __read(self, name: str) -> PromptFile:
+        path = os.path.join(self.directory, name)
+        with open(path, "r", encoding="utf-8") as file:
+            content = file.read()
+
+        data = json.loads(content) if name.endswith(".json") else None
+
+        return PromptFile(
+            name=name,
+            content=content,
+            data=data,
+            hash=hashlib.sha256(content.encode("utf-8")).hexdigest(),
+            mtime=os.path.getmtime(path),
+        )
+
+    def __store(self, prompt_file: PromptFile) -> PromptFile:
+        with self._lock:
+            files = dict(self._files)
+            files[prompt_file.name] = prompt_file
+            self._files = files
+        return prompt_file
+
+
+prompt_registry = PromptRegistry()
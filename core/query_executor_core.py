@@ -0,0 +1,60 @@
+import contextvars
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Threads shared by every query plan in the process; bounds the concurrent Supabase requests they make
+QUERY_POOL_SIZE = int(os.getenv("QUERY_POOL_SIZE", "16"))
+
+_pool = ThreadPoolExecutor(max_workers=QUERY_POOL_SIZE, thread_name_prefix="query")
+
+Query = Callable[[Dict[str, Any]], Any]
+
+
+class QueryPlan:
+    """Named queries and the queries they depend on, run with as much concurrency as the dependencies allow.
+
+    Each query is called with the results of the queries it depends on and should handle the failures it can
+    live with itself; any other error stops the plan (queries not started yet are dropped) and is raised from run().
+    Queries must not run a plan of their own, as they would wait on the pool they are holding.
+    """
+
+    def __init__(self, pool: Optional[ThreadPoolExecutor] = None):
+        self.pool = pool or _pool
+        self._queries: Dict[str, Query] = {}
+        self._depends_on: Dict[str, tuple] = {}
+
+    def add(self, name: str, query: Query, depends_on: Iterable[str] = ()) -> "QueryPlan":
+        self._queries[name] = query
+        self._depends_on[name] = tuple(depends_on)
+        return self
+
+    def run(self) -> Dict[str, Any]:
+        for name, depends_on in self._depends_on.items():
+            unknown = [dependency for dependency in depends_on if dependency not in self._queries]
+            if unknown:
+                raise ValueError(f"Query {name} depends on unknown queries {unknown}")
+
+        results: Dict[str, Any] = {}
+        waiting = dict(self._depends_on)
+        running: Dict[Future, str] = {}
+
+        try:
+            while waiting or running:
+                for name in [name for name, depends_on in waiting.items() if all(d in results for d in depends_on)]:
+                    inputs = {dependency: results[dependency] for dependency in waiting.pop(name)}
+                    # Each query sees the caller's context variables (request timings and the like)
+                    context = contextvars.copy_context()
+                    running[self.pool.submit(context.run, self._queries[name], inputs)] = name
+
+                if not running:
+                    raise ValueError(f"Queries {sorted(waiting)} depend on each other")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        finally:
+            for future in running:
+                future.cancel()
+
+        return results
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config.config import get_async_supabase_client, get_supabase_client
+from core.metrics_core import metrics
+
+# How long a loaded snapshot is served before the next lookup reloads it
+REFERENCE_DATA_TTL = float(os.getenv("REFERENCE_DATA_TTL", str(15 * 60)))
+
+# Philippine regions (sales rep territories) by island group
+REGION_TO_ISLAND_GROUP = {
+    # Luzon
+    "Ilocos Region": "Luzon",
+    "Cagayan Valley": "Luzon",
+    "Central Luzon": "Luzon",
+    "CALABARZON": "Luzon",
+    "MIMAROPA": "Luzon",
+    "Bicol Region": "Luzon",
+    "NCR": "Luzon",
+    "CAR": "Luzon",
+
+    # Visayas
+    "Western Visayas": "Visayas",
+    "Central Visayas": "Visayas",
+    "Eastern Visayas": "Visayas",
+
+    # Mindanao
+    "Zamboanga Peninsula": "Mindanao",
+    "Northern Mindanao": "Mindanao",
+    "Davao Region": "Mindanao",
+    "SOCCSKSARGEN": "Mindanao",
+    "Caraga": "Mindanao",
+    "BARMM": "Mindanao",
+}
+
+
+def island_group(region: Optional[str]) -> str:
+    return REGION_TO_ISLAND_GROUP.get(region, "Unknown")
+
+
+class ReferenceData:
+    """feed_products and feed_growth_targets held in memory, reloaded once the snapshot is older than the TTL.
+
+    Ids missing from the snapshot (rows added since it was loaded) are fetched once and remembered, found
+    or not, until the next reload. Lookups return copies, callers may change what they get.
+    """
+
+    def __init__(self, ttl: float = REFERENCE_DATA_TTL):
+        self.ttl = ttl
+        self._feed_products: Dict[int, Optional[Dict]] = {}
+        # Target weight of the first growth target row of each feed product
+        self._target_weights: Dict[int, Optional[float]] = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def warm(self, client=None) -> Dict[str, int]:
+        client = client or get_supabase_client()
+        self.__load(self.__products_query(client).execute().data, self.__targets_query(client).execute().data)
+        return self.stats()
+
+    async def warm_async(self, client=None) -> Dict[str, int]:
+        client = client or await get_async_supabase_client()
+        products = await self.__products_query(client).execute()
+        targets = await self.__targets_query(client).execute()
+        self.__load(products.data, targets.data)
+        return self.stats()
+
+    def invalidate(self):
+        """Drop the snapshot; the next lookup loads a fresh one"""
+        with self._lock:
+            self._feed_products = {}
+            self._target_weights = {}
+            self._expires_at = 0.0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "feed_products": sum(1 for row in self._feed_products.values() if row is not None),
+                "feed_growth_targets": sum(1 for weight in self._target_weights.values() if weight is not None),
+                "expires_in": max(0, int(self._expires_at - time.monotonic())),
+            }
+
+    def feed_product(self, feed_product_id: Optional[int]) -> Optional[Dict]:
+        if not feed_product_id:
+            return None
+        if self.__expired():
+            self.warm()
+
+        found, row = self.__get(self._feed_products, "feed_products", feed_product_id)
+        if not found:
+            response = self.__product_query(get_supabase_client(), feed_product_id).execute()
+            row = self.__remember(self._feed_products, feed_product_id, response.data[0] if response.data else None)
+        return dict(row) if row is not None else None
+
+    async def feed_product_async(self, feed_product_id: Optional[int]) -> Optional[Dict]:
+        if not feed_product_id:
+            return None
+        if self.__expired():
+            await self.warm_async()
+
+        found, row = self.__get(self._feed_products, "feed_products", feed_product_id)
+        if not found:
+            client = await get_async_supabase_client()
+            response = await self.__product_query(client, feed_product_id).execute()
+            row = self.__remember(self._feed_products, feed_product_id, response.data[0] if response.data else None)
+        return dict(row) if row is not None else None
+
+    def target_weight_kg(self, feed_product_id: Optional[int]) -> Optional[float]:
+        if not feed_product_id:
+            return None
+        if self.__expired():
+            self.warm()
+
+        found, weight = self.__get(self._target_weights, "feed_growth_targets", feed_product_id)
+        if not found:
+            response = self.__target_query(get_supabase_client(), feed_product_id).execute()
+            weight = self.__remember(self._target_weights, feed_product_id,
+                                     response.data[0]["target_weight_kg"] if response.data else None)
+        return weight
+
+    def __expired(self) -> bool:
+        return time.monotonic() >= self._expires_at
+
+    def __load(self, products: List[Dict], targets: List[Dict]):
+        feed_products = {row["id"]: row for row in products or []}
+        target_weights = {}
+        for row in targets or []:
+            target_weights.setdefault(row["feed_product_id"], row["target_weight_kg"])
+
+        with self._lock:
+            self._feed_products = feed_products
+            self._target_weights = target_weights
+            self._expires_at = time.monotonic() + self.ttl
+
+    def __get(self, entries: Dict, table: str, key: int):
+        with self._lock:
+            found = key in entries
+            value = entries.get(key)
+        metrics.inc("reference_data_lookups_total", {"table": table, "result": "hit" if found else "miss"})
+        return found, value
+
+    def __remember(self, entries: Dict, key: int, value):
+        with self._lock:
+            entries[key] = value
+        return value
+
+    def __products_query(self, client):
+        return client.table("feed_products").select("*").order("id")
+
+    def __targets_query(self, client):
+        return client.table("feed_growth_targets").select("id, feed_product_id, target_weight_kg").order("id")
+
+    def __product_query(self, client, feed_product_id: int):
+        return client.table("feed_products").select("*").eq("id", feed_product_id).limit(1)
+
+    def __target_query(self, client, feed_product_id: int):
+        return (
+            client.table("feed_growth_targets")
+            .select("target_weight_kg")
+            .eq("feed_product_id", feed_product_id)
+            .order("id")
+            .limit(1)
+        )
+
+
+reference_data = ReferenceData()
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+import httpx
+import openai
+from google.genai import errors as genai_errors
+
+from core.intent_core import REPLY_LANGUAGES
+from core.language_core import detect_language_locally
+from core.metrics_core import metrics
+
+# Overall budget (seconds) per call site, retries included
+LLM_DEADLINES = {
+    "classify_intent": float(os.getenv("LLM_DEADLINE_CLASSIFY_INTENT", "8")),
+    "detect_language": float(os.getenv("LLM_DEADLINE_DETECT_LANGUAGE", "5")),
+    "feed_advisory": float(os.getenv("LLM_DEADLINE_FEED_ADVISORY", "30")),
+    "default": float(os.getenv("LLM_DEADLINE_DEFAULT", "25")),
+}
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.3"))
+# Hedging sends a second identical request once the first is slower than the call site's p95
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Provider trouble worth retrying; anything else (bad request, auth, ...) is a bug and goes straight up
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError,
+                    genai_errors.ServerError, httpx.TransportError, asyncio.TimeoutError)
+
+UNAVAILABLE_REPLIES = {
+    "English": "Sorry, I'm having trouble answering right now. Please try again in a few minutes.",
+    "Tagalog": "Pasensya na po, nagkakaproblema ako sa pagsagot ngayon. Pakisubukan po ulit pagkalipas ng ilang minuto.",
+    "Bisaya": "Pasayloa, naa koy problema sa pagtubag karon. Palihug sulayi pag-usab human sa pipila ka minuto.",
+}
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class LlmUnavailableError(Exception):
+    """The provider is failing or too slow; chat routes answer with unavailable_response instead"""
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive provider failures, lets one probe through after cooldown"""
+
+    def __init__(self, name: str, failure_threshold: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "closed":
+                return True
+            if self.state == "open" and now - self.opened_at < self.cooldown:
+                return False
+            # Half open: a single probe at a time, and a new one if the last never came back
+            if self.state == "half_open" and now - self.probe_started < self.cooldown:
+                return False
+            self.__set_state("half_open")
+            self.probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != "closed":
+                print(f"Circuit {self.name} closed")
+                self.__set_state("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                print(f"Circuit {self.name} open after {self.failures} failures")
+                metrics.inc("llm_circuit_opened_total", {"provider": self.name})
+                self.opened_at = time.monotonic()
+                self.__set_state("open")
+
+    def __set_state(self, state: str):
+        self.state = state
+        metrics.set("llm_circuit_state", {"provider": self.name}, CIRCUIT_STATES[state])
+
+
+class ResilientLlmCaller:
+    """Deadline, jittered retries, optional hedging and a circuit breaker around one provider's calls"""
+
+    def __init__(self, provider: str = "openai", max_retries: int = LLM_MAX_RETRIES, retry_base: float = LLM_RETRY_BASE,
+                 hedge_enabled: bool = LLM_HEDGE_ENABLED):
+        self.breaker = CircuitBreaker(provider)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.hedge_enabled = hedge_enabled
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def deadline(self, call_site: str) -> float:
+        return LLM_DEADLINES.get(call_site, LLM_DEADLINES["default"])
+
+    def hedge_delay(self, call_site: str) -> Optional[float]:
+        latencies = self._latencies.get(call_site)
+        if not self.hedge_enabled or not latencies or len(latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        return max(LLM_HEDGE_MIN_DELAY, ordered[int(len(ordered) * 0.95) - 1])
+
+    async def run(self, call_site: str, attempt: Callable[[], Awaitable], hedge: bool = True,
+                  can_retry: Callable[[], bool] = lambda: True):
+        """Result of attempt(), retried on provider errors within the call site's deadline.
+
+        Streaming callers pass hedge=False and a can_retry that turns false once output was sent.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline(call_site)
+
+        for retry in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise LlmUnavailableError(f"Circuit {self.breaker.name} is open")
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LlmUnavailableError(f"{call_site} ran out of time")
+
+            started = loop.time()
+            try:
+                result = await asyncio.wait_for(self.__attempt(call_site, attempt, hedge), remaining)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                self.breaker.record_failure()
+                reason = "timed out" if isinstance(e, asyncio.TimeoutError) else f"failed: {e}"
+                if retry == self.max_retries or not can_retry() or deadline - loop.time() <= 0:
+                    raise LlmUnavailableError(f"{call_site} {reason}") from e
+
+                print(f"LLM call {call_site} {reason}, retrying")
+                # Full jitter, never sleeping past the deadline
+                await asyncio.sleep(min(random.uniform(0, self.retry_base * (2 ** retry)), max(0.0, deadline - loop.time())))
+                continue
+
+            self.breaker.record_success()
+            self._latencies.setdefault(call_site, deque(maxlen=200)).append(loop.time() - started)
+            return result
+
+    async def __attempt(self, call_site: str, attempt: Callable[[], Awaitable], hedge: bool):
+        delay = self.hedge_delay(call_site) if hedge else None
+        if delay is None:
+            return await attempt()
+
+        tasks = {asyncio.ensure_future(attempt())}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                metrics.inc("llm_hedged_requests_total", {"call_site": call_site})
+                tasks.add(asyncio.ensure_future(attempt()))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    # google-genai raises ClientError for rate limits as well as for real client errors
+    return isinstance(error, genai_errors.ClientError) and getattr(error, "code", None) == 429
+
+
+def is_provider_rejection(error: Exception) -> bool:
+    """A 4xx from the provider (bad parameter, auth, quota, unknown model) that another provider may not hit.
+
+    Content and safety refusals are about the message itself, so they are not in it.
+    """
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        code = str(getattr(error, "code", None) or "")
+        refused = code in ("content_policy_violation", "content_filter") or "content management policy" in str(error)
+    elif isinstance(error, genai_errors.ClientError):
+        status = getattr(error, "code", None) or 0
+        refused = "SAFETY" in str(getattr(error, "status", "")) or "safety" in str(error).lower()
+    else:
+        return False
+    return 400 <= status < 500 and not refused
+
+
+def unavailable_reply(language: Optional[str]) -> str:
+    return UNAVAILABLE_REPLIES[REPLY_LANGUAGES.get(language, "English")]
+
+
+def unavailable_response(prompt: str) -> Dict:
+    """Chat payload used instead of an answer while the LLM is unavailable"""
+    language, _ = detect_language_locally(prompt)
+    return {"response": unavailable_reply(language), "log_type": None, "next_action": None, "unavailable": True}
+
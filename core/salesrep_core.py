@@ -3,6 +3,7 @@ from typing import List, Optional, Dict
 from config.config import get_supabase_client
 from collections import defaultdict
 from calendar import month_abbr
+from core.reference_data_core import island_group
 
 class SalesRep:
     def __init__(self):
@@ -102,33 +103,7 @@ class SalesRep:
         # Extract the region (territory)
         region = data[0]["territory"] if data else None
 
-        # Map Philippine regions to Luzon / Visayas / Mindanao
-        region_to_island_group = {
-            # Luzon
-            "Ilocos Region": "Luzon",
-            "Cagayan Valley": "Luzon",
-            "Central Luzon": "Luzon",
-            "CALABARZON": "Luzon",
-            "MIMAROPA": "Luzon",
-            "Bicol Region": "Luzon",
-            "NCR": "Luzon",
-            "CAR": "Luzon",
-
-            # Visayas
-            "Western Visayas": "Visayas",
-            "Central Visayas": "Visayas",
-            "Eastern Visayas": "Visayas",
-
-            # Mindanao
-            "Zamboanga Peninsula": "Mindanao",
-            "Northern Mindanao": "Mindanao",
-            "Davao Region": "Mindanao",
-            "SOCCSKSARGEN": "Mindanao",
-            "Caraga": "Mindanao",
-            "BARMM": "Mindanao",
-        }
-
-        continent = region_to_island_group.get(region, "Unknown")
+        continent = island_group(region)
 
         return {
             "monthly_sales": result,
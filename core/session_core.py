@@ -0,0 +1,100 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(30 * 60)))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+
+
+class SessionBackend:
+    """Key/value storage for chat sessions; subclass to keep them in an external store shared by workers"""
+
+    async def get(self, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Dict, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+
+class InMemorySessionBackend(SessionBackend):
+    """Per-process LRU with TTL. Values are copied in and out so callers can mutate what they get."""
+
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return copy.deepcopy(value)
+
+    async def set(self, key: str, value: Dict, ttl: float):
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(value), time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SessionStore:
+    """user_id -> conversation id and conversation id -> chat_conversations row (form_data and its version).
+
+    The version is the row's last_message_at, which every form_data write sets, so writes can be made
+    conditional on the row not having changed since it was cached.
+    """
+
+    def __init__(self, backend: Optional[SessionBackend] = None, ttl: float = SESSION_TTL):
+        self.backend = backend or InMemorySessionBackend()
+        self.ttl = ttl
+
+    def set_backend(self, backend: SessionBackend):
+        self.backend = backend
+
+    async def get_conversation_id(self, user_id: int) -> Optional[int]:
+        entry = await self.backend.get(f"user:{user_id}")
+        return entry["conversation_id"] if entry else None
+
+    async def get(self, conversation_id: int) -> Optional[Dict]:
+        return await self.backend.get(f"conversation:{conversation_id}")
+
+    async def put(self, conversation: Dict):
+        await self.backend.set(f"conversation:{conversation['id']}", conversation, self.ttl)
+        if conversation.get("user_profile_id") is not None:
+            await self.backend.set(f"user:{conversation['user_profile_id']}", {"conversation_id": conversation["id"]}, self.ttl)
+
+    async def update(self, conversation_id: int, values: Dict) -> Optional[Dict]:
+        """Apply a write to the cached row; returns the row as it was, None if not cached"""
+        conversation = await self.get(conversation_id)
+        if conversation is None:
+            return None
+
+        previous = dict(conversation)
+        conversation.update(values)
+        await self.put(conversation)
+        return previous
+
+    async def invalidate(self, conversation_id: int):
+        await self.backend.delete(f"conversation:{conversation_id}")
+
+
+session_store = SessionStore()
@@ -0,0 +1,408 @@
+import os
+import re
+from datetime import date
+from typing import Dict, List, Optional
+
+from core.date_core import find_date
+from core.intent_core import REPLY_LANGUAGES
+from core.prompt_core import prompt_registry
+
+# "on" completes a log without the LLM once every required field is known (and nothing in it calls for advice),
+# "prefill" only pre-fills form_data, "off" leaves extraction to the LLM
+SLOT_EXTRACTION_MODE = os.getenv("SLOT_EXTRACTION_MODE", "prefill").lower()
+
+# Commas and periods inside numbers ("1,200", "1.5") do not end a clause
+CLAUSE_SPLIT = re.compile(r"[;!?\n]|(?<!\d)[,.]|[,.](?!\d)|\b(?:at|and|tapos|then|ug|unya|pero|but)\b")
+TOKEN_PATTERN = re.compile(r"\d+/\d+|\d{1,3}(?:,\d{3})+(?!\d)|\d+(?:[.,]\d+)?|[^\W\d_]+(?:-[^\W\d_]+)*", re.UNICODE)
+REQUIRED_FIELD_PATTERN = re.compile(r"^\s*(\w+):")
+TICKET_PATTERN = re.compile(r"\btkt-", re.IGNORECASE)
+# A message asking something wants an answer, not just a recorded log
+QUESTION_WORDS = frozenset({"ba", "bah", "paano", "bakit", "ano", "unsa", "ngano", "unsaon", "how", "why", "what", "should"})
+
+# Date fields of plans rather than of things that happened
+PLANNED_DATE_FIELDS = frozenset({"visit_date"})
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "isa": 1, "dalawa": 2, "tatlo": 3, "apat": 4, "lima": 5, "anim": 6, "pito": 7, "walo": 8, "siyam": 9, "sampu": 10,
+    "usa": 1, "duha": 2, "tulo": 3, "upat": 4, "unom": 6, "napulo": 10,
+}
+
+# Unit words right after a number, and the fields a number with that unit can belong to
+UNITS = {
+    "kg": "kg", "kgs": "kg", "kilo": "kg", "kilos": "kg", "kilogram": "kg", "kilograms": "kg",
+    "g": "g", "grams": "g", "gram": "g", "gramo": "g",
+    "sako": "bag", "bag": "bag", "bags": "bag", "sack": "bag", "sacks": "bag",
+    "tray": "tray", "trays": "tray",
+}
+UNIT_FIELDS = {
+    "kg": ("average_weight_kg", "feed_intake_kg"),
+    "g": ("average_weight_kg", "feed_intake_kg"),
+    "bag": ("bags_used",),
+    "tray": ("eggs_per_day",),
+}
+# Numbers next to these are ages or periods, not counts
+AGE_WORDS = frozenset({"day", "days", "araw", "adlaw", "week", "weeks", "linggo", "semana", "edad", "age", "old", "gulang"})
+
+# Word prefixes that tie a number to a field
+DEATH_WORDS = ("patay", "namatay", "mamatay", "nangamatay", "died", "dead", "death", "mortal")
+FIELD_KEYWORDS = {
+    "mortality_count": DEATH_WORDS,
+    "eggs_per_day": ("itlog", "egg", "nangitlog", "nag-itlog"),
+    "feed_intake_kg": ("feed", "pakain", "kain", "kumain", "kinain", "konsumo", "consum", "intake", "naubos", "mokaon", "nikaon"),
+    "average_weight_kg": ("timbang", "tumimbang", "bigat", "weight", "weigh", "average", "avg", "ave", "gibug-aton", "kabug-at"),
+    "bags_used": ("sako", "bag", "sack"),
+    "affected_count": ("manok", "bird", "chicken", "sisiw", "chick", "ulo", "head", "apektado", "affected", "sakit", "sick",
+                       "masakiton") + DEATH_WORDS,
+}
+NUMERIC_FIELDS = {
+    "report_details": ("mortality_count", "eggs_per_day", "average_weight_kg", "feed_intake_kg", "bags_used"),
+    "incident_details": ("affected_count",),
+}
+NO_DEATHS = re.compile(r"\b(?:wala(?:ng)?|walay|no|zero|none)\b(?:\s+\w+){0,2}?\s*\b(?:patay|namatay|died|dead|deaths?|mortality)\b")
+
+FEED_STATUS_PHRASES = [
+    ("not_eating", ("ayaw kumain", "hindi kumakain", "di kumakain", "hindi kumain", "walang gana", "not eating",
+                    "refuse to eat", "dili mokaon", "ayaw mokaon")),
+    ("picky", ("mahina kumain", "mahinang kumain", "konti kumain", "kaunti kumain", "mapili", "picky", "mababa", "bumaba",
+               "low", "hinay mokaon", "gamay ra mokaon")),
+    ("eating_well", ("malakas kumain", "maganang kumain", "ganado", "eating well", "normal", "okay", "ok", "ayos", "sobra",
+                     "kusog mokaon", "high")),
+]
+HEALTH_STATUS_PHRASES = [
+    ("healthy", ("walang sakit", "walang may sakit", "no sick", "none sick", "walay masakiton")),
+    ("out_break", ("outbreak", "out break", "maraming may sakit", "marami ang may sakit", "marami may sakit", "many sick",
+                   "daghan masakiton", "daghang masakiton")),
+    ("some_sick", ("may matamlay", "may sipon", "may sakit", "may ubo", "some sick", "few sick", "matamlay", "sipon", "ubo",
+                   "masakiton", "naay masakiton")),
+    ("healthy", ("malusog", "healthy", "ok naman", "okay naman", "ayos naman", "maayos", "himsog", "okay sila", "ok sila")),
+]
+SHELL_ISSUES = {
+    "soft": ("malambot", "soft"),
+    "cracked": ("basag", "crack", "cracked", "lupok", "buak"),
+    "thin": ("manipis", "thin", "nipis"),
+}
+
+SYMPTOMS = {
+    "lethargy": ("matamlay", "tamlay", "lethargic", "nanghihina", "luya", "weak"),
+    "colds/nasal discharge": ("sipon", "sinisipon", "runny nose", "nasal discharge"),
+    "coughing": ("ubo", "inuubo", "cough", "coughing"),
+    "difficulty breathing": ("hirap huminga", "hinihingal", "gasping", "breathing", "bahin", "sneezing"),
+    "diarrhea": ("pagtatae", "nagtatae", "diarrhea", "kalibanga", "watery droppings"),
+    "bloody droppings": ("dugo sa dumi", "may dugo", "bloody", "dugo"),
+    "swelling": ("namamaga", "maga", "swollen", "swelling", "hubag"),
+    "twisted neck": ("baluktot ang leeg", "twisted neck", "pilipit ang liog"),
+    "vomiting": ("nagsusuka", "sumusuka", "vomit", "vomiting"),
+    "drop in feed intake": ("ayaw kumain", "hindi kumakain", "walang gana", "not eating", "dili mokaon"),
+}
+SEVERE_SYMPTOMS = frozenset({"bloody droppings", "vomiting", "twisted neck"})
+MODERATE_SYMPTOMS = frozenset({"drop in feed intake", "diarrhea", "coughing", "difficulty breathing", "swelling"})
+MULTIPLE_DEATHS = 5
+
+# Severity logic of prompts/ask_farmer_health_log.txt
+SEVERITY_ACTIONS = {
+    "mild": "Isolate sick birds; clean feeders/drinkers; ensure access to fresh water and feed; observe for 1-2 days",
+    "moderate": "Add vitamins/electrolytes to water; switch back to known commercial feed; clean the coop thoroughly; "
+                "restrict access to outsiders (biosecurity)",
+    "severe": "Separate all sick birds immediately; dispose of dead birds safely; disinfect all equipment; "
+              "stop questionable feed or water; prepare for vet (record symptoms, take photos)",
+}
+
+# Required fields the handler can fill in itself when the log is completed locally
+DERIVED_FIELDS = frozenset({"notes", "actions_taken", "requires_vet_visit"})
+
+LOCAL_REPLIES = {
+    "report_details": {
+        "English": "Thank you! Your performance report has been recorded: {summary}.",
+        "Tagalog": "Salamat po! Naitala na po ang inyong performance report: {summary}.",
+        "Bisaya": "Salamat! Natala na ang imong performance report: {summary}.",
+    },
+    "incident_details": {
+        "English": "Thank you. The health incident has been recorded: {summary}. Recommended actions: {actions}. "
+                   "Please consult a licensed veterinarian for proper diagnosis and treatment.",
+        "Tagalog": "Salamat po. Naitala na po ang health incident: {summary}. Mga inirerekomendang hakbang: {actions}. "
+                   "Mangyaring kumonsulta po sa lisensyadong beterinaryo para sa tamang diagnosis at gamot.",
+        "Bisaya": "Salamat. Natala na ang health incident: {summary}. Mga girekomendar nga lakang: {actions}. "
+                  "Palihug konsulta sa lisensyadong beterinaryo para sa saktong diagnosis ug tambal.",
+    },
+}
+
+
+def parse_number(token: str) -> Optional[float]:
+    if token in NUMBER_WORDS:
+        return float(NUMBER_WORDS[token])
+    # Tagalog linker: "tatlong manok", "limang sako"
+    if token.endswith("ng") and token[:-2] in NUMBER_WORDS:
+        return float(NUMBER_WORDS[token[:-2]])
+    # Fractions: "1/2 kg"
+    if re.fullmatch(r"\d+/\d+", token):
+        numerator, denominator = token.split("/")
+        return float(numerator) / float(denominator) if float(denominator) else None
+    if re.fullmatch(r"\d{1,3}(?:,\d{3})+", token):
+        return float(token.replace(",", ""))
+    if re.fullmatch(r"\d+(?:[.,]\d+)?", token):
+        return float(token.replace(",", "."))
+    return None
+
+
+def format_number(value: float) -> str:
+    return str(int(value)) if value == int(value) else f"{value:g}"
+
+
+def required_fields(prompt_file: str, form_key: str) -> List[str]:
+    """Required fields of form_key: the function schema's plus the "Required Fields:" list of the prompt"""
+    functions = prompt_registry.get_functions(f"{prompt_file}.json")
+    form_schema = functions["parameters"]["properties"].get(form_key, {})
+    fields = list(form_schema.get("required", []))
+
+    in_section = False
+    for line in prompt_registry.get_text(f"{prompt_file}.txt").splitlines():
+        if "required field" in line.lower():
+            in_section = True
+            continue
+        if in_section and ("optional" in line.lower() or line.strip().lower().startswith("step")):
+            break
+        match = REQUIRED_FIELD_PATTERN.match(line) if in_section else None
+        if match and match.group(1) in form_schema.get("properties", {}) and match.group(1) not in fields:
+            fields.append(match.group(1))
+    return fields
+
+
+def extract_date_fields(prompt: str, prompt_file: str, form_key: str, form_data: Optional[Dict] = None,
+                        today: Optional[date] = None) -> Dict:
+    """The *_date fields of form_key not collected yet, set to the date stated in the message (if any).
+
+    Planned visits are about days to come, so their dates resolve forward ("Oct 25" is the next one); a date
+    collected on an earlier turn is kept, the LLM can still correct it.
+    """
+    functions = prompt_registry.get_functions(f"{prompt_file}.json")
+    form_schema = functions["parameters"]["properties"].get(form_key, {})
+    form_data = form_data or {}
+    fields = [name for name in form_schema.get("properties", {}) if name.endswith("_date") and not form_data.get(name)]
+    if not fields:
+        return {}
+
+    extracted = {}
+    for field in fields:
+        found = find_date(prompt, today, _date_preference(field, prompt, form_data))
+        if found:
+            extracted[field] = found.formatted()
+    return extracted
+
+
+def extract_slots(prompt: str, form_key: str, form_data: Optional[Dict] = None, last_question: Optional[str] = None,
+                  today: Optional[date] = None) -> Dict:
+    """Fields of form_key stated in the message, as the strings the log schema expects"""
+    if form_key not in NUMERIC_FIELDS:
+        return {}
+
+    form_data = form_data or {}
+    # Dates are taken out first so their digits are not read as counts
+    text = prompt.lower()
+    found = find_date(text, today)
+    # A date collected on an earlier turn is kept; the text is still taken out
+    incident_date = found.formatted() if found and not form_data.get("incident_date") else None
+    if found:
+        text = text[:found.start] + " " + text[found.end:]
+    clauses = [clause.strip() for clause in CLAUSE_SPLIT.split(text) if clause and clause.strip()]
+
+    slots: Dict = {}
+    bare_numbers: List[float] = []
+    for clause in clauses:
+        tokens = TOKEN_PATTERN.findall(clause)
+        for index, token in enumerate(tokens):
+            value = parse_number(token)
+            if value is None:
+                continue
+            neighbours = tokens[max(0, index - 1):index] + tokens[index + 1:index + 2]
+            if any(word in AGE_WORDS for word in neighbours):
+                continue
+
+            unit = UNITS.get(tokens[index + 1]) if index + 1 < len(tokens) else None
+            field = _nearest_field(tokens, index, form_key, unit)
+            if field is None:
+                if unit is None:
+                    bare_numbers.append(value)
+                continue
+            slots.setdefault(field, _scale(value, unit, field))
+
+    if form_key == "report_details":
+        _extract_report_details(text, clauses, slots)
+    else:
+        _extract_incident_details(text, slots, incident_date)
+
+    # A lone number answers whatever was just asked, or the only numeric field still missing
+    if len(bare_numbers) == 1:
+        field = _asked_field(last_question, form_key) or _only_missing_numeric(form_key, {**form_data, **slots})
+        if field is not None and field not in slots:
+            slots[field] = _scale(bare_numbers[0], None, field)
+
+    return slots
+
+
+def complete_log_locally(prompt_file: str, form_key: str, form_data: Dict, language: Optional[str],
+                         prompt: str = "") -> Optional[Dict]:
+    """A log_complete function result built from form_data, or None while a required field still needs the LLM.
+
+    Questions, deaths and abnormal health or feeding always get an LLM reply, a canned confirmation gives no guidance.
+    """
+    if needs_guidance(prompt, form_data):
+        return None
+
+    fields = dict(form_data)
+    if form_key == "incident_details":
+        fields["requires_vet_visit"] = True
+        if not fields.get("actions_taken") and fields.get("symptoms"):
+            fields["actions_taken"] = SEVERITY_ACTIONS[_severity(fields)]
+
+    required = required_fields(prompt_file, form_key)
+    missing = [field for field in required if field != "notes" and fields.get(field) in (None, "")]
+    if missing:
+        return None
+
+    summary = ", ".join(
+        f"{key.replace('_', ' ').capitalize()}: {value}" for key, value in fields.items()
+        if value not in (None, "") and key not in DERIVED_FIELDS
+    )
+    if "notes" in required and not fields.get("notes"):
+        fields["notes"] = summary
+
+    functions = prompt_registry.get_functions(f"{prompt_file}.json")
+    log_type = functions["parameters"]["properties"]["log_type"]["enum"][0]
+    reply = LOCAL_REPLIES[form_key][REPLY_LANGUAGES.get(language, "English")]
+
+    return {
+        "response": reply.format(summary=summary, actions=fields.get("actions_taken", "")),
+        "log_type": log_type,
+        form_key: fields,
+        "next_action": "log_complete",
+        "intent": "None",
+    }
+
+
+def needs_guidance(prompt: str, form_data: Dict) -> bool:
+    """Whether the message asks something or the log reports a problem the farmer should get advice on"""
+    text = (prompt or "").lower()
+    if "?" in text or any(token in QUESTION_WORDS for token in TOKEN_PATTERN.findall(text)):
+        return True
+
+    deaths = parse_number(str(form_data.get("mortality_count") or "0").strip()) or 0
+    if deaths > 0 or form_data.get("incident_type") == "mortality":
+        return True
+    return (form_data.get("health_status") not in (None, "", "healthy")
+            or form_data.get("feed_intake_status") not in (None, "", "eating_well"))
+
+
+def _date_preference(field: str, prompt: str, form_data: Dict) -> str:
+    # Visits with a ticket number were planned earlier and are being logged as done (Flow 1 of ask_salesrep_farm_log)
+    completed = form_data.get("visit_type") == "completed_visit" or TICKET_PATTERN.search(prompt)
+    return "future" if field in PLANNED_DATE_FIELDS and not completed else "past"
+
+
+def _nearest_field(tokens: List[str], index: int, form_key: str, unit: Optional[str]) -> Optional[str]:
+    candidates = NUMERIC_FIELDS[form_key]
+    if unit is not None:
+        candidates = [field for field in candidates if field in UNIT_FIELDS[unit]]
+
+    best, best_distance = None, None
+    for position, token in enumerate(tokens):
+        for field in candidates:
+            if _has_prefix(token, FIELD_KEYWORDS[field]):
+                distance = abs(position - index)
+                if best_distance is None or distance < best_distance:
+                    best, best_distance = field, distance
+
+    if best is None and unit is not None and form_key == "report_details":
+        # "1.5 kg" on its own is a bird's weight, "50 kg" is feed
+        if unit in ("kg", "g"):
+            return "average_weight_kg" if unit == "g" or parse_number(tokens[index]) < 10 else "feed_intake_kg"
+        return UNIT_FIELDS[unit][0]
+    return best
+
+
+def _scale(value: float, unit: Optional[str], field: str) -> str:
+    if unit == "g" and field.endswith("_kg"):
+        value = value / 1000
+    elif unit == "tray" and field == "eggs_per_day":
+        value = value * 30
+    return format_number(value)
+
+
+def _asked_field(question: Optional[str], form_key: str) -> Optional[str]:
+    if not question:
+        return None
+    tokens = TOKEN_PATTERN.findall(question.lower())
+    for field in NUMERIC_FIELDS[form_key]:
+        if any(_has_prefix(token, FIELD_KEYWORDS[field]) for token in tokens):
+            return field
+    return None
+
+
+def _only_missing_numeric(form_key: str, known: Dict) -> Optional[str]:
+    # Feed intake and bags are optional, so only count the numeric fields the prompt asks for
+    asked = [field for field in NUMERIC_FIELDS[form_key] if field not in ("feed_intake_kg", "bags_used")]
+    missing = [field for field in asked if known.get(field) in (None, "")]
+    return missing[0] if len(missing) == 1 else None
+
+
+def _match_phrases(text: str, phrase_groups) -> Optional[str]:
+    for label, phrases in phrase_groups:
+        if any(re.search(rf"\b{re.escape(phrase)}\b", text) for phrase in phrases):
+            return label
+    return None
+
+
+def _has_prefix(token: str, prefixes) -> bool:
+    return token.startswith(prefixes)
+
+
+def _mentions(text: str, prefixes) -> bool:
+    return any(_has_prefix(token, tuple(prefixes)) for token in TOKEN_PATTERN.findall(text))
+
+
+def _extract_report_details(text: str, clauses: List[str], slots: Dict):
+    if "mortality_count" not in slots and NO_DEATHS.search(text):
+        slots["mortality_count"] = "0"
+
+    for clause in clauses:
+        # Status words like "normal" or "mababa" describe feeding only when the clause is about feed
+        if _mentions(clause, FIELD_KEYWORDS["feed_intake_kg"]):
+            status = _match_phrases(clause, FEED_STATUS_PHRASES)
+            if status and "feed_intake_status" not in slots:
+                slots["feed_intake_status"] = status
+        else:
+            status = _match_phrases(clause, HEALTH_STATUS_PHRASES)
+            if status and "health_status" not in slots:
+                slots["health_status"] = status
+
+    issues = [issue for issue, words in SHELL_ISSUES.items() if any(re.search(rf"\b{word}\b", text) for word in words)]
+    if issues and _mentions(text, ("shell", "balat", "itlog", "egg", "kabhang")):
+        slots["shell_quality_issues"] = ", ".join(issues)
+
+
+def _extract_incident_details(text: str, slots: Dict, incident_date: Optional[str]):
+    if incident_date:
+        slots["incident_date"] = incident_date
+
+    symptoms = [symptom for symptom, phrases in SYMPTOMS.items() if any(re.search(rf"\b{re.escape(phrase)}\b", text) for phrase in phrases)]
+    if symptoms:
+        slots["symptoms"] = ", ".join(symptoms)
+
+    if _mentions(text, DEATH_WORDS) and not NO_DEATHS.search(text):
+        slots["incident_type"] = "mortality"
+    elif symptoms == ["drop in feed intake"]:
+        slots["incident_type"] = "feed_rejection"
+    elif symptoms:
+        slots["incident_type"] = "sickness"
+
+
+def _severity(fields: Dict) -> str:
+    symptoms = {symptom.strip() for symptom in str(fields.get("symptoms", "")).split(",")}
+    count = parse_number(str(fields.get("affected_count") or "").strip()) or 0
+    deaths = fields.get("incident_type") == "mortality"
+
+    if symptoms & SEVERE_SYMPTOMS or (deaths and count >= MULTIPLE_DEATHS):
+        return "severe"
+    if symptoms & MODERATE_SYMPTOMS or deaths:
+        return "moderate"
+    return "mild"
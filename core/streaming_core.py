@@ -0,0 +1,77 @@
+import json
+import re
+from typing import Optional
+
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonStringFieldStreamer:
+    """Incrementally decodes one top-level string field out of streamed JSON function-call arguments"""
+
+    def __init__(self, field: str = "response"):
+        self.field_pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self.buffer = ""
+        self.position: Optional[int] = None
+        self.done = False
+        self.text = ""
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of arguments and return the newly decoded part of the field value"""
+        self.buffer += chunk
+        if self.done:
+            return ""
+
+        if self.position is None:
+            match = self.field_pattern.search(self.buffer)
+            if not match:
+                return ""
+            self.position = match.end()
+
+        decoded = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+
+            if char == '"':
+                self.done = True
+                break
+
+            if char != "\\":
+                decoded.append(char)
+                self.position += 1
+                continue
+
+            # Escape sequence, wait for more input if it is cut off
+            escape = self.__read_escape(self.position)
+            if escape is None:
+                break
+            value, length = escape
+            decoded.append(value)
+            self.position += length
+
+        new_text = "".join(decoded)
+        self.text += new_text
+        return new_text
+
+    def __read_escape(self, start: int):
+        if start + 1 >= len(self.buffer):
+            return None
+
+        kind = self.buffer[start + 1]
+        if kind != "u":
+            return ESCAPES.get(kind, kind), 2
+
+        if start + 6 > len(self.buffer):
+            return None
+        code = int(self.buffer[start + 2:start + 6], 16)
+
+        # High surrogate: decode together with the low surrogate that follows
+        if 0xD800 <= code <= 0xDBFF:
+            if start + 12 > len(self.buffer):
+                return None
+            return json.loads('"%s"' % self.buffer[start:start + 12]), 12
+
+        return chr(code), 6
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
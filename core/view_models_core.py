@@ -1,103 +1,44 @@
-from dateutil.parser import parse
+import os
+from postgrest.exceptions import APIError
 from config.config import get_supabase_client
+from core.farm_metrics_core import FarmMetrics
+from core.query_executor_core import QueryPlan
+from core.reference_data_core import reference_data
 from exceptions.global_exception import GlobalException
 
+# Fetch the dashboard rows with one call to the farmer_dashboard_rows Postgres function (sql/farmer_dashboard_rows.sql)
+DASHBOARD_RPC = os.getenv("DASHBOARD_RPC", "true").lower() in ("1", "true", "yes")
+
 
 class ViewModelsCore:
+    # Turned off for the process when the database does not have the function yet
+    dashboard_rpc = DASHBOARD_RPC
+
     def __init__(self):
         self.client = get_supabase_client()
 
     def read_farmer_dashboard_view_model(self, farmer_user_profile_id: int):
         try:
-            # Check if user profile exists
-            user_exists = self.client.table("user_profiles") \
-                .select("id") \
-                .eq("id", farmer_user_profile_id) \
-                .maybe_single() \
-                .execute()
+            rows = self.__fetch_dashboard_rows(farmer_user_profile_id)
 
-            if not user_exists.data:
+            if not rows["user_exists"]:
                 raise GlobalException(
                     f"User profile ID {farmer_user_profile_id} does not exist.", status_code=404)
 
-            # Get latest feed usage - handle empty case
-            feed_usage_response = self.client.table("feed_usage_logs").select("*") \
-                .eq("farmer_user_profile_id", farmer_user_profile_id) \
-                .order("created_at", desc=True).limit(1).execute()
-
-            feed_usage = feed_usage_response.data[0] if feed_usage_response.data else None
-            
-            # Set defaults for feed usage data
-            if feed_usage:
-                start_date = feed_usage["start_date"]
-                end_date = feed_usage.get("end_date")
-                feed_product_id = feed_usage["feed_product_id"]
-            else:
-                # Default values when no feed usage exists
-                start_date = None
-                end_date = None
-                feed_product_id = None
-
-            # Get feed product info - handle missing feed_product_id
-            feed_product = {}
-            if feed_product_id:
-                try:
-                    feed_product_response = self.client.table("feed_products").select("*") \
-                        .eq("id", feed_product_id).single().execute()
-                    feed_product = feed_product_response.data or {}
-                except Exception:
-                    # Handle case where feed product doesn't exist
-                    feed_product = {}
-
-            # Get farm performance logs - handle missing start_date
-            logs = []
-            if start_date:
-                farm_logs_query = self.client.table("farm_performance_logs").select("*") \
-                    .eq("user_profile_id", farmer_user_profile_id) \
-                    .gte("created_at", start_date)
+            # No feed usage yet means no program start date
+            start_date = (rows["feed_usage"] or {}).get("start_date")
 
-                if end_date:
-                    farm_logs_query = farm_logs_query.lte("created_at", end_date)
+            feed_product = rows["feed_product"] or {}
+            flock_size = rows["flock_size"] or 0
+            feed_calc = rows["feed_calculation_log"] or {}
+            target_weight = float(rows["target_weight_kg"]) if rows["target_weight_kg"] is not None else 0.0
 
-                farm_performance_log = farm_logs_query.order(
-                    "created_at", desc=True).execute()
-                logs = farm_performance_log.data or []
-            
-            total_logs = len(logs)
-
-            # Calculate growth rate - handle empty logs
-            growth_data = self.__calculate_growth_rate(logs)
-            growth_rate = growth_data["growth_rate"]
-            raw_gain_kg = growth_data["raw_gain_kg"]
-
-            # Get farmer ID - handle missing farmer
-            farmer_id = None
-            flock_size = 0
-            try:
-                farmer_response = self.client.table("farmers").select("id") \
-                    .eq("user_profile_id", farmer_user_profile_id) \
-                    .single().execute()
-                
-                if farmer_response.data:
-                    farmer_id = farmer_response.data["id"]
-                    
-                    # Get flock size - handle missing livestock data
-                    try:
-                        flock_size_response = self.client.table("farmer_livestock").select("quantity") \
-                            .eq("farmer_id", farmer_id).single().execute()
-                        
-                        if flock_size_response.data:
-                            flock_size = flock_size_response.data.get("quantity", 0)
-                    except Exception:
-                        flock_size = 0
-            except Exception:
-                farmer_id = None
-                flock_size = 0
+            metrics = FarmMetrics(rows["logs"], rows["incidents"])
+            latest_log = metrics.latest_log
 
             # Calculate mortality metrics - handle division by zero
-            total_mortality = sum(
-                [log["mortality_count"] for log in logs if log.get("mortality_count") is not None])
-            
+            total_mortality = metrics.log_mortality
+
             if flock_size > 0:
                 mortality_percentage = round((total_mortality / flock_size) * 100, 2)
                 survival_rate = (1 - (total_mortality / flock_size))
@@ -105,172 +46,19 @@ class ViewModelsCore:
                 mortality_percentage = 0.0
                 survival_rate = 1.0
 
-            latest_log = logs[0] if logs else {}
-
             # Performance Index calculation - handle missing data
             try:
                 average_weight = float(latest_log.get("average_weight_kg", 0.0))
-                total_weight_kg = round(
-                    sum(float(log.get("average_weight_kg", 0.0)) for log in logs), 3)
                 fcr = float(latest_log.get("feed_conversion_ratio", 1.0))
-                
+
                 if fcr > 0:
                     performance_index = round(
                         ((average_weight * survival_rate) / fcr) * 100, 2)
                 else:
                     performance_index = 0.0
             except Exception:
-                average_weight = 0.0
-                total_weight_kg = 0.0
                 performance_index = 0.0
 
-            actual_weight = float(latest_log.get("average_weight_kg", 0.0)) if latest_log else 0.0
-
-            # Get target weight - handle missing target data
-            target_weight = 0.0
-            if feed_product_id:
-                try:
-                    target_weight_response = self.client.table("feed_growth_targets").select("target_weight_kg") \
-                        .eq("feed_product_id", feed_product_id).limit(1).single().execute()
-                    
-                    if target_weight_response.data:
-                        target_weight = float(target_weight_response.data["target_weight_kg"])
-                except Exception:
-                    target_weight = 0.0
-
-            # Build growth chart data - handle missing start_date
-            growth_chart_data = []
-            if start_date and logs:
-                latest_per_day = {}
-                for log in logs:
-                    date_str = parse(log["created_at"]).date().isoformat()
-                    latest_per_day[date_str] = log
-
-                growth_chart_data = [
-                    {
-                        "date": date,
-                        "actual_weight": float(log.get("average_weight_kg", 0.0)),
-                        "target_weight": target_weight
-                    }
-                    for date, log in sorted(latest_per_day.items())
-                ]
-
-            # Build recent records - handle missing start_date
-            recent_records = []
-            if start_date and logs:
-                for log in logs:
-                    log_date = parse(log["created_at"]).date()
-                    day_number = (log_date - parse(start_date).date()).days + 1
-                    recent_records.append({
-                        "date": log_date.isoformat(),
-                        "day": f"Day {day_number}",
-                        "actual_weight": float(log.get("average_weight_kg", 0.0)),
-                        "note": log.get("notes", "")
-                    })
-
-            # Feed intake analysis
-            feed_intake_summary = {
-                "eating_well": 0,
-                "picky": 0,
-                "not_eating": 0
-            }
-            total_feed_behavior_logs = 0
-            behavior_score = 0.0
-
-            recent_feed_records = []
-            for log in logs:
-                behavior = log.get("feed_intake_status")
-                if behavior in feed_intake_summary:
-                    feed_intake_summary[behavior] += 1
-                    total_feed_behavior_logs += 1
-
-                log_date = parse(log["created_at"])
-                recent_feed_records.append({
-                    "date": log_date.isoformat(),
-                    "feed_intake_status": behavior,
-                    "feed_intake_kg": log.get("feed_intake_kg")
-                })
-
-            score_weights = {
-                "eating_well": 1.0,
-                "picky": 0.5,
-                "not_eating": 0.0
-            }
-
-            if total_feed_behavior_logs > 0:
-                weighted_score = sum(
-                    feed_intake_summary[k] * score_weights[k] for k in feed_intake_summary)
-                behavior_score = round(
-                    (weighted_score / total_feed_behavior_logs) * 100, 2)
-
-            dominant_status = max(
-                feed_intake_summary, key=feed_intake_summary.get) if total_feed_behavior_logs else "no_data"
-
-            # Feed calculation log - handle missing data
-            feed_calc = {}
-            if farmer_user_profile_id:
-                try:
-                    calc_resp = (
-                        self.client
-                        .table("feed_calculation_logs")
-                        .select("*")
-                        .eq("user_profile_id", farmer_user_profile_id)
-                        .order("created_at", desc=True)
-                        .limit(1)
-                        .single()
-                        .execute()
-                    )
-                    feed_calc = calc_resp.data or {}
-                except Exception:
-                    feed_calc = {}
-
-            # Health incidents - handle empty response
-            try:
-                incident_response = (
-                    self.client.table("health_incidents")
-                    .select("*")
-                    .eq("farmer_user_profile_id", farmer_user_profile_id)
-                    .order("incident_date", desc=True)
-                    .execute()
-                )
-                incidents = incident_response.data or []
-            except Exception:
-                incidents = []
-
-            sick_count = 0
-            mortality_count = 0
-            notes_count = 0
-            health_score = 100
-
-            recent_issues = []
-            for incident in incidents:
-                kind = incident.get("incident_type")
-                affected = incident.get("affected_count", 0)
-                has_note = bool(incident.get("symptoms") or incident.get("suspected_cause"))
-
-                if kind == "sickness":
-                    sick_count += affected
-                    health_score -= affected * 2
-                elif kind == "mortality":
-                    mortality_count += affected
-                    health_score -= affected * 4
-                if has_note:
-                    notes_count += 1
-                    health_score -= 1
-
-                recent_issues.append({
-                    "date": incident.get("incident_date"),
-                    "incident_type": kind,
-                    "affected_count": affected,
-                    "symptoms": incident.get("symptoms"),
-                    "suspected_cause": incident.get("suspected_cause"),
-                    "requires_vet_visit": incident.get("requires_vet_visit"),
-                    "feed_info": incident.get("feed_info"),
-                    "actions_taken": incident.get("actions_taken"),
-                })
-
-            health_score = max(0, min(health_score, 100))
-
             # Final response - always return data even if some parts are missing
             return {
                 "used_feed": {
@@ -283,36 +71,23 @@ class ViewModelsCore:
                     "start_date": start_date,
                 },
                 "growth_performance": {
-                    "daily_average_growth_rate": growth_rate,
-                    "current_fcr": float(logs[0].get("feed_conversion_ratio", 0.0)) if logs else 0.0,
-                    "actual_weight": actual_weight,
+                    "daily_average_growth_rate": metrics.growth_rate()["growth_rate"],
+                    "current_fcr": float(latest_log.get("feed_conversion_ratio", 0.0)) if latest_log else 0.0,
+                    "actual_weight": float(latest_log.get("average_weight_kg", 0.0)) if latest_log else 0.0,
                     "target_weight": target_weight,
-                    "growth_chart_data": growth_chart_data,
+                    "growth_chart_data": metrics.growth_chart(target_weight) if start_date else [],
                     "performance_analytics": {
-                        "total_logs": total_logs,
-                        "total_weight_kg": total_weight_kg,
+                        "total_logs": len(metrics.logs),
+                        "total_weight_kg": metrics.total_weight_kg,
                         "mortality_count": total_mortality,
                         "mortality_percentage": mortality_percentage,
                         "performance_index": performance_index,
-                        "recent_records": recent_records,
+                        "recent_records": metrics.recent_records(start_date) if start_date else [],
                     }
                 },
                 "feed_calculation_log": feed_calc,
-                "feed_intake_behavior": {
-                    "behavior_score": behavior_score,
-                    "behavior_status": dominant_status,
-                    "summary": feed_intake_summary,
-                    "recent_feed_records": recent_feed_records,
-                },
-                "health_watch": {
-                    "health_score": health_score,
-                    "issue_summary": {
-                        "sick": sick_count,
-                        "mortality": mortality_count,
-                        "notes": notes_count
-                    },
-                    "recent_issues": recent_issues
-                },
+                "feed_intake_behavior": metrics.feed_intake_behavior(),
+                "health_watch": metrics.health_watch(),
             }
 
         except GlobalException:
@@ -321,36 +96,135 @@ class ViewModelsCore:
             raise GlobalException(
                 f"Internal Server Error: {e}", status_code=500)
 
-    def __calculate_growth_rate(self, logs: list) -> dict:
-        if len(logs) < 2:
-            return {
-                "growth_rate": 0.0,
-                "raw_gain_kg": 0.0
-            }
+    def __fetch_dashboard_rows(self, farmer_user_profile_id: int) -> dict:
+        if ViewModelsCore.dashboard_rpc:
+            try:
+                response = self.client.rpc(
+                    "farmer_dashboard_rows", {"p_user_profile_id": farmer_user_profile_id}).execute()
+                return response.data
+            except APIError as e:
+                # PGRST202: the function is not in the schema cache
+                if e.code != "PGRST202":
+                    raise
+                print("farmer_dashboard_rows is not installed, using table queries for the dashboard")
+                ViewModelsCore.dashboard_rpc = False
+
+        return self.__query_dashboard_rows(farmer_user_profile_id)
+
+    def __query_dashboard_rows(self, farmer_user_profile_id: int) -> dict:
+        """Same rows as farmer_dashboard_rows, from two rounds of concurrent table queries"""
+
+        # Check if user profile exists
+        def user_exists(_):
+            response = self.client.table("user_profiles") \
+                .select("id") \
+                .eq("id", farmer_user_profile_id) \
+                .limit(1) \
+                .execute()
+            return bool(response.data)
 
-        first_log = logs[-1]
-        last_log = logs[0]
+        # Get latest feed usage - handle empty case
+        def feed_usage(_):
+            response = self.client.table("feed_usage_logs").select("*") \
+                .eq("farmer_user_profile_id", farmer_user_profile_id) \
+                .order("created_at", desc=True).limit(1).execute()
+            return response.data[0] if response.data else None
 
-        try:
-            weight_start = float(first_log.get("average_weight_kg", 0.0))
-            weight_end = float(last_log.get("average_weight_kg", 0.0))
-            date_start = parse(first_log["created_at"])
-            date_end = parse(last_log["created_at"])
+        # Get feed product info - handle missing feed_product_id
+        def feed_product(results):
+            feed_product_id = (results["feed_usage"] or {}).get("feed_product_id")
+            if not feed_product_id:
+                return None
+            try:
+                return reference_data.feed_product(feed_product_id)
+            except Exception:
+                # Handle case where feed product doesn't exist
+                return None
 
-            days = (date_end - date_start).days
-            if days <= 0:
-                return {
-                    "growth_rate": 0.0,
-                    "raw_gain_kg": 0.0
-                }
+        # Get farm performance logs - handle missing start_date
+        def logs(results):
+            usage = results["feed_usage"] or {}
+            if not usage.get("start_date"):
+                return []
 
-            return {
-                "growth_rate": round((weight_end - weight_start) / days, 3),
-                "raw_gain_kg": round((weight_end - weight_start), 3)
-            }
-        except Exception as e:
-            print(f"Error calculating growth rate: {e}")
-            return {
-                "growth_rate": 0.0,
-                "raw_gain_kg": 0.0
-            }
\ No newline at end of file
+            farm_logs_query = self.client.table("farm_performance_logs").select("*") \
+                .eq("user_profile_id", farmer_user_profile_id) \
+                .gte("created_at", usage["start_date"])
+
+            if usage.get("end_date"):
+                farm_logs_query = farm_logs_query.lte("created_at", usage["end_date"])
+
+            return farm_logs_query.order("created_at", desc=True).execute().data or []
+
+        # Get farmer ID - handle missing farmer
+        def farmer_id(_):
+            try:
+                response = self.client.table("farmers").select("id") \
+                    .eq("user_profile_id", farmer_user_profile_id) \
+                    .single().execute()
+                return response.data["id"] if response.data else None
+            except Exception:
+                return None
+
+        # Get flock size - handle missing livestock data
+        def flock_size(results):
+            if results["farmer_id"] is None:
+                return None
+            try:
+                response = self.client.table("farmer_livestock").select("quantity") \
+                    .eq("farmer_id", results["farmer_id"]).single().execute()
+                return response.data.get("quantity", 0) if response.data else None
+            except Exception:
+                return None
+
+        # Get target weight - handle missing target data
+        def target_weight_kg(results):
+            feed_product_id = (results["feed_usage"] or {}).get("feed_product_id")
+            if not feed_product_id:
+                return None
+            try:
+                return reference_data.target_weight_kg(feed_product_id)
+            except Exception:
+                return None
+
+        # Feed calculation log - handle missing data
+        def feed_calculation_log(_):
+            try:
+                return (
+                    self.client
+                    .table("feed_calculation_logs")
+                    .select("*")
+                    .eq("user_profile_id", farmer_user_profile_id)
+                    .order("created_at", desc=True)
+                    .limit(1)
+                    .single()
+                    .execute()
+                ).data
+            except Exception:
+                return None
+
+        # Health incidents - handle empty response
+        def incidents(_):
+            try:
+                return (
+                    self.client.table("health_incidents")
+                    .select("*")
+                    .eq("farmer_user_profile_id", farmer_user_profile_id)
+                    .order("incident_date", desc=True)
+                    .execute()
+                ).data or []
+            except Exception:
+                return []
+
+        # Nine queries, but only two round-trips deep
+        return QueryPlan() \
+            .add("user_exists", user_exists) \
+            .add("feed_usage", feed_usage) \
+            .add("feed_product", feed_product, depends_on=["feed_usage"]) \
+            .add("logs", logs, depends_on=["feed_usage"]) \
+            .add("farmer_id", farmer_id) \
+            .add("flock_size", flock_size, depends_on=["farmer_id"]) \
+            .add("target_weight_kg", target_weight_kg, depends_on=["feed_usage"]) \
+            .add("feed_calculation_log", feed_calculation_log) \
+            .add("incidents", incidents) \
+            .run()
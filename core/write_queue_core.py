@@ -0,0 +1,207 @@
+import asyncio
+import inspect
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from config.config import get_async_supabase_client
+from core.identity_map_core import defer_write, deferred_writes_landed
+from core.metrics_core import metrics
+
+# "sync" writes inline before the request returns. "async" writes from a background worker and is only safe on a
+# long-running server: serverless (Vercel) may freeze or kill the process right after the response
+WRITE_BEHIND_MODE = os.getenv("WRITE_BEHIND_MODE", "sync").lower()
+WRITE_QUEUE_MAX_SIZE = int(os.getenv("WRITE_QUEUE_MAX_SIZE", "1000"))
+WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "100"))
+WRITE_QUEUE_MAX_RETRIES = int(os.getenv("WRITE_QUEUE_MAX_RETRIES", "3"))
+WRITE_QUEUE_RETRY_BASE = float(os.getenv("WRITE_QUEUE_RETRY_BASE", "0.2"))
+# Writes that still fail after the retries go here (sql/write_queue_dead_letters.sql)
+WRITE_QUEUE_DEAD_LETTER_TABLE = os.getenv("WRITE_QUEUE_DEAD_LETTER_TABLE", "write_queue_dead_letters")
+
+
+@dataclass
+class WriteOp:
+    kind: str  # "insert" or "update"
+    table: str
+    values: Dict
+    match: Dict = field(default_factory=dict)
+    on_done: Optional[Callable] = None
+    key: Optional[Hashable] = None
+
+
+class WriteBehindQueue:
+    """Bounded queue of Supabase writes flushed by one background worker.
+
+    Whatever is queued while a batch is being written goes out in the next batch: inserts into the same table
+    become one multi-row insert and updates to the same row are merged. Readers that need their own writes
+    call flush(key) first, which only waits for the writes submitted with that key.
+    """
+
+    def __init__(self, max_size: int = WRITE_QUEUE_MAX_SIZE, batch_size: int = WRITE_QUEUE_BATCH_SIZE,
+                 max_retries: int = WRITE_QUEUE_MAX_RETRIES, retry_base: float = WRITE_QUEUE_RETRY_BASE,
+                 mode: str = WRITE_BEHIND_MODE):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.mode = mode
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Dict[Hashable, int] = {}
+        self._drained: Dict[Hashable, asyncio.Event] = {}
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self):
+        if self.mode != "async" or self.running:
+            return
+        self._queue = asyncio.Queue(self.max_size)
+        self._worker = asyncio.create_task(self.__run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        await self.flush()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def insert(self, table: str, values: Dict, on_done: Optional[Callable] = None, key: Optional[Hashable] = None):
+        await self.__submit(WriteOp("insert", table, values, on_done=on_done, key=key))
+
+    async def update(self, table: str, values: Dict, match: Dict, on_done: Optional[Callable] = None, key: Optional[Hashable] = None):
+        await self.__submit(WriteOp("update", table, values, match, on_done, key))
+
+    async def flush(self, key: Optional[Hashable] = None):
+        """Wait until the writes queued so far (only those submitted with key, if given) are written"""
+        if not self.running:
+            return
+        if key is None:
+            await self._queue.join()
+        elif key in self._drained:
+            await self._drained[key].wait()
+        # The worker writes outside the request, so reads the caller made in between may be stale now
+        deferred_writes_landed()
+
+    def size(self) -> int:
+        return self._queue.qsize() if self.running else 0
+
+    async def __submit(self, op: WriteOp):
+        defer_write(op.table)
+        if not self.running:
+            await self.__execute([op])
+            return
+        if op.key is not None:
+            self._pending[op.key] = self._pending.get(op.key, 0) + 1
+            self._drained.setdefault(op.key, asyncio.Event()).clear()
+        # Blocks the caller only when the queue is full
+        await self._queue.put(op)
+
+    async def __run(self):
+        while True:
+            ops = [await self._queue.get()]
+            while len(ops) < self.batch_size:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            try:
+                await self.__execute(ops)
+            except Exception as e:
+                print(f"Write-behind batch failed: {e}")
+            finally:
+                for op in ops:
+                    self.__release(op.key)
+                    self._queue.task_done()
+
+    def __release(self, key: Optional[Hashable]):
+        if key is None:
+            return
+        self._pending[key] -= 1
+        if not self._pending[key]:
+            del self._pending[key]
+            self._drained.pop(key).set()
+
+    async def __execute(self, ops: List[WriteOp]):
+        client = await get_async_supabase_client()
+
+        # Inserts grouped per table and column set (PostgREST needs uniform rows). Updates are merged per row
+        # and column set, so a failing write of one set of columns never takes an unrelated one down with it
+        inserts: Dict[Tuple[str, Tuple[str, ...]], List[WriteOp]] = {}
+        updates: Dict[Tuple[str, Tuple, Tuple[str, ...]], List[WriteOp]] = {}
+        for op in ops:
+            if op.kind == "insert":
+                inserts.setdefault((op.table, tuple(sorted(op.values))), []).append(op)
+            else:
+                updates.setdefault((op.table, tuple(sorted(op.match.items())), tuple(sorted(op.values))), []).append(op)
+
+        for (table, _), group in inserts.items():
+            rows = await self.__with_retry(
+                client, group, f"insert into {table}", lambda: client.table(table).insert([op.values for op in group]).execute())
+            await self.__done(group, rows)
+
+        for (table, match, _), group in updates.items():
+            values = {}
+            for op in group:
+                values.update(op.values)
+
+            def update_query(table=table, match=match, values=values):
+                query = client.table(table).update(values)
+                for column, value in match:
+                    query = query.eq(column, value)
+                return query.execute()
+
+            rows = await self.__with_retry(client, group, f"update of {table}", update_query)
+            await self.__done(group, rows)
+
+    async def __with_retry(self, client, group: List[WriteOp], label: str, run) -> Optional[List[Dict]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await run()
+                return response.data or []
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(group)
+                    metrics.inc("write_queue_failed_writes_total", {"table": group[0].table}, len(group))
+                    print(f"Write-behind {label} failed after {attempt + 1} attempts: {e}")
+                    await self.__dead_letter(client, group, e)
+                    return None
+                # Exponential backoff with full jitter
+                await asyncio.sleep(random.uniform(0, self.retry_base * (2 ** attempt)))
+
+    async def __dead_letter(self, client, group: List[WriteOp], error: Exception):
+        """Keep writes that failed for good, so they can be replayed; logged in full if even that fails"""
+        rows = [
+            {"kind": op.kind, "table_name": op.table, "payload": op.values, "match": op.match or None, "error": str(error)}
+            for op in group
+        ]
+        try:
+            await client.table(WRITE_QUEUE_DEAD_LETTER_TABLE).insert(rows).execute()
+        except Exception as e:
+            print(f"Write-behind dead letter failed ({e}), lost writes: {json.dumps(rows, default=str)}")
+
+    async def __done(self, group: List[WriteOp], rows: Optional[List[Dict]]):
+        if rows is None:
+            return
+        for index, op in enumerate(group):
+            if op.on_done is None:
+                continue
+            row = rows[index] if op.kind == "insert" and index < len(rows) else (rows[0] if rows else None)
+            try:
+                result = op.on_done(row)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"Write-behind callback failed: {e}")
+
+
+write_queue = WriteBehindQueue()
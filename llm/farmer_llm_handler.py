@@ -1,20 +1,23 @@
+import asyncio
+
 from core.chat_core import Chat
+from core.history_core import get_history_budget
 from core.farmer_core import Farmer
 from core.helper_core import load_prompt, call_openai, extract_json, store_message_faq, get_max_messages, handle_log, handle_intent, load_functions
 
 max = get_max_messages()
 
 
-def handle_general_questions(chat_id, user_id, prompt):
+async def handle_general_questions(chat_id, user_id, prompt):
   chat = Chat()
   farmer = Farmer()
 
   system_instruction = load_prompt("prompts/ask_farmer_general_questions.txt")
   functions = load_functions("prompts/ask_farmer_general_questions.json")
-  days_on_feed, current_feed = farmer.get_feed_use(user_id)
+  days_on_feed, current_feed = await asyncio.to_thread(farmer.get_feed_use, user_id)
 
   
-  history = chat.get_recent_messages(chat_id, max_messages=max)
+  history = await chat.get_recent_messages(chat_id, max_messages=max, token_budget=get_history_budget("general"))
   history.append({
     "role": "user",
     "content": f"{prompt}\n\nDays on feed: {days_on_feed}\nCurrent feed: {current_feed}"
@@ -23,13 +26,13 @@ def handle_general_questions(chat_id, user_id, prompt):
   messages = [{"role": "system", "content": system_instruction}] + history
 
 #   response_text = call_openai(messages)
-  parsed = call_openai(messages, functions, "feed_advisory")
+  parsed = await call_openai(messages, functions, "feed_advisory")
 
-  store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"])
+  await store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"])
   return parsed
 
-def handle_health_log(chat_id, user_id, prompt):
-  return handle_log(
+async def handle_health_log(chat_id, user_id, prompt):
+  return await handle_log(
     chat_id, 
     user_id, 
     prompt, 
@@ -40,8 +43,8 @@ def handle_health_log(chat_id, user_id, prompt):
         user_id, form_data
     ))
 
-def handle_general_log(chat_id, user_id, prompt):
-  return handle_log(
+async def handle_general_log(chat_id, user_id, prompt):
+  return await handle_log(
     chat_id, 
     user_id, 
     prompt, 
@@ -53,8 +56,8 @@ def handle_general_log(chat_id, user_id, prompt):
     )
   )
 
-def handle_local_practice_log(chat_id, user_id, prompt):
-  return handle_log(
+async def handle_local_practice_log(chat_id, user_id, prompt, detected_language=None):
+  return await handle_log(
     chat_id, 
     user_id, 
     prompt, 
@@ -63,10 +66,11 @@ def handle_local_practice_log(chat_id, user_id, prompt):
     "log_diy_practice",
     lambda farmer, user_id, form_data, parsed: farmer.create_health_incident(
         user_id, form_data
-    ))
+    ),
+    detected_language)
     
 
-def handle_requested_file(response):
+async def handle_requested_file(response):
 
     # Sample response
     # {
@@ -95,7 +99,7 @@ def handle_requested_file(response):
         }
     }
 
-def handle_support_forms(response):
+async def handle_support_forms(response):
 
     # Sample response
     # {
@@ -123,5 +127,5 @@ def handle_support_forms(response):
         }
     }
 
-def get_intent(prompt, prompt_file, function_name):
-    return handle_intent(prompt, prompt_file, function_name)
\ No newline at end of file
+async def get_intent(prompt, prompt_file, function_name):
+    return await handle_intent(prompt, prompt_file, function_name)
\ No newline at end of file
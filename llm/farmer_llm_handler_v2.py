@@ -1,80 +1,105 @@
+from core.answer_cache_core import answer_cache
 from core.chat_core import Chat
+from core.history_core import get_history_budget
 from core.company_core import Company
 from core.farmer_core_v2 import FarmerV2, create_health_incident_with_program, create_performance_log_with_program
-from core.helper_core_v2 import call_openai, get_feed_program_context, get_max_messages, handle_intent, handle_log, load_functions, load_prompt, store_message_faq, detect_language
+from core.helper_core_v2 import REQUIRED, build_messages, call_openai, classify_intent, format_feed_program_context, format_similar_answers, gather_stages, get_active_feed_product_or_none, get_max_messages, handle_log, load_functions, load_prompt, stage_result, store_message_faq, detect_language
+from core.language_core import detect_language_locally
 
 
 max = get_max_messages()
 
 # intent 1 ito
-def handle_general_questions(chat_id, user_id, prompt):
+async def handle_general_questions(chat_id, user_id, prompt, detected_language=None, on_delta=None):
     chat = Chat()
     farmer = FarmerV2()
     company = Company()
     
+    # Fetch company, feed program context, history and language concurrently
+    stages = {
+        "user_company_id": (company.get_user_company_async(user_id), REQUIRED),
+        "feed_product": (get_active_feed_product_or_none(farmer, user_id), None),
+        "history": (chat.get_recent_messages(chat_id, max_messages=max, token_budget=get_history_budget("general")), []),
+    }
+    if not detected_language:
+        stages["detected_language"] = (detect_language(prompt), detect_language_locally(prompt)[0] or "English")
+    context = await gather_stages(stages)
+
     # Get user company ID
-    user_company_id = company.get_user_company(user_id)
+    user_company_id = stage_result(context, "user_company_id")
+    detected_language = detected_language or context["detected_language"]
+
+    # The same question in the same company, language and feed stage reuses the earlier answer; follow-ups
+    # (turns with history) depend on the earlier turns, so they always go to the LLM
+    feed_product = context["feed_product"]
+    use_cache = not context["history"]
+    cache_scope = answer_cache.scope(user_company_id, detected_language, feed_product,
+                                     "prompts/ask_farmer_general_questions.txt", "prompts/ask_farmer_general_questions.json")
+    cached = answer_cache.get(cache_scope, prompt) if use_cache else None
+    if cached is not None:
+        await chat.enqueue_message(chat_id, "user", prompt, {"user_language": detected_language, "intent_id": 1})
+        await chat.enqueue_message(chat_id, "model", cached["response"], {"user_language": detected_language, "intent_id": 1, "cached": True})
+        return cached
 
     system_instruction = load_prompt("prompts/ask_farmer_general_questions.txt")
     functions = load_functions("prompts/ask_farmer_general_questions.json")
 
     # Get active feed program context
-    feed_program_context = get_feed_program_context(farmer, user_id)
+    feed_program_context = format_feed_program_context(feed_product)
     
-    history = chat.get_recent_messages(chat_id, max_messages=max)
-    history.append({
-        "role": "user",
-        "content": f"{prompt}\n\n{feed_program_context}"
-    })
-    detected_language = detect_language(prompt)
-
-    history.append({
-        "role": "system", 
-        "content": f" Ignore all previous instructions about language matching. Always answer in {detected_language}.\n" + system_instruction
-    })
-
-    messages = history
+    similar_answers = format_similar_answers(user_company_id, prompt, functions)
+    user_content = "\n\n".join(part for part in (prompt, feed_program_context, similar_answers) if part)
 
+    messages = build_messages(system_instruction, context["history"], user_content, detected_language)
 
-    parsed = call_openai(messages, functions, "feed_advisory")
+    parsed = await call_openai(messages, functions, "feed_advisory", on_delta)
+    if use_cache:
+        answer_cache.put(cache_scope, prompt, parsed)
 
-    store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"], user_company_id)
+    await store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"], user_company_id,
+                      metadata={"user_language": detected_language, "intent_id": 1})
     return parsed
 
 # intent 2 ito
-def handle_health_log(chat_id, user_id, prompt):
-    return handle_log(
+async def handle_health_log(chat_id, user_id, prompt, detected_language=None, on_delta=None):
+    return await handle_log(
         chat_id, 
         user_id, 
         prompt, 
         "prompts/ask_farmer_health_log", 
         "incident_details",
         "log_health_incident",
-        create_health_incident_with_program)
+        create_health_incident_with_program,
+        detected_language,
+        on_delta)
 
 # intent 3 ito
-def handle_performance_log(chat_id, user_id, prompt):
-    return handle_log(
+async def handle_performance_log(chat_id, user_id, prompt, detected_language=None, on_delta=None):
+    return await handle_log(
         chat_id, 
         user_id, 
         prompt, 
         "prompts/ask_farmer_log",
         "report_details",
         "log_performance_report",
-        create_performance_log_with_program)
+        create_performance_log_with_program,
+        detected_language,
+        on_delta)
     
 # intent 4 ito
-def handle_local_practice_log(chat_id, user_id, prompt):
-    return handle_log(
+async def handle_local_practice_log(chat_id, user_id, prompt, detected_language=None, on_delta=None):
+    return await handle_log(
         chat_id, 
         user_id, 
         prompt, 
         "prompts/ask_farmer_diy_log", 
         "",
         "log_diy_practice",
-        create_health_incident_with_program)
+        create_health_incident_with_program,
+        detected_language,
+        on_delta)
     
 
     
-def get_intent(prompt, prompt_file, function_name):
-    return handle_intent(prompt, prompt_file, function_name)
\ No newline at end of file
+async def get_intent(prompt, prompt_file, function_name, classify_language=False):
+    return await classify_intent(prompt, prompt_file, function_name, classify_language)
\ No newline at end of file
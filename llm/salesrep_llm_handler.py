@@ -1,41 +1,57 @@
 
 
-from core.helper_core import load_prompt, call_openai, extract_json, store_message_faq, get_max_messages, handle_log_sales, handle_intent, load_functions
-from core.helper_core_v2 import detect_language
+from core.helper_core import load_prompt, call_openai, extract_json, store_message_faq, get_max_messages, handle_log_sales, load_functions
+from core.helper_core_v2 import REQUIRED, SALES_LANGUAGE_INSTRUCTION, build_messages, classify_intent, detect_language, format_similar_answers, gather_stages, stage_result
+from core.answer_cache_core import answer_cache
 from core.chat_core import Chat
+from core.history_core import get_history_budget
+from core.company_core import Company
+from core.language_core import detect_language_locally
 
 max = get_max_messages()
 
-def handle_general_questions(chat_id, prompt):
+async def handle_general_questions(chat_id, user_id, prompt, detected_language=None):
   
   chat = Chat()
+  company = Company()
+
+  stages = {
+    "user_company_id": (company.get_user_company_async(user_id), REQUIRED),
+    "history": (chat.get_recent_messages(chat_id, max_messages=max, token_budget=get_history_budget("general")), []),
+  }
+  if not detected_language:
+    stages["detected_language"] = (detect_language(prompt), detect_language_locally(prompt)[0] or "English")
+  context = await gather_stages(stages)
+
+  detected_language = detected_language or context["detected_language"]
+
+  # Sales reps of one company ask the same product questions over and over; follow-ups depend on the history
+  use_cache = not context["history"]
+  user_company_id = stage_result(context, "user_company_id")
+  cache_scope = answer_cache.scope(user_company_id, detected_language, None,
+                                   "prompts/ask_sales_rep_general_questions.txt", "prompts/ask_sales_rep_general_questions.json")
+  cached = answer_cache.get(cache_scope, prompt) if use_cache else None
+  if cached is not None:
+    return cached
 
   system_instruction = load_prompt("prompts/ask_sales_rep_general_questions.txt")
   functions = load_functions("prompts/ask_sales_rep_general_questions.json")
   
-  history = chat.get_recent_messages(chat_id, max_messages=max)
-  history.append({
-    "role": "user",
-    "content": prompt
-  })
-  
-  detected_language = detect_language(prompt)
-
-  history.append({
-      "role": "system", 
-      "content": f" Strictly follow this language: {detected_language} when responding." + system_instruction 
-  })
+  similar_answers = format_similar_answers(user_company_id, prompt, functions)
+  user_content = f"{prompt}\n\n{similar_answers}" if similar_answers else prompt
 
-  messages = history
+  messages = build_messages(system_instruction, context["history"], user_content, detected_language, SALES_LANGUAGE_INSTRUCTION)
 
-  parsed = call_openai(messages, functions, "feed_advisory")
+  parsed = await call_openai(messages, functions, "feed_advisory")
+  if use_cache:
+    answer_cache.put(cache_scope, prompt, parsed)
 
   # store_message_faq(chat_id, prompt, parsed["response"], parsed["log_type"])
   return parsed
 
   
-def handle_field_product_log(chat_id, user_id, prompt):
-  return handle_log_sales(
+async def handle_field_product_log(chat_id, user_id, prompt, detected_language=None):
+  return await handle_log_sales(
     chat_id,
     user_id,
     prompt,
@@ -44,10 +60,11 @@ def handle_field_product_log(chat_id, user_id, prompt):
     "log_feed_issue",
     lambda salesrep, user_id, form_data, parsed: salesrep.create_field_product_incident(
       user_id, form_data, parsed["tag"]
-    )
+    ),
+    detected_language
   )
-def handle_dealer_log(chat_id, user_id, prompt):
-  return handle_log_sales(
+async def handle_dealer_log(chat_id, user_id, prompt, detected_language=None):
+  return await handle_log_sales(
     chat_id,
     user_id,
     prompt,
@@ -56,11 +73,12 @@ def handle_dealer_log(chat_id, user_id, prompt):
     "log_dealer_issue",
     lambda salesrep, user_id, form_data, parsed: salesrep.create_dealer_incident(
       user_id, form_data, parsed["tag"]
-    )
+    ),
+    detected_language
   )
 
-def handle_sales_log(chat_id, user_id, prompt):
-  return handle_log_sales(
+async def handle_sales_log(chat_id, user_id, prompt, detected_language=None):
+  return await handle_log_sales(
     chat_id,
     user_id,
     prompt,
@@ -69,10 +87,11 @@ def handle_sales_log(chat_id, user_id, prompt):
     "log_sales_activity",
     lambda salesrep, user_id, form_data, parsed: salesrep.create_sales_report(
       user_id, form_data
-    )
+    ),
+    detected_language
   )
 
-def handle_farm_log(chat_id, user_id, prompt):
+async def handle_farm_log(chat_id, user_id, prompt, detected_language=None):
   def on_farm_complete(salesrep, user_id, form_data, parsed):
     visit_details = parsed["visit_details"]    
     visit_type = visit_details["visit_type"]
@@ -89,16 +108,17 @@ def handle_farm_log(chat_id, user_id, prompt):
         salesrep.update_visit_report(ticket_number, user_id, form_data)
         parsed["visit_details"]["ticket_number"] = ticket_number
 
-  return handle_log_sales(
+  return await handle_log_sales(
       chat_id,
       user_id,
       prompt,
       "prompts/ask_salesrep_farm_log",
       "visit_details",
       "log_farm_visit",
-      on_farm_complete
+      on_farm_complete,
+      detected_language
   )
-def handle_requested_file(response):
+async def handle_requested_file(response):
   
   # Sample response
   # {
@@ -127,7 +147,7 @@ def handle_requested_file(response):
       }
   }
 
-def handle_support_forms(response):
+async def handle_support_forms(response):
 
   # Sample response
   # {
@@ -156,6 +176,6 @@ def handle_support_forms(response):
       }
   }
 
-def get_intent(prompt, prompt_file, function_name):
-  return handle_intent(prompt, prompt_file, function_name)
+async def get_intent(prompt, prompt_file, function_name, classify_language=False):
+  return await classify_intent(prompt, prompt_file, function_name, classify_language)
 
@@ -1,6 +1,16 @@
+import time
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from config.config import close_clients, get_supabase_client, init_clients
+from core.faq_index_core import faq_index
+from core.identity_map_core import identity_map_scope
+from core.intent_core import get_intent_classifier
+from core.language_core import language_detector
+from core.metrics_core import metrics, request_timings
+from core.prompt_core import prompt_registry
+from core.reference_data_core import reference_data
+from core.write_queue_core import write_queue
 from exceptions.global_exception import GlobalException
 from services import farmer_services, farmer_services_v2, salesrep_services, view_models_services, admin_services
 
@@ -11,6 +21,46 @@ app = FastAPI(
 )
 
 
+@app.on_event("startup")
+async def startup():
+    await init_clients()
+    await write_queue.start()
+    prompt_registry.load_all()
+
+    try:
+        language_detector.train_from_chat_messages(get_supabase_client())
+    except Exception as e:
+        print(f"Could not train language detector from chat messages: {e}")
+
+    try:
+        for prompt_file in ("prompts/ask_farmer_intent", "prompts/ask_salesrep_intent"):
+            get_intent_classifier(prompt_file).train_from_intent_labels(get_supabase_client())
+    except Exception as e:
+        print(f"Could not train intent classifiers from intent labels: {e}")
+
+    try:
+        faq_index.warm(get_supabase_client())
+    except Exception as e:
+        print(f"Could not build FAQ index: {e}")
+
+    try:
+        reference_data.warm(get_supabase_client())
+    except Exception as e:
+        print(f"Could not load reference data: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await write_queue.stop()
+
+    try:
+        faq_index.save_snapshot()
+    except Exception as e:
+        print(f"Could not save FAQ index snapshot: {e}")
+
+    await close_clients()
+
+
 @app.exception_handler(GlobalException)
 async def app_exception_handler(request: Request, exc: GlobalException):
     return JSONResponse(
@@ -18,6 +68,37 @@ async def app_exception_handler(request: Request, exc: GlobalException):
         content={"detail": exc.message}
     )
 
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    # LLM calls made while handling the request add their wall time here (see core.metrics_core)
+    timings = []
+    token = request_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        # Identical Supabase reads made while handling the request go out once (see core.identity_map_core)
+        with identity_map_scope() as identity_map:
+            response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    metrics.observe("http_request_duration_seconds", {
+        "method": request.method,
+        "path": getattr(route, "path", "unmatched"),
+    }, elapsed)
+
+    # Streamed responses send their headers before the LLM finishes, so they only carry what ran until then
+    llm_seconds = sum(seconds for _, seconds in timings)
+    server_timing = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+    server_timing.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers["Server-Timing"] = ", ".join(server_timing)
+    response.headers["X-LLM-Calls"] = str(len(timings))
+    response.headers["X-LLM-Time-Ms"] = f"{llm_seconds * 1000:.1f}"
+    if identity_map is not None:
+        response.headers["X-Identity-Map-Hits"] = str(identity_map.hits)
+    return response
+
 origins = [
     "http://localhost:3000",  # React/Vite/Next.js frontend
     "http://127.0.0.1:3000",  # Alternate local frontend URL
@@ -46,6 +127,10 @@ app.include_router(view_models_services.router,
 app.include_router(admin_services.router,
                    prefix="/admin", tags=["Admin"])
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return metrics.render()
+
 # Root endpoint
 @app.get("/")
 async def helloworld():
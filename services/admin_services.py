@@ -1,3 +1,4 @@
+from typing import Optional
 from fastapi import APIRouter, Query
 
 from models.faq_model import FAQBase, FAQUpdate
@@ -125,6 +126,53 @@ def faqs(company_id: int):
     print(f"An error occurred: {e}")
     return {"message": "Something went wrong", "data": None}
 
+@router.get("/faqs/search")
+def search_faqs(
+  company_id: int,
+  q: str = Query(..., min_length=1),
+  limit: int = Query(10, ge=1, le=100),
+  category: Optional[str] = None
+):
+  try:
+    admin = Admin()
+    results = admin.search_faqs(company_id, q, limit, category)
+    return {"message": "Success", "data": results}
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return {"message": "Something went wrong", "data": None}
+
+@router.post("/faqs/index/rebuild")
+def rebuild_faq_index():
+  try:
+    admin = Admin()
+    stats = admin.rebuild_faq_index()
+    return {"message": "Success", "data": stats}
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return {"message": "Something went wrong", "data": None}
+
+# User roles and companies are cached per user; call after changing user_roles, user_profiles.company_id or company_farmers
+@router.post("/users/company-cache/invalidate")
+def invalidate_user_company(user_profile_id: Optional[int] = None):
+  try:
+    admin = Admin()
+    stats = admin.invalidate_user_company(user_profile_id)
+    return {"message": "Success", "data": stats}
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return {"message": "Something went wrong", "data": None}
+
+# Feed products and growth targets are served from memory; call after editing them
+@router.post("/reference-data/refresh")
+def refresh_reference_data():
+  try:
+    admin = Admin()
+    stats = admin.refresh_reference_data()
+    return {"message": "Success", "data": stats}
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return {"message": "Something went wrong", "data": None}
+
 @router.post("/faqs")
 def faqs(faq: FAQBase):
   try:
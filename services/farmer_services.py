@@ -3,6 +3,7 @@ from fastapi import APIRouter, HTTPException
 from core.farmer_core import Farmer
 from models.chat_model import ChatRequest
 from core.chat_core import Chat
+from core.resilience_core import LlmUnavailableError, unavailable_response
 from llm.farmer_llm_handler import (
     get_intent,
     handle_general_questions,
@@ -17,7 +18,7 @@ router = APIRouter()
 
 
 @router.post("/chat")
-def chat_service(body: ChatRequest):
+async def chat_service(body: ChatRequest):
     try:
         chat = Chat()
 
@@ -25,7 +26,7 @@ def chat_service(body: ChatRequest):
         user_id = body.user_id
         prompt = body.prompt
         
-        chat_id = chat.create_conversation(user_id)
+        chat_id = await chat.create_conversation(user_id)
         
         if chat_id == None:
             raise Exception("Failed to create conversation")
@@ -33,7 +34,7 @@ def chat_service(body: ChatRequest):
         intent_id = body.intent_id
         intent = {}
         if (intent_id == None or intent_id == 0):
-            intent = get_intent(prompt, "prompts/ask_farmer_intent", "classify_intent")  
+            intent = await get_intent(prompt, "prompts/ask_farmer_intent", "classify_intent")  
             intent_id = intent["id"]
         
         # Early return for out of scope       
@@ -53,7 +54,11 @@ def chat_service(body: ChatRequest):
         if handler is None:
             raise Exception("Handler for intent not found")
 
-        return {"message": "Success", "data": handler()}
+        return {"message": "Success", "data": await handler()}
+
+    except LlmUnavailableError as e:
+        print(f"LLM unavailable: {e}")
+        return {"message": "Success", "data": unavailable_response(body.prompt)}
 
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -1,9 +1,13 @@
 
+import asyncio
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 from core.chat_core import Chat
 from core.farmer_core_v2 import FarmerV2
+from core.resilience_core import LlmUnavailableError, unavailable_response
+from core.streaming_core import sse_event
 from exceptions.global_exception import GlobalException
 from llm.farmer_llm_handler import handle_local_practice_log
 from llm.farmer_llm_handler_v2 import get_intent, handle_general_questions, handle_health_log, handle_performance_log
@@ -14,49 +18,106 @@ from models.feed_programs_model import FeedProgramPayload
 
 router = APIRouter()
 
-@router.post("/chat-ai")
-def chat_service(body: ChatRequest):
-    try:
-        chat = Chat()
+async def run_chat(body: ChatRequest, on_delta=None):
+    chat = Chat()
 
-        chat_id = body.chat_id
-        user_id = body.user_id
-        prompt = body.prompt
-        
-        chat_id = chat.create_conversation(user_id)
-        
-        if chat_id == None:
-            raise Exception("Failed to create conversation")
-            
-        intent_id = body.intent_id
-        intent = {}
-        if (intent_id == None or intent_id == 0):
-            intent = get_intent(prompt, "prompts/ask_farmer_intent", "classify_intent")  
-            intent_id = intent["id"]
-        
-        # Early return for out of scope       
-        if (intent_id == 6): 
-            return {"message": "Success", "data": intent}
-      
-        dispatch = {
-            1: lambda: handle_general_questions(chat_id, user_id, prompt),
-            2: lambda: handle_health_log(chat_id, user_id, prompt),
-            7: lambda: handle_performance_log(chat_id, user_id, prompt),
-            3: lambda: handle_local_practice_log(chat_id, user_id, prompt)
-            # 5: lambda: handle_support_forms(intent),
-            # 7: lambda: handle_general_log(chat_id, user_id, prompt)
-        }
+    chat_id = body.chat_id
+    user_id = body.user_id
+    prompt = body.prompt
+    
+    chat_id = await chat.create_conversation(user_id)
+    
+    if chat_id == None:
+        raise Exception("Failed to create conversation")
         
-        handler = dispatch.get(intent_id)
-        if handler is None:
-            raise Exception("Handler for intent not found")
+    intent_id = body.intent_id
+    intent = {}
+    detected_language = None
+    if (intent_id == None or intent_id == 0):
+        intent = await get_intent(prompt, "prompts/ask_farmer_intent", "classify_intent", classify_language=True)
+        intent_id = intent["id"]
+        detected_language = intent.get("user_language")
+    
+    # Early return for out of scope       
+    if (intent_id == 6): 
+        return intent
+  
+    dispatch = {
+        1: lambda: handle_general_questions(chat_id, user_id, prompt, detected_language, on_delta),
+        2: lambda: handle_health_log(chat_id, user_id, prompt, detected_language, on_delta),
+        7: lambda: handle_performance_log(chat_id, user_id, prompt, detected_language, on_delta),
+        3: lambda: handle_local_practice_log(chat_id, user_id, prompt, detected_language)
+        # 5: lambda: handle_support_forms(intent),
+        # 7: lambda: handle_general_log(chat_id, user_id, prompt)
+    }
+    
+    handler = dispatch.get(intent_id)
+    if handler is None:
+        raise Exception("Handler for intent not found")
+
+    return await handler()
+
 
-        return {"message": "Success", "data": handler()}
+@router.post("/chat-ai")
+async def chat_service(body: ChatRequest):
+    try:
+        return {"message": "Success", "data": await run_chat(body)}
+
+    except LlmUnavailableError as e:
+        # Fail fast with a friendly message instead of hanging on a degraded provider
+        print(f"LLM unavailable: {e}")
+        return {"message": "Success", "data": unavailable_response(body.prompt)}
 
     except Exception as e:
         print(f"An error occurred: {e}")
         return {"message": "Something went wrong", "data": None}
 
+
+# Keeps streaming chats alive until they persist, even if the client disconnects
+stream_tasks = set()
+
+@router.post("/chat-ai/stream")
+async def chat_stream_service(body: ChatRequest):
+    """Same as /chat-ai, but streams the response text as server-sent events.
+
+    Emits "delta" events with {"text": ...} while the answer is generated, then one "done" event with
+    the usual {"message", "data"} payload once the result is saved, or an "error" event.
+    """
+    queue = asyncio.Queue()
+
+    async def on_delta(text):
+        await queue.put(("delta", {"text": text}))
+
+    async def run():
+        try:
+            data = await run_chat(body, on_delta)
+            await queue.put(("done", {"message": "Success", "data": data}))
+        except LlmUnavailableError as e:
+            print(f"LLM unavailable: {e}")
+            await queue.put(("done", {"message": "Success", "data": unavailable_response(body.prompt)}))
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            await queue.put(("error", {"message": "Something went wrong", "data": None}))
+
+    task = asyncio.create_task(run())
+    stream_tasks.add(task)
+    task.add_done_callback(stream_tasks.discard)
+
+    async def events():
+        streamed = False
+        while True:
+            event, data = await queue.get()
+            if event == "delta":
+                streamed = True
+            elif event == "done" and not streamed and (data["data"] or {}).get("response"):
+                # Canned replies and out of scope answers never hit the stream, send them in one piece
+                yield sse_event("delta", {"text": data["data"]["response"]})
+            yield sse_event(event, data)
+            if event != "delta":
+                break
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # Create feed program
 @router.post("/feed-programs")
 def create_feed_program(payload: FeedProgramPayload):
@@ -225,4 +286,17 @@ def get_health_watch(
     
     except Exception as e:
         print(f"An error occurred: {e}")
-        raise HTTPException(status_code=500, detail="Failed to get health watch data.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to get health watch data.")
+@router.get("/dashboard/{id}")
+def get_dashboard(id: int):
+    try:
+        farmer = FarmerV2()
+        result = farmer.read_dashboard(id)
+        return {"message": "Success", "data": result}
+
+    except GlobalException as ge:
+        raise HTTPException(status_code=ge.status_code, detail=str(ge))
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get dashboard data.")
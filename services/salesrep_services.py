@@ -2,6 +2,7 @@ from fastapi import APIRouter, Query
 
 from models.chat_model import ChatRequest
 from core.chat_core import Chat
+from core.resilience_core import LlmUnavailableError, unavailable_response
 from core.salesrep_core import SalesRep
 from llm.salesrep_llm_handler import (
   get_intent,
@@ -18,7 +19,7 @@ from llm.salesrep_llm_handler import (
 router = APIRouter()
 
 @router.post("/chat")
-def chat_service(body: ChatRequest):
+async def chat_service(body: ChatRequest):
   try:
     chat = Chat()
 
@@ -26,29 +27,31 @@ def chat_service(body: ChatRequest):
     user_id = body.user_id
     prompt = body.prompt
     
-    chat_id = chat.create_conversation(user_id)
+    chat_id = await chat.create_conversation(user_id)
         
     if chat_id == None:
       raise Exception("Failed to create conversation")
         
     intent_id = body.intent_id
     intent = {}
+    detected_language = None
     if (intent_id == None or intent_id == 0):
-      intent = get_intent(prompt, "prompts/ask_salesrep_intent", "classify_intent")    
+      intent = await get_intent(prompt, "prompts/ask_salesrep_intent", "classify_intent", classify_language=True)
       intent_id = intent["id"]
+      detected_language = intent.get("user_language")
   
     # Early return for out of scope       
     if (intent_id == 6):        
       return {"message": "Success", "data": intent}
 
     dispatch = {
-      1: lambda: handle_general_questions(chat_id, prompt),
-      2: lambda: handle_dealer_log(chat_id, user_id, prompt),
-      3: lambda: handle_field_product_log(chat_id, user_id, prompt),
+      1: lambda: handle_general_questions(chat_id, user_id, prompt, detected_language),
+      2: lambda: handle_dealer_log(chat_id, user_id, prompt, detected_language),
+      3: lambda: handle_field_product_log(chat_id, user_id, prompt, detected_language),
       4: lambda: handle_requested_file(intent),
       5: lambda: handle_support_forms(intent),
-      7: lambda: handle_sales_log(chat_id, user_id, prompt),
-      8: lambda: handle_farm_log(chat_id, user_id, prompt),
+      7: lambda: handle_sales_log(chat_id, user_id, prompt, detected_language),
+      8: lambda: handle_farm_log(chat_id, user_id, prompt, detected_language),
       
     }
 
@@ -56,7 +59,10 @@ def chat_service(body: ChatRequest):
     if handler is None:
       raise Exception("Handler for intent not found")
 
-    return {"message": "Success", "data": handler()}    
+    return {"message": "Success", "data": await handler()}    
+  except LlmUnavailableError as e:
+    print(f"LLM unavailable: {e}")
+    return {"message": "Success", "data": unavailable_response(body.prompt)}
   except Exception as e:
     print(f"An error occurred: {e}")
     return {"message": "Something went wrong", "data": None}
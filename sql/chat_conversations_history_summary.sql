@@ -0,0 +1,5 @@
+-- Rolling summary of a conversation's older turns (core/chat_core.py, core/history_core.py).
+-- history_summary_until is the created_at of the last message folded into the summary.
+alter table chat_conversations
+  add column if not exists history_summary text,
+  add column if not exists history_summary_until timestamptz;
@@ -0,0 +1,20 @@
+-- Keeps faq.updated_at current on every edit, including ones made outside the API (dashboard, scripts),
+-- so the FAQ index can catch up on them when it starts from its snapshot (core/faq_index_core.py).
+alter table faq
+  add column if not exists updated_at timestamptz not null default now();
+
+create or replace function faq_touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.updated_at := now();
+  return new;
+end;
+$$;
+
+drop trigger if exists faq_touch_updated_at on faq;
+create trigger faq_touch_updated_at
+before update on faq
+for each row
+execute function faq_touch_updated_at();
@@ -0,0 +1,65 @@
+-- Rows behind GET /ViewModels/farmer-dashboard/{id} in one round-trip (core/view_models_core.py).
+-- The view model itself is still built in Python, so its JSON shape does not depend on this function.
+-- Without it the endpoint falls back to one query per table.
+create or replace function farmer_dashboard_rows(p_user_profile_id bigint)
+returns json
+language sql
+stable
+as $$
+  with feed_usage as (
+    select *
+    from feed_usage_logs
+    where farmer_user_profile_id = p_user_profile_id
+    order by created_at desc
+    limit 1
+  ),
+  farmer as (
+    select id
+    from farmers
+    where user_profile_id = p_user_profile_id
+    limit 1
+  )
+  select json_build_object(
+    'user_exists', exists (select 1 from user_profiles where id = p_user_profile_id),
+    'feed_usage', (select row_to_json(u) from feed_usage u),
+    'feed_product', (
+      select row_to_json(p)
+      from feed_products p
+      where p.id = (select feed_product_id from feed_usage)
+    ),
+    'logs', coalesce((
+      select json_agg(l order by l.created_at desc)
+      from farm_performance_logs l, feed_usage u
+      where l.user_profile_id = p_user_profile_id
+        and l.created_at >= u.start_date
+        and (u.end_date is null or l.created_at <= u.end_date)
+    ), '[]'::json),
+    'flock_size', (
+      select quantity
+      from farmer_livestock
+      where farmer_id = (select id from farmer)
+      limit 1
+    ),
+    'target_weight_kg', (
+      select target_weight_kg
+      from feed_growth_targets
+      where feed_product_id = (select feed_product_id from feed_usage)
+      limit 1
+    ),
+    'feed_calculation_log', (
+      select row_to_json(c)
+      from (
+        select *
+        from feed_calculation_logs
+        where user_profile_id = p_user_profile_id
+        order by created_at desc
+        limit 1
+      ) c
+    ),
+    'incidents', coalesce((
+      select json_agg(i order by i.incident_date desc)
+      from health_incidents i
+      where i.farmer_user_profile_id = p_user_profile_id
+    ), '[]'::json)
+  );
+$$;
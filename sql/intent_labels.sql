@@ -0,0 +1,11 @@
+-- Messages the LLM intent classifier routed, with the intent it picked and the classifier prompt that picked it
+-- (core/helper_core_v2.py classify_intent). The local intent classifier (core/intent_core.py) trains on these.
+create table if not exists intent_labels (
+  id bigserial primary key,
+  classifier text not null,
+  message text not null,
+  intent_id int not null,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists intent_labels_classifier_created_at_idx on intent_labels (classifier, created_at desc);
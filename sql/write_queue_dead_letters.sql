@@ -0,0 +1,11 @@
+-- Writes the write-behind queue gave up on after its retries (core/write_queue_core.py), kept for replay.
+-- match is null for inserts; for updates it holds the column filters of the row.
+create table if not exists write_queue_dead_letters (
+  id bigserial primary key,
+  kind text not null,
+  table_name text not null,
+  payload jsonb not null,
+  match jsonb,
+  error text,
+  created_at timestamptz not null default now()
+);
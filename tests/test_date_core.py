@@ -0,0 +1,45 @@
+from datetime import date
+
+import pytest
+
+from core.date_core import find_date, normalize_date
+
+# A Sunday
+TODAY = date(2026, 10, 18)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("kahapon", "2026/10/17"),
+    ("today", "2026/10/18"),
+    ("bukas", "2026/10/19"),
+    ("3 days ago", "2026/10/15"),
+    ("tatlong araw na ang nakalipas", "2026/10/15"),
+    ("last Monday", "2026/10/12"),
+    ("ika-5 ng Oktubre", "2026/10/05"),
+    ("2026-10-01", "2026/10/01"),
+])
+def test_relative_and_absolute_dates(text, expected):
+    assert normalize_date(text, TODAY) == expected
+
+
+def test_month_day_without_year_resolves_by_preference():
+    assert normalize_date("Oct 25", TODAY, "past") == "2025/10/25"
+    assert normalize_date("Oct 25", TODAY, "future") == "2026/10/25"
+    assert normalize_date("10/20", TODAY, "past") == "2025/10/20"
+    assert normalize_date("10/20", TODAY, "future") == "2026/10/20"
+
+
+def test_tagalog_weekday_with_sa_is_upcoming():
+    assert normalize_date("sa Biyernes", TODAY) == "2026/10/23"
+
+
+@pytest.mark.parametrize("text", ["1/2 kg", "3/4 sako", "wala", "Feb 30"])
+def test_not_a_date(text):
+    assert normalize_date(text, TODAY) is None
+
+
+def test_find_date_reports_the_span():
+    text = "5 namatay kahapon, 200 itlog"
+    found = find_date(text, TODAY)
+    assert found.formatted() == "2026/10/17"
+    assert text[found.start:found.end] == "kahapon"
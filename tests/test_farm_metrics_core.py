@@ -0,0 +1,86 @@
+from core.farm_metrics_core import FarmMetrics
+
+LOGS = [
+    {"created_at": "2026-10-01T08:00:00+00:00", "average_weight_kg": "0.5", "mortality_count": 0,
+     "feed_intake_status": "eating_well", "feed_intake_kg": 10, "notes": "start"},
+    {"created_at": "2026-10-05T08:00:00+00:00", "average_weight_kg": "0.9", "mortality_count": 3,
+     "feed_intake_status": "picky", "feed_intake_kg": 12, "notes": "3 died"},
+    # Two logs on one day: the later one is the day's weight
+    {"created_at": "2026-10-11T07:00:00+00:00", "average_weight_kg": "1.4", "mortality_count": 0,
+     "feed_intake_status": "eating_well", "feed_intake_kg": 15},
+    {"created_at": "2026-10-11T18:00:00+00:00", "average_weight_kg": "1.5", "mortality_count": 0,
+     "feed_intake_status": "eating_well", "feed_intake_kg": 15},
+]
+INCIDENTS = [
+    {"created_at": "2026-10-03T09:00:00+00:00", "incident_date": "2026-10-03", "incident_type": "mortality",
+     "affected_count": 2, "symptoms": "lethargy"},
+    {"created_at": "2026-10-08T09:00:00+00:00", "incident_date": "2026-10-08", "incident_type": "sickness",
+     "affected_count": 5},
+]
+
+
+def test_empty_program():
+    metrics = FarmMetrics()
+    assert metrics.latest_log == {}
+    assert metrics.growth_rate() == {"growth_rate": 0.0, "raw_gain_kg": 0.0}
+    assert metrics.feed_intake_behavior()["behavior_status"] == "no_data"
+    assert metrics.health_watch()["health_score"] == 100
+
+
+def test_logs_are_newest_first():
+    metrics = FarmMetrics(LOGS)
+    assert metrics.latest_log["average_weight_kg"] == "1.5"
+    assert [record["date"] for record in metrics.recent_records()][0] == "2026-10-11"
+
+
+def test_growth_rate_between_oldest_and_newest_log():
+    # 1.0 kg gained over 10 days
+    assert FarmMetrics(LOGS).growth_rate() == {"growth_rate": 0.1, "raw_gain_kg": 1.0}
+
+
+def test_flock_tracking_counts_logs_and_incidents():
+    tracking = FarmMetrics(LOGS, INCIDENTS).flock_tracking(100)
+    assert tracking["current_flock_size"] == 95
+    assert tracking["total_mortality"] == 5
+    assert tracking["mortality_percentage"] == 5.0
+    assert tracking["survival_rate"] == 0.95
+    assert tracking["mortality_breakdown"] == {"from_performance_logs": 3, "from_health_incidents": 2}
+
+
+def test_flock_tracking_without_flock_size():
+    assert FarmMetrics(LOGS, INCIDENTS).flock_tracking(0)["total_mortality"] == 0
+
+
+def test_growth_chart_keeps_the_latest_weight_per_day():
+    chart = FarmMetrics(LOGS).growth_chart(2.0)
+    assert [point["date"] for point in chart] == ["2026-10-01", "2026-10-05", "2026-10-11"]
+    assert chart[-1] == {"date": "2026-10-11", "actual_weight": 1.5, "target_weight": 2.0}
+
+
+def test_recent_records_number_the_program_days():
+    records = FarmMetrics(LOGS).recent_records("2026-10-01")
+    assert records[-1]["day"] == "Day 1"
+    assert records[0]["day"] == "Day 11"
+
+
+def test_feed_intake_behavior():
+    behavior = FarmMetrics(LOGS).feed_intake_behavior()
+    assert behavior["summary"] == {"eating_well": 3, "picky": 1, "not_eating": 0}
+    assert behavior["behavior_status"] == "eating_well"
+    # (3 * 1.0 + 1 * 0.5) / 4
+    assert behavior["behavior_score"] == 87.5
+
+
+def test_health_watch_penalties():
+    # Mortality 2 * 4, sickness 5 * 2, one incident with symptoms
+    health = FarmMetrics(LOGS, INCIDENTS).health_watch()
+    assert health["health_score"] == 100 - 8 - 10 - 1
+    assert health["issue_summary"] == {"sick": 5, "mortality": 2, "notes": 1}
+
+
+def test_health_watch_can_count_log_mortality():
+    health = FarmMetrics(LOGS, INCIDENTS).health_watch(include_log_mortality=True)
+    assert health["health_score"] == 100 - 8 - 10 - 1 - 3 * 4
+    assert health["issue_summary"]["mortality"] == 5
+    assert health["recent_issues"][0]["date"] == "2026-10-08"
+    assert any(issue["symptoms"] == "Recorded in performance log" for issue in health["recent_issues"])
@@ -0,0 +1,97 @@
+import pytest
+
+from core.intent_core import INTENT_MIN_LABEL_SAMPLES, INTENT_MIN_TRAINING_SAMPLES, IntentClassifier, polite_kind
+
+PROMPT_FILE = "prompts/ask_farmer_intent"
+COMPETITOR_QUESTION = "Which is better, your feeds or B-MEG?"
+
+
+@pytest.fixture
+def classifier():
+    classifier = IntentClassifier(PROMPT_FILE)
+    classifier.ensure_trained()
+    return classifier
+
+
+class FakeIntentLabels:
+    """Records the filters of the intent_labels query and returns rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+
+    def table(self, name):
+        self.filters.append(("table", name))
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})
+
+
+@pytest.mark.parametrize("text, kind", [
+    ("salamat po", "thanks"),
+    ("Good morning sir", "greeting"),
+    ("ok noted", "acknowledge"),
+    ("salamat, ilang araw ang starter?", None),
+])
+def test_polite_kind(text, kind):
+    assert polite_kind(text) == kind
+
+
+def test_polite_messages_take_the_fast_path(classifier):
+    assert classifier.fast_path("salamat po") == (6, 0.99)
+
+
+def test_fast_path_waits_for_labelled_history(classifier):
+    intent_id, confidence = classifier.fast_path("Ano ang magandang feed para sa broiler na 10 araw?")
+    assert intent_id is None
+    assert confidence > 0
+
+
+def test_one_sided_history_does_not_unlock_the_fast_path(classifier):
+    classifier.train([(f"ano ang dapat ipakain sa manok na {day} araw", 1) for day in range(INTENT_MIN_TRAINING_SAMPLES + 14)])
+
+    assert not classifier.history_ready()
+    assert classifier.fast_path(COMPETITOR_QUESTION)[0] is None
+
+
+def test_history_with_every_intent_unlocks_the_fast_path(classifier):
+    per_label = max(INTENT_MIN_LABEL_SAMPLES, INTENT_MIN_TRAINING_SAMPLES // len(classifier.labels()) + 1)
+    classifier.train([(f"message {index}", label) for label in classifier.labels() for index in range(per_label)])
+
+    assert classifier.history_ready()
+
+
+def test_trains_only_on_its_own_labels(classifier):
+    client = FakeIntentLabels([
+        {"message": "Pwede po bang makahingi ng feeding guide?", "intent_id": 4},
+        # Not an intent of this classifier
+        {"message": "Nagbenta ako ng 20 sako", "intent_id": 7},
+    ])
+
+    assert classifier.train_from_intent_labels(client) == 1
+    assert ("table", "intent_labels") in client.filters
+    assert ("classifier", PROMPT_FILE) in client.filters
+    assert classifier.stats()["learned_per_intent"] == {4: 1}
+
+
+def test_record_agreement(classifier):
+    classifier.record_agreement(1, 1)
+    classifier.record_agreement(None, 6)
+
+    stats = classifier.stats()
+    assert (stats["compared"], stats["agreed"]) == (2, 1)
+    assert stats["confusion"] == {"None->6": 1}
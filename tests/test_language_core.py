@@ -0,0 +1,59 @@
+import pytest
+
+from core.language_core import LANGUAGE_CONFIDENCE_THRESHOLD, LANGUAGE_ENGLISH_MIN_COUNT, LanguageDetector
+
+
+@pytest.fixture
+def detector():
+    # A fresh detector per test, learn() changes it
+    return LanguageDetector()
+
+
+@pytest.mark.parametrize("text, language", [
+    ("What is the best feed for my chicks?", "English"),
+    ("Ilang araw na po ang mga manok ko", "Tagalog"),
+    # One English word in five is a mix; 1 - 4/5 falls just under 0.2 in floating point
+    ("Yung chicks ko hindi kumakain", "Taglish"),
+])
+def test_detects_clear_messages_confidently(detector, text, language):
+    detected, confidence = detector.detect(text)
+    assert detected == language
+    assert confidence >= LANGUAGE_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("text", ["Kumusta ka na", "ok"])
+def test_ambiguous_messages_stay_below_the_llm_threshold(detector, text):
+    _, confidence = detector.detect(text)
+    assert confidence < LANGUAGE_CONFIDENCE_THRESHOLD
+
+
+def test_empty_message(detector):
+    assert detector.detect("") == (None, 0.0)
+
+
+def test_one_english_label_does_not_turn_tagalog_words_english(detector):
+    detector.learn_from_llm("ok po salamat sa tulong, ang mga manok ko ay ok na", "English")
+    assert detector.detect("Ilang araw na po ang mga manok ko")[0] == "Tagalog"
+
+
+def test_llm_english_labels_promote_new_words_only_after_repeats(detector):
+    for _ in range(LANGUAGE_ENGLISH_MIN_COUNT - 1):
+        detector.learn_from_llm("the vaccine schedule is done", "English")
+    assert "vaccine" not in detector._english_words
+
+    detector.learn_from_llm("the vaccine schedule is done", "English")
+    assert "vaccine" in detector._english_words
+
+
+def test_words_known_from_another_language_are_never_promoted(detector):
+    for _ in range(LANGUAGE_ENGLISH_MIN_COUNT + 2):
+        detector.learn_from_llm("po salamat", "English")
+    assert "po" not in detector._english_words
+    assert "salamat" not in detector._english_words
+
+
+def test_label_source_tells_llm_labels_from_local_guesses(detector):
+    detector.learn_from_llm("Kumusta ka na", "Tagalog")
+    assert detector.label_source("Kumusta ka na", "Tagalog") == "llm"
+    assert detector.label_source("Kumusta ka na", "Bisaya") == "local"
+    assert detector.label_source("Maayong buntag", "Bisaya") == "local"
@@ -0,0 +1,89 @@
+from datetime import date
+
+import pytest
+
+from core.slot_core import complete_log_locally, extract_date_fields, extract_slots, needs_guidance
+
+TODAY = date(2026, 10, 18)
+REPORT_PROMPT = "prompts/ask_farmer_log"
+HEALTHY_REPORT = {
+    "eggs_per_day": "200",
+    "average_weight_kg": "1.8",
+    "mortality_count": "0",
+    "feed_intake_status": "eating_well",
+    "health_status": "healthy",
+}
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("200 itlog, 1.8 kg timbang, walang namatay", {"eggs_per_day": "200", "average_weight_kg": "1.8", "mortality_count": "0"}),
+    ("3 namatay kahapon", {"mortality_count": "3"}),
+    ("limang sako ng feed", {"bags_used": "5"}),
+    ("1/2 kg feed", {"feed_intake_kg": "0.5"}),
+    ("2 trays ng itlog", {"eggs_per_day": "60"}),
+    # The age is not a count
+    ("day 21 na, 150 itlog", {"eggs_per_day": "150"}),
+])
+def test_extract_report_slots(message, expected):
+    assert extract_slots(message, "report_details", today=TODAY) == expected
+
+
+def test_extract_incident_slots():
+    slots = extract_slots("tatlong manok matamlay at may sipon kahapon", "incident_details", today=TODAY)
+    assert slots == {
+        "affected_count": "3",
+        "incident_date": "2026/10/17",
+        "symptoms": "lethargy, colds/nasal discharge",
+        "incident_type": "sickness",
+    }
+
+
+def test_incident_date_collected_earlier_is_kept():
+    slots = extract_slots("3 namatay kahapon", "incident_details", {"incident_date": "2026/10/10"}, today=TODAY)
+    assert "incident_date" not in slots
+    assert slots["affected_count"] == "3"
+
+
+def test_bare_number_answers_the_last_question():
+    known = {"eggs_per_day": "200", "average_weight_kg": "1.8"}
+    assert extract_slots("25", "report_details", known, "Ilan po ang namatay?") == {"mortality_count": "25"}
+
+
+def test_complete_log_locally_records_a_healthy_report():
+    message = "200 itlog, 1.8 kg timbang, walang namatay, malakas kumain, malusog sila"
+    parsed = complete_log_locally(REPORT_PROMPT, "report_details", HEALTHY_REPORT, "Tagalog", message)
+    assert parsed["next_action"] == "log_complete"
+    assert parsed["report_details"]["notes"]
+    assert parsed["response"].startswith("Salamat po!")
+
+
+def test_complete_log_locally_waits_for_missing_fields():
+    form_data = {key: value for key, value in HEALTHY_REPORT.items() if key != "health_status"}
+    assert complete_log_locally(REPORT_PROMPT, "report_details", form_data, "English", "200 eggs") is None
+
+
+@pytest.mark.parametrize("message, changes", [
+    ("200 itlog, ok na ba sila", {}),
+    ("200 eggs, are they fine?", {}),
+    ("5 namatay", {"mortality_count": "5"}),
+    ("may sipon", {"health_status": "some_sick"}),
+    ("mababa kumain", {"feed_intake_status": "picky"}),
+])
+def test_problem_reports_go_to_the_llm(message, changes):
+    form_data = {**HEALTHY_REPORT, **changes}
+    assert needs_guidance(message, form_data)
+    assert complete_log_locally(REPORT_PROMPT, "report_details", form_data, "Tagalog", message) is None
+
+
+def test_question_with_deaths_and_sickness_is_not_completed_locally():
+    message = "nag 2 kg na ba sila? 5 namatay kahapon, 200 itlog, mababa kumain, may sipon"
+    form_data = extract_slots(message, "report_details", today=TODAY)
+    assert complete_log_locally(REPORT_PROMPT, "report_details", form_data, "Tagalog", message) is None
+
+
+def test_planned_visit_dates_resolve_forward_and_keep_collected_ones():
+    prompt_file = "prompts/ask_salesrep_farm_log"
+    assert extract_date_fields("visit on 10/20", prompt_file, "visit_details", today=TODAY) == {"visit_date": "2026/10/20"}
+    assert extract_date_fields("visit on 10/20", prompt_file, "visit_details", {"visit_date": "2026/09/01"}, TODAY) == {}
+    # A ticket number means the planned visit is being logged as done
+    assert extract_date_fields("TKT-0001 visited 10/01", prompt_file, "visit_details", today=TODAY) == {"visit_date": "2026/10/01"}
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+import core.write_queue_core as write_queue_core
+from core.write_queue_core import WriteBehindQueue
+
+
+class FakeSupabase:
+    """Async client stand-in recording every write; fail_times makes the first writes to a table raise"""
+
+    def __init__(self, fail_times=None):
+        self.fail_times = dict(fail_times or {})
+        self.writes = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.kind = None
+        self.values = None
+        self.match = {}
+
+    def insert(self, rows):
+        self.kind, self.values = "insert", rows
+        return self
+
+    def update(self, values):
+        self.kind, self.values = "update", values
+        return self
+
+    def eq(self, column, value):
+        self.match[column] = value
+        return self
+
+    async def execute(self):
+        if self.client.fail_times.get(self.table, 0) > 0:
+            self.client.fail_times[self.table] -= 1
+            raise RuntimeError(f"{self.table} is down")
+        self.client.writes.append((self.kind, self.table, self.values, self.match))
+        rows = self.values if self.kind == "insert" else [{**self.match, **self.values}]
+        return type("Response", (), {"data": [{"id": index + 1, **row} for index, row in enumerate(rows)]})
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    client = FakeSupabase()
+
+    async def get_client():
+        return client
+
+    monkeypatch.setattr(write_queue_core, "get_async_supabase_client", get_client)
+    return client
+
+
+def run_queued(queue, submit):
+    """Start queue in async mode, run submit(queue), flush and stop"""
+    async def scenario():
+        await queue.start()
+        try:
+            await submit(queue)
+            await queue.flush()
+        finally:
+            await queue.stop()
+    asyncio.run(scenario())
+
+
+def test_sync_mode_writes_inline(supabase):
+    queue = WriteBehindQueue(mode="sync")
+    asyncio.run(queue.insert("chat_messages", {"message": "hi"}))
+    assert supabase.writes == [("insert", "chat_messages", [{"message": "hi"}], {})]
+
+
+def test_inserts_into_one_table_become_one_multi_row_insert(supabase):
+    async def submit(queue):
+        await queue.insert("chat_messages", {"message": "a"})
+        await queue.insert("chat_messages", {"message": "b"})
+        await queue.insert("faq", {"question": "q"})
+
+    run_queued(WriteBehindQueue(mode="async"), submit)
+    assert ("insert", "chat_messages", [{"message": "a"}, {"message": "b"}], {}) in supabase.writes
+    assert ("insert", "faq", [{"question": "q"}], {}) in supabase.writes
+    assert len(supabase.writes) == 2
+
+
+def test_updates_to_one_row_are_merged_per_column_set(supabase):
+    async def submit(queue):
+        await queue.update("chat_conversations", {"form_data": {"a": 1}}, {"id": 7})
+        await queue.update("chat_conversations", {"form_data": {"a": 2}}, {"id": 7})
+        await queue.update("chat_conversations", {"history_summary": "s"}, {"id": 7})
+        await queue.update("chat_conversations", {"form_data": {"b": 1}}, {"id": 8})
+
+    run_queued(WriteBehindQueue(mode="async"), submit)
+    assert sorted(supabase.writes, key=str) == sorted([
+        ("update", "chat_conversations", {"form_data": {"a": 2}}, {"id": 7}),
+        ("update", "chat_conversations", {"history_summary": "s"}, {"id": 7}),
+        ("update", "chat_conversations", {"form_data": {"b": 1}}, {"id": 8}),
+    ], key=str)
+
+
+def test_on_done_gets_each_inserted_row(supabase):
+    rows = []
+
+    async def submit(queue):
+        await queue.insert("faq", {"question": "a"}, on_done=rows.append)
+        await queue.insert("faq", {"question": "b"}, on_done=rows.append)
+
+    run_queued(WriteBehindQueue(mode="async"), submit)
+    assert rows == [{"id": 1, "question": "a"}, {"id": 2, "question": "b"}]
+
+
+def test_flush_with_a_key_waits_for_that_key(supabase):
+    async def submit(queue):
+        await queue.insert("chat_messages", {"message": "mine"}, key=("conversation", 1))
+        await queue.flush(("conversation", 1))
+        assert ("insert", "chat_messages", [{"message": "mine"}], {}) in supabase.writes
+
+    run_queued(WriteBehindQueue(mode="async"), submit)
+
+
+def test_transient_failures_are_retried(supabase):
+    supabase.fail_times = {"chat_messages": 2}
+    queue = WriteBehindQueue(mode="sync", max_retries=3, retry_base=0.001)
+
+    asyncio.run(queue.insert("chat_messages", {"message": "hi"}))
+    assert supabase.writes == [("insert", "chat_messages", [{"message": "hi"}], {})]
+    assert queue.failed == 0
+
+
+def test_writes_that_exhaust_their_retries_go_to_the_dead_letter_table(supabase):
+    supabase.fail_times = {"chat_messages": 10}
+    queue = WriteBehindQueue(mode="sync", max_retries=1, retry_base=0.001)
+
+    asyncio.run(queue.insert("chat_messages", {"message": "hi"}))
+    assert queue.failed == 1
+    assert supabase.writes == [("insert", write_queue_core.WRITE_QUEUE_DEAD_LETTER_TABLE, [{
+        "kind": "insert", "table_name": "chat_messages", "payload": {"message": "hi"}, "match": None,
+        "error": "chat_messages is down",
+    }], {})]
+
+
+def test_lost_writes_are_logged_when_the_dead_letter_table_fails(supabase, capsys):
+    supabase.fail_times = {"chat_messages": 10, write_queue_core.WRITE_QUEUE_DEAD_LETTER_TABLE: 1}
+    queue = WriteBehindQueue(mode="sync", max_retries=0)
+
+    asyncio.run(queue.update("chat_messages", {"message": "edited"}, {"id": 3}))
+    assert queue.failed == 1
+    assert '"payload": {"message": "edited"}' in capsys.readouterr().out